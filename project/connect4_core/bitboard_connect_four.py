@@ -0,0 +1,241 @@
+####################################################
+# ABOUT THIS FILE
+####################################################
+# Description: Bitboard game core for connect four
+#   Used by the V2 gym environment and the bots to avoid scanning a numpy board cell per cell.
+#
+# Author name: Lennert Bontinck
+# Author email: lennert.bontinck@vub.be / info@lennertbontinck.com
+#
+# Bitboard layout based on: http://blog.gamesolver.org/solving-connect-four/06-bitboard/
+
+
+####################################################
+# IMPORTS
+####################################################
+
+# Numpy for easy numerical data structures
+import numpy as np
+
+####################################################
+# GLOBAL VARIABLES
+####################################################
+
+# GRID CODES
+GRID_EMPTY_SPACE = 0
+GRID_PLAYER1_COIN = 1
+GRID_PLAYER2_COIN = 2
+
+####################################################
+# BITBOARD GAME CORE
+####################################################
+
+class BitboardConnectFour:
+    """
+    Connect four game state stored as one bitboard (integer) per player together with per column height counters.
+    Every column takes up row_count + 1 bits, the extra top bit is a sentinel that keeps lines from wrapping into the next column.
+    Bit (column * (row_count + 1) + row) is set when that cell holds a coin of the player, row 0 being the bottom row.
+    For the default 7x6 board this results in 49 bits, thus two 64-bit integers hold the full board.
+    """
+
+    def __init__(self, column_count: int = 7, row_count: int = 6):
+        # Store game specific settings
+        self.column_count = column_count
+        self.row_count = row_count
+
+        # Amount of bits a single column takes up (including sentinel bit)
+        self.column_bit_count = row_count + 1
+
+        # Shifts for the four directions: vertical, horizontal, negatively and positively sloped diagonals
+        self.direction_shifts = (1, self.column_bit_count, self.column_bit_count - 1, self.column_bit_count + 1)
+
+        # Bit of the bottom cell of each column
+        self.column_bottom_bits = [1 << (column * self.column_bit_count) for column in range(column_count)]
+
+        # Mask of all bottom cells and of all playable cells (excludes sentinel bits)
+        self.bottom_mask = sum(self.column_bottom_bits)
+        self.board_mask = sum(((1 << row_count) - 1) << (column * self.column_bit_count) for column in range(column_count))
+
+        # Mask of the playable cells of each column
+        self.column_masks = [((1 << row_count) - 1) << (column * self.column_bit_count) for column in range(column_count)]
+
+        self.reset()
+
+    def reset(self):
+        """
+        Resets the game to an empty board.
+        """
+        # One bitboard per player, index is the grid code minus one
+        self.bitboards = [0, 0]
+
+        # Amount of coins in each column
+        self.heights = [0] * self.column_count
+
+        # Amount of coins on the board
+        self.move_count = 0
+
+    def load_board(self, board: np.ndarray):
+        """
+        Loads a row x column numpy board with grid codes into the bitboards.
+        Row 0 is expected to be the bottom row as done by the gym environments.
+        """
+        self.reset()
+
+        for column in range(self.column_count):
+            for row in range(self.row_count):
+                coin = int(board[row][column])
+
+                # Coins are stacked, first empty space means column is done
+                if coin == GRID_EMPTY_SPACE:
+                    break
+
+                self.bitboards[coin - 1] |= 1 << (column * self.column_bit_count + row)
+                self.heights[column] += 1
+                self.move_count += 1
+
+    def to_board(self, dtype = np.float64):
+        """
+        Returns the game as a row x column numpy board with grid codes.
+        """
+        board = np.zeros((self.row_count, self.column_count), dtype= dtype)
+
+        for column in range(self.column_count):
+            for row in range(self.heights[column]):
+                bit = 1 << (column * self.column_bit_count + row)
+                board[row][column] = GRID_PLAYER1_COIN if self.bitboards[0] & bit else GRID_PLAYER2_COIN
+
+        return board
+
+    def is_valid_location(self, column: int):
+        """
+        Check if a column is playable.
+        """
+        return self.heights[column] < self.row_count
+
+    def valid_locations(self):
+        """
+        Returns all playable columns.
+        """
+        return [column for column in range(self.column_count) if self.heights[column] < self.row_count]
+
+    def get_free_space_row(self, column: int):
+        """
+        Returns the next open row for a specified column or -1 if no open row was found.
+        """
+        height = self.heights[column]
+        return height if height < self.row_count else -1
+
+    def place_coin(self, column: int, coin: int):
+        """
+        Places a coin of a player in the specified column and returns the row it landed in.
+        Assumes the column is playable, check with is_valid_location first.
+        """
+        row = self.heights[column]
+        self.bitboards[coin - 1] |= 1 << (column * self.column_bit_count + row)
+        self.heights[column] = row + 1
+        self.move_count += 1
+        return row
+
+    def remove_coin(self, column: int, coin: int):
+        """
+        Removes the top coin of a player from the specified column, undoing place_coin.
+        """
+        row = self.heights[column] - 1
+        self.bitboards[coin - 1] ^= 1 << (column * self.column_bit_count + row)
+        self.heights[column] = row
+        self.move_count -= 1
+
+    def winning_board(self, coin: int):
+        """
+        Returns whether or not the board is won by the provided player.
+        """
+        return self.has_four_in_a_row(self.bitboards[coin - 1])
+
+    def winning_move(self, column: int, row: int, coin: int):
+        """
+        Returns whether or not a coin of the provided player in the given cell connects four.
+        Only the four lines through that cell are checked, the cell itself counts as holding the coin (e.g. a hypothetical drop).
+        The sentinel bits stop a line at the edges of the board.
+        """
+        bitboard = self.bitboards[coin - 1]
+        cell_index = column * self.column_bit_count + row
+        for shift in self.direction_shifts:
+            connected = 1
+
+            # Count the connected coins on both sides of the cell
+            index = cell_index + shift
+            while connected < 4 and (bitboard >> index) & 1:
+                connected += 1
+                index += shift
+            index = cell_index - shift
+            while connected < 4 and index >= 0 and (bitboard >> index) & 1:
+                connected += 1
+                index -= shift
+
+            if connected >= 4:
+                return True
+
+        return False
+
+    def winning_cells(self, bitboard: int, mask: int):
+        """
+        Returns a bitboard of all empty cells that would complete four connected coins of the provided bitboard.
+        The mask holds the coins of both players. Playable winning cells are winning_cells(...) & ((mask + bottom_mask) & board_mask).
+        """
+        # Vertical
+        winning = (bitboard << 1) & (bitboard << 2) & (bitboard << 3)
+
+        # Horizontal and both diagonals, the empty cell can be at any of the four places of the line
+        for shift in self.direction_shifts[1:]:
+            pairs = (bitboard << shift) & (bitboard << (2 * shift))
+            winning |= pairs & (bitboard << (3 * shift))
+            winning |= pairs & (bitboard >> shift)
+            pairs = (bitboard >> shift) & (bitboard >> (2 * shift))
+            winning |= pairs & (bitboard << shift)
+            winning |= pairs & (bitboard >> (3 * shift))
+
+        return winning & (self.board_mask ^ mask)
+
+    def candidate_columns(self, bitboard: int, oponent_bitboard: int):
+        """
+        Returns the columns worth searching by a tree search for the player to move (bitboard):
+            - a winning column if there is one
+            - otherwise the column(s) blocking a win of the oponent if there are any
+            - otherwise the columns that do not let the oponent win on top of them, or all playable columns if there are none
+        """
+        mask = bitboard | oponent_bitboard
+        possible = (mask + self.bottom_mask) & self.board_mask
+
+        winning = self.winning_cells(bitboard, mask) & possible
+        if winning:
+            return [((winning & -winning).bit_length() - 1) // self.column_bit_count]
+
+        oponent_winning = self.winning_cells(oponent_bitboard, mask)
+        if oponent_winning & possible:
+            candidates = oponent_winning & possible
+        else:
+            candidates = possible & ~(oponent_winning >> 1)
+            if not candidates:
+                candidates = possible
+
+        return [column for column in range(self.column_count) if candidates & self.column_masks[column]]
+
+    def has_four_in_a_row(self, bitboard: int):
+        """
+        Returns whether or not the provided bitboard contains four connected coins in any direction.
+        Shifting a bitboard over a direction and masking it with itself keeps the coins that have a neighbour,
+        doing this twice (with double the shift) keeps the coins that start a line of four.
+        """
+        for shift in self.direction_shifts:
+            pairs = bitboard & (bitboard >> shift)
+            if pairs & (pairs >> (2 * shift)):
+                return True
+
+        return False
+
+    def full_board(self):
+        """
+        Checks if the board is full.
+        Call this after winning_board to check for tie.
+        """
+        return self.move_count == self.column_count * self.row_count
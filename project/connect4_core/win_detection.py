@@ -0,0 +1,102 @@
+####################################################
+# ABOUT THIS FILE
+####################################################
+# Description: Shared win detection for numpy connect four boards
+#   All windows of connect_length cells (horizontal, vertical and both diagonals) are precomputed once per board size,
+#   a single numpy gather over these windows then checks one board or a batch of boards of any size.
+#   When the last placed coin is known, winning_move only checks the lines through that cell.
+#
+# Author name: Lennert Bontinck
+# Author email: lennert.bontinck@vub.be / info@lennertbontinck.com
+
+
+####################################################
+# IMPORTS
+####################################################
+
+# Cache the windows per board size
+import functools
+
+# Numpy for easy numerical data structures
+import numpy as np
+
+# Allow for unions
+from typing import Union
+
+####################################################
+# GLOBAL VARIABLES
+####################################################
+
+# Amount of connected coins needed to win
+CONNECT_LENGTH = 4
+
+# Directions of a window as (row, column) steps: horizontal, vertical and both diagonals
+WINDOW_DIRECTIONS = ((0, 1), (1, 0), (1, 1), (1, -1))
+
+####################################################
+# WIN DETECTION
+####################################################
+
+@functools.lru_cache(maxsize= None)
+def window_indices(row_count: int, column_count: int, connect_length: int = CONNECT_LENGTH):
+    """
+    Returns all windows of connect_length cells on a row x column board as flat cell indices (row * column_count + col),
+        shape (windows, connect_length). The returned array is cached per board size and should not be altered.
+    """
+    windows = []
+    for row in range(row_count):
+        for col in range(column_count):
+            for d_row, d_col in WINDOW_DIRECTIONS:
+                end_row = row + (connect_length - 1) * d_row
+                end_col = col + (connect_length - 1) * d_col
+                if end_row < row_count and 0 <= end_col < column_count:
+                    windows.append([(row + i * d_row) * column_count + col + i * d_col for i in range(connect_length)])
+
+    windows = np.array(windows, dtype=np.int64).reshape(-1, connect_length)
+    windows.setflags(write= False)
+    return windows
+
+def winning_boards(boards: np.ndarray, coin: Union[int, np.ndarray], connect_length: int = CONNECT_LENGTH):
+    """
+    Returns for each board of a batch (shape (N, rows, columns)) whether or not it holds connect_length connected coins of coin.
+    The coin is either one grid code for all boards or an array with one grid code per board.
+    """
+    boards = np.asarray(boards)
+    board_count, row_count, column_count = boards.shape
+    windows = window_indices(row_count, column_count, connect_length)
+
+    # Cells holding a coin of the player, per board
+    coin = np.asarray(coin)
+    if coin.ndim > 0:
+        coin = coin.reshape(-1, 1)
+    coin_cells = boards.reshape(board_count, -1) == coin
+
+    # A board is won if all cells of any window hold a coin of the player
+    return coin_cells[:, windows].all(axis= 2).any(axis= 1)
+
+def winning_board(board: np.ndarray, coin: int, connect_length: int = CONNECT_LENGTH):
+    """
+    Returns whether or not a single row x column board holds connect_length connected coins of coin.
+    """
+    return bool(winning_boards(np.asarray(board)[None], coin, connect_length)[0])
+
+def winning_move(board: np.ndarray, row: int, column: int, coin: int, connect_length: int = CONNECT_LENGTH):
+    """
+    Returns whether or not a coin of coin in the given cell of a single board connects connect_length coins.
+    Only the four lines through that cell are checked, the cell itself counts as holding coin (e.g. a hypothetical drop).
+    """
+    row_count, column_count = board.shape
+    for d_row, d_col in WINDOW_DIRECTIONS:
+        connected = 1
+
+        # Count the connected coins on both sides of the cell
+        for sign in (1, -1):
+            r, c = row + sign * d_row, column + sign * d_col
+            while connected < connect_length and 0 <= r < row_count and 0 <= c < column_count and board[r, c] == coin:
+                connected += 1
+                r, c = r + sign * d_row, c + sign * d_col
+
+        if connected >= connect_length:
+            return True
+
+    return False
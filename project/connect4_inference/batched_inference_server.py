@@ -0,0 +1,178 @@
+####################################################
+# ABOUT THIS FILE
+####################################################
+# Description: In-process inference server batching the moves requested by many concurrent games
+#   Games (e.g. threads of a tournament or an evaluation sweep) request the move for a single board,
+#   a server thread collects these requests up to max_batch_size requests or max_latency seconds,
+#   runs one forward pass of the policy for all of them and hands every game its own column.
+#
+# Author name: Lennert Bontinck
+# Author email: lennert.bontinck@vub.be / info@lennertbontinck.com
+
+
+####################################################
+# IMPORTS
+####################################################
+
+# Server thread, its request queue and the pending results
+import threading
+import queue
+import time
+from concurrent.futures import Future
+
+# Allow for optionals
+from typing import Optional
+
+# Numpy for easy numerical data structures
+import numpy as np
+
+# Torch for inference without gradients
+import torch
+
+# Tianshou for the policies and batches
+import tianshou as ts
+
+####################################################
+# GLOBAL VARIABLES
+####################################################
+
+# Default limits of a micro-batch
+MAX_BATCH_SIZE = 64
+MAX_LATENCY = 0.002 # seconds the first request of a batch waits on others
+
+####################################################
+# INFERENCE SERVER
+####################################################
+
+class BatchedInferenceServer:
+    """
+    Serves the moves of a Tianshou policy (e.g. one agent of a MultiAgentPolicyManager) to many concurrent games.
+    Requests are gathered into micro-batches of at most max_batch_size boards, the first request waiting at most max_latency seconds on others.
+    Each micro-batch is one forward pass of the policy, the same as policy(ts.data.Batch(obs= boards, info= {})).
+    The server can be called as the policy itself, e.g. as a player of human_vs_bot_connect_four.play_game,
+        and is safe to call from many threads at once.
+    Use close (or a with statement) to stop the server thread.
+    """
+
+    def __init__(self,
+                 policy: ts.policy.BasePolicy,
+                 max_batch_size: int = MAX_BATCH_SIZE,
+                 max_latency: float = MAX_LATENCY):
+        self.policy = policy
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+
+        # Statistics of the served batches
+        self.request_count = 0
+        self.batch_count = 0
+
+        self.__requests = queue.Queue()
+        self.__closed = False
+        self.__lock = threading.Lock()
+        self.__thread = threading.Thread(target= self.__serve, daemon= True)
+        self.__thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __serve(self):
+        """
+        Private function run by the server thread, answering the requests in micro-batches until the server is closed.
+        """
+        while True:
+            request = self.__requests.get()
+            if request is None:
+                break
+
+            # Gather requests until the batch is full or the first request waited long enough
+            requests = [request]
+            deadline = time.monotonic() + self.max_latency
+            closing = False
+            while len(requests) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                try:
+                    request = self.__requests.get(timeout= timeout) if timeout > 0 else self.__requests.get_nowait()
+                except queue.Empty:
+                    break
+                if request is None:
+                    closing = True
+                    break
+                requests.append(request)
+
+            self.__answer(requests)
+            if closing:
+                break
+
+    def __answer(self, requests: list):
+        """
+        Private function to run one forward pass for a batch of requests and set their results.
+        """
+        try:
+            boards = np.stack([board for board, _, _ in requests])
+
+            # Requests without an action mask allow all columns
+            if any(mask is not None for _, mask, _ in requests):
+                masks = np.ones((len(requests), boards.shape[-1]), dtype= bool)
+                for index, (_, mask, _) in enumerate(requests):
+                    if mask is not None:
+                        masks[index] = mask
+                observations = ts.data.Batch(obs= boards, mask= masks)
+            else:
+                observations = boards
+
+            with torch.no_grad():
+                columns = ts.data.to_numpy(self.policy(ts.data.Batch(obs= observations, info= {})).act)
+        except Exception as exception:
+            for _, _, future in requests:
+                future.set_exception(exception)
+            return
+
+        self.request_count += len(requests)
+        self.batch_count += 1
+        for (_, _, future), column in zip(requests, columns):
+            future.set_result(int(column))
+
+    def submit(self, board: np.ndarray, mask: Optional[np.ndarray] = None):
+        """
+        Requests the column to play on a single board, optionally only allowing the columns of the action mask.
+        Returns a concurrent.futures.Future of the column.
+        """
+        future = Future()
+        with self.__lock:
+            if self.__closed:
+                raise RuntimeError("The inference server is closed.")
+            self.__requests.put((np.asarray(board), None if mask is None else np.asarray(mask), future))
+        return future
+
+    def predict(self, board: np.ndarray, mask: Optional[np.ndarray] = None):
+        """
+        Returns the column to play on a single board, waiting on the micro-batch it is part of.
+        """
+        return self.submit(board, mask).result()
+
+    def __call__(self, batch: ts.data.Batch, state=None, **kwargs):
+        """
+        Returns a batch with the column (act) of every board in batch.obs, as calling the policy would.
+        Every board is served as a separate request, thus it shares a forward pass with the requests of other games.
+        """
+        observations = batch.obs
+        if isinstance(observations, ts.data.Batch):
+            masks = observations.mask if "mask" in observations.keys() else [None] * len(observations.obs)
+            futures = [self.submit(board, mask) for board, mask in zip(observations.obs, masks)]
+        else:
+            futures = [self.submit(board) for board in observations]
+        return ts.data.Batch(act= np.array([future.result() for future in futures]))
+
+    def close(self):
+        """
+        Answers the pending requests and stops the server thread.
+        """
+        with self.__lock:
+            if self.__closed:
+                return
+            self.__closed = True
+            self.__requests.put(None)
+        self.__thread.join()
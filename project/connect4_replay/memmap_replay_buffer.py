@@ -0,0 +1,193 @@
+####################################################
+# ABOUT THIS FILE
+####################################################
+# Description: Replay buffer for the connect four environments backed by memory-mapped files
+#   Every field (packed boards, packed action masks, agent, action, rewards and done flags) is stored in its own .npy file
+#   of a fixed amount of transitions, which the sub-buffers of the replay buffer use as a ring.
+#   Sampling reads the transitions straight from the mapping, thus only the touched pages are held in memory
+#   and buffers larger than the RAM of the machine can be used.
+#   The write position of every sub-buffer is kept in a file as well, such that a later run continues from the existing files.
+#
+# Author name: Lennert Bontinck
+# Author email: lennert.bontinck@vub.be / info@lennertbontinck.com
+#
+# Folder layout:
+#   obs.npy          packed boards, (size, ceil(rows * columns / 4)) uint8 (see pack_boards)
+#   mask.npy         packed action masks, (size, ceil(columns / 8)) uint8 (see pack_masks)
+#   agent_id.npy     index of the agent to move in agents, (size,) int8
+#   act.npy          column played, (size,) int8
+#   rew.npy          rewards of all agents, (size, agents) float32
+#   done.npy         whether the game ended, (size,) bool
+#   state.npy        next write position, size and start of the ongoing episode per sub-buffer, (buffer_num, 3) int64
+
+
+####################################################
+# IMPORTS
+####################################################
+
+# Paths of the files
+import os
+
+# Allow for optionals
+from typing import Optional, Union, List, Sequence
+
+# Numpy for easy numerical data structures
+import numpy as np
+
+# Tianshou for the replay buffers and batches
+import tianshou as ts
+
+# Packing of the boards and masks
+from connect4_replay.packed_replay_buffer import PackedVectorReplayBuffer, pack_boards, pack_masks
+
+####################################################
+# GLOBAL VARIABLES
+####################################################
+
+# Columns of the state file
+STATE_INDEX = 0
+STATE_SIZE = 1
+STATE_EPISODE_START = 2
+
+####################################################
+# MEMORY-MAPPED REPLAY BUFFER
+####################################################
+
+class MemmapVectorReplayBuffer(PackedVectorReplayBuffer):
+    """
+    VectorReplayBuffer for the connect four environments storing its transitions in memory-mapped files in the folder path.
+    Observations are expected in the {"agent_id": ..., "obs": ..., "mask": ...} format of the Tianshou PettingZooEnv wrapper,
+        with the rewards of all agents per transition.
+    Only obs, act, rew and done are stored: obs_next is taken from the next transition of the same environment (ignore_obs_next).
+    If the folder holds the files of an earlier run, those are opened and the buffer continues where the earlier run stopped.
+    The episodes that were still ongoing when that run stopped are dropped, or marked done if their sub-buffer was already full,
+        such that n-step returns never chain an interrupted episode to a new one.
+    Changes are written to the files by the operating system, use flush to force this.
+    """
+
+    def __init__(self,
+                 path: str,
+                 total_size: int,
+                 buffer_num: int,
+                 grid_column_count: int = 7,
+                 grid_row_count: int = 6,
+                 agents: Sequence[str] = ("player_1", "player_2"),
+                 **kwargs):
+        kwargs["ignore_obs_next"] = True
+        super().__init__(total_size, buffer_num, **kwargs)
+        self.path = path
+        self.row_count = grid_row_count
+        self.column_count = grid_column_count
+        self.agents = list(agents)
+        self.__agent_ids = np.array(self.agents)
+        self.__agent_indices = {agent: index for index, agent in enumerate(self.agents)}
+
+        # Fields of a transition as (file name, shape of one transition, dtype)
+        fields = [
+            ("obs", pack_boards(np.zeros((1, grid_row_count, grid_column_count))).shape[1:], np.uint8),
+            ("mask", pack_masks(np.zeros((1, grid_column_count))).shape[1:], np.uint8),
+            ("agent_id", (), np.int8),
+            ("act", (), np.int8),
+            ("rew", (len(self.agents),), np.float32),
+            ("done", (), np.bool_),
+            ]
+
+        # Open the files of an earlier run or create them
+        os.makedirs(path, exist_ok= True)
+        resume = os.path.exists(os.path.join(path, "state.npy"))
+        arrays = {name: self.__open_file(name, (self.maxsize,) + shape, dtype, resume) for name, shape, dtype in fields}
+        self.__state = self.__open_file("state", (self.buffer_num, 3), np.int64, resume)
+
+        self.set_batch(ts.data.Batch(obs= ts.data.Batch(obs= arrays["obs"], mask= arrays["mask"], agent_id= arrays["agent_id"]),
+                                     act= arrays["act"],
+                                     rew= arrays["rew"],
+                                     done= arrays["done"]))
+        if resume:
+            self.__restore_state()
+
+    def __open_file(self, name: str, shape: tuple, dtype: np.dtype, resume: bool):
+        """
+        Private function to open (resume) or create the memory-mapped .npy file of a field.
+        """
+        file_path = os.path.join(self.path, name + ".npy")
+        if not resume:
+            return np.lib.format.open_memmap(file_path, mode= "w+", dtype= dtype, shape= shape)
+
+        array = np.lib.format.open_memmap(file_path, mode= "r+")
+        if array.shape != shape or array.dtype != dtype:
+            raise ValueError(f"{file_path} holds {array.shape} {array.dtype}, expected {shape} {np.dtype(dtype)}. "
+                             "Use the same total_size, buffer_num, board size and agents as the earlier run.")
+        return array
+
+    def __restore_state(self):
+        """
+        Private function to restore the write positions of the sub-buffers from the state file, ending interrupted episodes.
+        """
+        for buffer_id, (offset, sub_buffer) in enumerate(zip(self._offset, self.buffers)):
+            index, size, episode_start = (int(value) for value in self.__state[buffer_id])
+            if index != episode_start:
+                if size < sub_buffer.maxsize:
+                    # Drop the interrupted episode, its transitions being the last ones written
+                    size -= (index - episode_start) % sub_buffer.maxsize
+                    index = episode_start
+                else:
+                    # The oldest transitions were already overwritten, end the interrupted episode instead
+                    self.done[offset + (index - 1) % sub_buffer.maxsize] = True
+
+            sub_buffer._index, sub_buffer._size, sub_buffer._ep_idx = index, size, index
+            sub_buffer.last_index[0] = (index - 1) % sub_buffer.maxsize
+            self.last_index[buffer_id] = offset + sub_buffer.last_index[0]
+            self._lengths[buffer_id] = size
+        self.__save_state()
+
+    def __save_state(self):
+        """
+        Private function to write the write positions of the sub-buffers to the state file.
+        """
+        for buffer_id, sub_buffer in enumerate(self.buffers):
+            self.__state[buffer_id] = (sub_buffer._index, sub_buffer._size, sub_buffer._ep_idx)
+
+    def reset(self, keep_statistics: bool = False):
+        """
+        Clears all the data in the replay buffer, the files being overwritten by the next transitions.
+        """
+        super().reset(keep_statistics= keep_statistics)
+        if hasattr(self, "_MemmapVectorReplayBuffer__state"):
+            self.__save_state()
+
+    def add(self,
+            batch: ts.data.Batch,
+            buffer_ids: Optional[Union[np.ndarray, List[int]]] = None):
+        """
+        Adds a batch of transitions, one per environment in buffer_ids (all per default), as ts.data.VectorReplayBuffer does.
+        """
+        # Only the stored fields are kept, the agents being stored as their index
+        observation = ts.data.Batch(obs= batch.obs.obs,
+                                    mask= batch.obs.mask,
+                                    agent_id= np.array([self.__agent_indices[agent] for agent in batch.obs.agent_id], dtype= np.int8))
+        result = super().add(ts.data.Batch(obs= observation, act= batch.act, rew= batch.rew, done= batch.done), buffer_ids)
+
+        self.__save_state()
+        return result
+
+    def __getitem__(self, index: Union[slice, int, List[int], np.ndarray]):
+        """
+        Returns the transitions at the given indices, read from the files, with their boards, action masks and agents unpacked.
+        """
+        batch = super().__getitem__(index)
+        if np.ndim(batch.act) == 0:
+            return batch
+
+        batch.act = batch.act.astype(np.int64)
+        batch.rew = batch.rew.astype(np.float64)
+        for key in ("obs", "obs_next"):
+            if not batch[key].is_empty():
+                batch[key].agent_id = self.__agent_ids[batch[key].agent_id]
+        return batch
+
+    def flush(self):
+        """
+        Writes all changes of the memory-mapped files to disk.
+        """
+        for array in (self.obs.obs, self.obs.mask, self.obs.agent_id, self.act, self.rew, self.done, self.__state):
+            array.flush()
@@ -0,0 +1,164 @@
+####################################################
+# ABOUT THIS FILE
+####################################################
+# Description: Replay buffer storing the connect four boards packed in 2 bits per cell
+#   A cell only holds one of three grid codes (empty, player 1 or player 2), thus four cells fit in one byte.
+#   A 6x7 board takes up 11 bytes instead of 42 int8 (or 336 float64) bytes and its action mask 1 byte instead of 7.
+#   Boards and masks are packed for a whole batch when added and unpacked for a whole batch when sampled,
+#   using vectorized numpy operations only.
+#
+# Author name: Lennert Bontinck
+# Author email: lennert.bontinck@vub.be / info@lennertbontinck.com
+
+
+####################################################
+# IMPORTS
+####################################################
+
+# Allow for optionals
+from typing import Optional, Union, List
+
+# Numpy for easy numerical data structures
+import numpy as np
+
+# Tianshou for the replay buffers and batches
+import tianshou as ts
+
+# Symmetric replay buffer to combine with the packed storage
+from connect4_replay.symmetric_replay_buffer import SymmetricVectorReplayBuffer
+
+####################################################
+# GLOBAL VARIABLES
+####################################################
+
+# Bits used per cell and the resulting amount of cells per byte
+CELL_BITS = 2
+CELLS_PER_BYTE = 8 // CELL_BITS
+CELL_SHIFTS = np.arange(CELLS_PER_BYTE, dtype= np.uint8) * CELL_BITS
+CELL_MASK = (1 << CELL_BITS) - 1
+
+####################################################
+# PACKING
+####################################################
+
+def pack_boards(boards: np.ndarray):
+    """
+    Packs a batch of boards (shape (N, rows, columns)) with grid codes 0, 1 or 2 into shape (N, ceil(rows * columns / 4)) uint8.
+    Cells are packed in row-major order, the first cell of every four being stored in the lowest bits.
+    """
+    boards = np.asarray(boards)
+    cells = boards.reshape(len(boards), -1).astype(np.uint8)
+
+    # Pad the cells to a multiple of four, the padding cells being empty
+    padding = -cells.shape[1] % CELLS_PER_BYTE
+    if padding > 0:
+        cells = np.pad(cells, ((0, 0), (0, padding)))
+
+    cells = cells.reshape(len(boards), -1, CELLS_PER_BYTE) << CELL_SHIFTS
+    return np.bitwise_or.reduce(cells, axis= 2)
+
+def unpack_boards(packed_boards: np.ndarray, row_count: int, column_count: int, dtype: np.dtype = np.int8):
+    """
+    Unpacks a batch of boards packed by pack_boards into shape (N, rows, columns).
+    """
+    packed_boards = np.asarray(packed_boards, dtype= np.uint8)
+    cells = (packed_boards[:, :, None] >> CELL_SHIFTS) & CELL_MASK
+    cells = cells.reshape(len(packed_boards), -1)[:, :row_count * column_count]
+    return cells.reshape(len(packed_boards), row_count, column_count).astype(dtype)
+
+def pack_masks(masks: np.ndarray):
+    """
+    Packs a batch of action masks (shape (N, columns)) into one bit per column, shape (N, ceil(columns / 8)) uint8.
+    """
+    return np.packbits(np.asarray(masks, dtype= bool), axis= 1)
+
+def unpack_masks(packed_masks: np.ndarray, column_count: int):
+    """
+    Unpacks a batch of action masks packed by pack_masks into shape (N, columns) bool.
+    """
+    return np.unpackbits(np.asarray(packed_masks, dtype= np.uint8), axis= 1, count= column_count).astype(bool)
+
+####################################################
+# PACKED REPLAY BUFFER
+####################################################
+
+class PackedVectorReplayBuffer(ts.data.VectorReplayBuffer):
+    """
+    VectorReplayBuffer for the connect four environments storing the boards of obs and obs_next packed in 2 bits per cell
+        and their action masks in 1 bit per column (see pack_boards and pack_masks).
+    Transitions are added and sampled unpacked, thus it can be used wherever a ts.data.VectorReplayBuffer is used.
+    Observations are either boards or the {"agent_id": ..., "obs": ..., "mask": ...} batches of the Tianshou PettingZooEnv wrapper.
+    Sampled boards are int8, as returned by the V2 environment.
+    """
+
+    def __init__(self, total_size: int, buffer_num: int, **kwargs):
+        # Board size, taken from the first added transitions
+        self.row_count = None
+        self.column_count = None
+
+        super().__init__(total_size, buffer_num, **kwargs)
+
+    def __pack_observation(self, observation: Union[ts.data.Batch, np.ndarray]):
+        """
+        Private function to get a packed copy of a batch of observations.
+        """
+        if not isinstance(observation, ts.data.Batch):
+            return pack_boards(observation)
+
+        packed_observation = ts.data.Batch(observation)
+        packed_observation.obs = pack_boards(observation.obs)
+        if "mask" in observation.keys():
+            packed_observation.mask = pack_masks(observation.mask)
+        return packed_observation
+
+    def __unpack_observation(self, packed_observation: Union[ts.data.Batch, np.ndarray]):
+        """
+        Private function to unpack a batch of observations in place where possible.
+        """
+        if not isinstance(packed_observation, ts.data.Batch):
+            return unpack_boards(packed_observation, self.row_count, self.column_count)
+        if packed_observation.is_empty():
+            return packed_observation
+
+        packed_observation.obs = unpack_boards(packed_observation.obs, self.row_count, self.column_count)
+        if "mask" in packed_observation.keys():
+            packed_observation.mask = unpack_masks(packed_observation.mask, self.column_count)
+        return packed_observation
+
+    def add(self,
+            batch: ts.data.Batch,
+            buffer_ids: Optional[Union[np.ndarray, List[int]]] = None):
+        """
+        Adds a batch of transitions, one per environment in buffer_ids (all per default), as ts.data.VectorReplayBuffer does.
+        The boards and action masks are packed before storing them, the given batch is left untouched.
+        """
+        if self.row_count is None:
+            boards = batch.obs.obs if isinstance(batch.obs, ts.data.Batch) else batch.obs
+            self.row_count, self.column_count = np.shape(boards)[-2:]
+
+        packed_batch = ts.data.Batch(batch)
+        packed_batch.obs = self.__pack_observation(batch.obs)
+        if "obs_next" in batch.keys():
+            packed_batch.obs_next = self.__pack_observation(batch.obs_next)
+        return super().add(packed_batch, buffer_ids)
+
+    def __getitem__(self, index: Union[slice, int, List[int], np.ndarray]):
+        """
+        Returns the transitions at the given indices with their boards and action masks unpacked.
+        """
+        # A single index is sampled as a batch of one, such that the boards are unpacked as a batch
+        if isinstance(index, (int, np.integer)):
+            return self[np.array([index])][0]
+
+        batch = super().__getitem__(index)
+        if self.row_count is not None:
+            batch.obs = self.__unpack_observation(batch.obs)
+            batch.obs_next = self.__unpack_observation(batch.obs_next)
+        return batch
+
+class PackedSymmetricVectorReplayBuffer(SymmetricVectorReplayBuffer, PackedVectorReplayBuffer):
+    """
+    SymmetricVectorReplayBuffer storing its transitions packed as PackedVectorReplayBuffer does.
+    Canonicalisation, mirror augmentation and deduplication are done on the unpacked transitions, before they are packed.
+    """
+    pass
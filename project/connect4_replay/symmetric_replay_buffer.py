@@ -0,0 +1,223 @@
+####################################################
+# ABOUT THIS FILE
+####################################################
+# Description: Symmetry-aware replay buffer for the connect four environments
+#   Connect four positions are mirror-symmetric left to right: mirroring the board, action mask and action gives an equally valid transition.
+#   The replay buffer below can store every transition in a canonical orientation, augment the buffer with the mirrored transitions
+#   and skip (obs, act) pairs already present in the buffer using a hash index on the canonical board and action.
+#   It is a drop-in replacement for ts.data.VectorReplayBuffer when collecting from the connect four environments.
+#
+# Author name: Lennert Bontinck
+# Author email: lennert.bontinck@vub.be / info@lennertbontinck.com
+
+
+####################################################
+# IMPORTS
+####################################################
+
+# Allow for optionals
+from typing import Optional, Union, List
+
+# Numpy for easy numerical data structures
+import numpy as np
+
+# Tianshou for the replay buffers and batches
+import tianshou as ts
+
+####################################################
+# MIRRORING
+####################################################
+
+def mirror_boards(boards: np.ndarray):
+    """
+    Returns a view of the boards (or action masks) with the order of the columns reversed, e.g. mirrored left to right.
+    Columns are always the last axis, thus both single boards and batches of boards are supported.
+    """
+    return np.flip(boards, axis= -1)
+
+def mirror_is_canonical(boards: np.ndarray):
+    """
+    Returns for each board of a batch (shape (N, rows, columns)) whether its mirror image is the canonical orientation.
+    The canonical orientation is the lexicographically smallest of both, boards that are their own mirror image are canonical.
+    """
+    boards = np.asarray(boards)
+    flat_boards = boards.reshape(len(boards), -1)
+    flat_mirrored_boards = mirror_boards(boards).reshape(len(boards), -1)
+
+    # The first cell in which a board and its mirror image differ decides
+    differ = flat_boards != flat_mirrored_boards
+    first_difference = differ.argmax(axis= 1)
+    board_indices = np.arange(len(boards))
+    return differ[board_indices, first_difference] & \
+        (flat_mirrored_boards[board_indices, first_difference] < flat_boards[board_indices, first_difference])
+
+def canonical_boards(boards: np.ndarray):
+    """
+    Returns the canonical orientation of each board of a batch and whether it was mirrored.
+    A policy trained on a canonical buffer uses this to canonicalise its observations, mirroring the chosen column back.
+    """
+    boards = np.asarray(boards)
+    mirrored = mirror_is_canonical(boards)
+    return np.where(mirrored[:, None, None], mirror_boards(boards), boards), mirrored
+
+def mirror_transitions(batch: ts.data.Batch, rows: Optional[np.ndarray] = None):
+    """
+    Returns a copy of a batch of transitions with the given rows (all per default) mirrored.
+    The boards and action masks of obs and obs_next are mirrored and the actions are remapped to the mirrored columns.
+    Observations are either boards or the {"agent_id": ..., "obs": ..., "mask": ...} batches of the Tianshou PettingZooEnv wrapper.
+    """
+    batch = ts.data.Batch(batch, copy= True)
+    rows = np.arange(len(batch)) if rows is None else np.asarray(rows)
+
+    column_count = None
+    for key in ("obs", "obs_next"):
+        if key not in batch.keys():
+            continue
+
+        observation = batch[key]
+        if isinstance(observation, ts.data.Batch):
+            observation.obs[rows] = mirror_boards(observation.obs[rows])
+            if "mask" in observation.keys():
+                observation.mask[rows] = mirror_boards(observation.mask[rows])
+            column_count = observation.obs.shape[-1]
+        else:
+            observation[rows] = mirror_boards(observation[rows])
+            column_count = observation.shape[-1]
+
+    batch.act[rows] = column_count - 1 - batch.act[rows]
+    return batch
+
+def _observation_boards(observation: Union[ts.data.Batch, np.ndarray]):
+    """
+    Private function to get the boards of a batch of observations.
+    """
+    if isinstance(observation, ts.data.Batch):
+        return np.asarray(observation.obs)
+    return np.asarray(observation)
+
+####################################################
+# SYMMETRIC REPLAY BUFFER
+####################################################
+
+class SymmetricVectorReplayBuffer(ts.data.VectorReplayBuffer):
+    """
+    VectorReplayBuffer for the connect four environments which makes use of the left to right symmetry of the game.
+        - canonicalize: store every transition in the canonical orientation of its obs (see mirror_is_canonical).
+            The policy should then canonicalise its observations too (see canonical_boards).
+        - mirror_augment: also store the mirrored copy of every transition.
+            Mirrored transitions are kept in their own sub-buffers (buffer_num extra), thus n-step returns never mix both orientations.
+        - deduplicate: skip transitions whose (obs, act) is already in the buffer, either as is or mirrored.
+            Only the start of an episode is skipped, once a transition of an episode is stored all further ones are stored as well
+            and the final transition of an episode is always stored. This keeps obs_next, n-step returns and the episode statistics
+            for the collector correct, while the early-game positions that all games share are no longer stored over and over.
+    The total_size is shared by all sub-buffers, thus with mirror_augment each orientation gets half of it.
+    """
+
+    def __init__(self,
+                 total_size: int,
+                 buffer_num: int,
+                 canonicalize: bool = False,
+                 mirror_augment: bool = False,
+                 deduplicate: bool = False,
+                 **kwargs):
+        # Settings are needed by reset, which is called while initialising the sub-buffers
+        self.env_buffer_num = buffer_num
+        self.canonicalize = canonicalize
+        self.mirror_augment = mirror_augment
+        self.deduplicate = deduplicate
+
+        super().__init__(total_size, 2 * buffer_num if mirror_augment else buffer_num, **kwargs)
+
+    def reset(self, keep_statistics: bool = False):
+        """
+        Clears all the data in the replay buffer, including the hash index.
+        """
+        super().reset(keep_statistics= keep_statistics)
+
+        # Hash index: key of the (obs, act) pair -> amount of stored transitions with that key
+        self.__key_counts = {}
+        self.__slot_keys = [None] * self.maxsize
+
+        # Whether or not a transition of the ongoing episode of each environment is stored
+        self.__episode_stored = np.zeros(self.env_buffer_num, dtype= bool)
+
+    def __transition_keys(self, boards: np.ndarray, actions: np.ndarray):
+        """
+        Private function to get the hash index key of each (obs, act) pair, equal for mirror images.
+        """
+        boards, mirrored = canonical_boards(boards)
+        actions = np.where(mirrored, boards.shape[-1] - 1 - actions, actions)
+        return [board.tobytes() + int(action).to_bytes(1, "little") for board, action in zip(boards, actions)]
+
+    def __index_transitions(self, ptrs: np.ndarray, keys: List[bytes]):
+        """
+        Private function to register the keys of newly stored transitions, forgetting the keys of the transitions they overwrite.
+        """
+        for ptr, key in zip(ptrs.tolist(), keys):
+            old_key = self.__slot_keys[ptr]
+            if old_key is not None:
+                self.__key_counts[old_key] -= 1
+                if self.__key_counts[old_key] == 0:
+                    del self.__key_counts[old_key]
+
+            self.__slot_keys[ptr] = key
+            self.__key_counts[key] = self.__key_counts.get(key, 0) + 1
+
+    def add(self,
+            batch: ts.data.Batch,
+            buffer_ids: Optional[Union[np.ndarray, List[int]]] = None):
+        """
+        Adds a batch of transitions, one per environment in buffer_ids (all per default), as ts.data.VectorReplayBuffer does.
+        Returns the (current_index, episode_reward, episode_length, episode_start_index) of every transition,
+            for skipped transitions the current_index is the last stored transition of their environment.
+        """
+        buffer_ids = np.arange(self.env_buffer_num) if buffer_ids is None else np.asarray(buffer_ids)
+        boards = _observation_boards(batch.obs)
+        actions = np.asarray(batch.act)
+        dones = np.asarray(batch.done, dtype= bool)
+
+        # Store transitions in their canonical orientation
+        if self.canonicalize:
+            mirrored = mirror_is_canonical(boards)
+            if mirrored.any():
+                batch = mirror_transitions(batch, np.nonzero(mirrored)[0])
+
+        # Skip the start of an episode as long as its (obs, act) pairs are already stored
+        store = np.ones(len(buffer_ids), dtype= bool)
+        if self.deduplicate:
+            keys = self.__transition_keys(boards, actions)
+            duplicate = np.array([key in self.__key_counts for key in keys], dtype= bool)
+            store = ~duplicate | self.__episode_stored[buffer_ids] | dones
+
+        # Results for every transition, the skipped ones still count for the episode statistics
+        rewards = np.asarray(batch.rew)
+        ptrs = self.last_index[buffer_ids].copy()
+        ep_rews = np.zeros(rewards.shape, dtype= np.float64)
+        ep_lens = np.zeros(len(buffer_ids), dtype= np.int64)
+        ep_idxs = np.zeros(len(buffer_ids), dtype= np.int64)
+        for position in np.nonzero(~store)[0]:
+            sub_buffer = self.buffers[buffer_ids[position]]
+            sub_buffer._ep_rew += rewards[position]
+            sub_buffer._ep_len += 1
+            ep_idxs[position] = sub_buffer._ep_idx + self._offset[buffer_ids[position]]
+
+        stored_positions = np.nonzero(store)[0]
+        if len(stored_positions) > 0:
+            stored_batch = batch if len(stored_positions) == len(buffer_ids) else batch[stored_positions]
+            stored_ids = buffer_ids[stored_positions]
+            ptrs[stored_positions], ep_rews[stored_positions], ep_lens[stored_positions], ep_idxs[stored_positions] = \
+                super().add(stored_batch, stored_ids)
+
+            # Mirrored copies go to the sub-buffers following the ones of the environments
+            if self.mirror_augment:
+                mirror_ptrs, _, _, _ = super().add(mirror_transitions(stored_batch), stored_ids + self.env_buffer_num)
+
+            if self.deduplicate:
+                stored_keys = [keys[position] for position in stored_positions]
+                self.__index_transitions(ptrs[stored_positions], stored_keys)
+                if self.mirror_augment:
+                    self.__index_transitions(mirror_ptrs, stored_keys)
+
+        # Episodes start over after a done transition
+        self.__episode_stored[buffer_ids] = store & ~dones
+        return ptrs, ep_rews, ep_lens, ep_idxs
@@ -0,0 +1,316 @@
+####################################################
+# ABOUT THIS FILE
+####################################################
+# Description: Streaming dataset of connect four transitions replayed from the move sequences of the self-play generator
+#   The games of a shard are replayed all at once on bitboards: the coin of every move is a single bit,
+#   thus the bitboards after every move of a game are a cumulative sum of these bits, restarted at the first move of every game.
+#   Boards are only built from the bitboards for the transitions of a batch.
+#   A prefetch thread reads, replays and batches the shards, such that the learner does not wait on the disk.
+#
+# Author name: Lennert Bontinck
+# Author email: lennert.bontinck@vub.be / info@lennertbontinck.com
+
+
+####################################################
+# IMPORTS
+####################################################
+
+# Prefetch thread and its queue
+import threading
+import queue
+
+# Allow for optionals
+from typing import Optional, Sequence
+
+# Numpy for easy numerical data structures
+import numpy as np
+
+# Tianshou for the batches
+import tianshou as ts
+
+# Bitboard game core for the bit layout of the boards
+from connect4_core.bitboard_connect_four import BitboardConnectFour, GRID_PLAYER1_COIN, GRID_PLAYER2_COIN
+
+# Index and shards of the self-play generator
+from connect4_selfplay.self_play_generator import load_index, load_shard, RESULT_DRAW
+
+####################################################
+# GLOBAL VARIABLES
+####################################################
+
+# Default rewards, the same as those of the V2 environment
+REWARD_WIN = 10
+REWARD_LOSS = -10
+REWARD_DRAW = 5
+REWARD_MOVE = 0
+
+# Seconds between checks whether the iteration stopped while waiting on the queue
+QUEUE_TIMEOUT = 1
+
+# Bits of the unsigned integers holding the bitboards
+BITBOARD_BITS = 64
+
+####################################################
+# REPLAYING GAMES
+####################################################
+
+def check_board_size(column_count: int, row_count: int):
+    """
+    Raises a ValueError if a bitboard of the board size (row_count + 1 bits per column) does not fit in a 64-bit integer, e.g. 10x8.
+    """
+    if column_count * (row_count + 1) > BITBOARD_BITS:
+        raise ValueError(f"A {column_count}x{row_count} board takes up {column_count * (row_count + 1)} bits, "
+                         f"only boards of at most {BITBOARD_BITS} bits (e.g. 7x6 or 8x7) can be replayed.")
+
+def replay_games(moves: np.ndarray, lengths: np.ndarray, column_count: int = 7, row_count: int = 6):
+    """
+    Replays the games of a shard (see load_shard) at once.
+    Returns the bitboards of both grid codes after every move, (moves, 2) uint64 in the layout of BitboardConnectFour,
+        the heights of the columns before every move, (moves, columns) int16, and the index of every move in its game.
+    """
+    check_board_size(column_count, row_count)
+    game = BitboardConnectFour(column_count= column_count, row_count= row_count)
+    moves = np.asarray(moves, dtype= np.int64)
+    lengths = np.asarray(lengths, dtype= np.int64)
+    starts = np.cumsum(lengths) - lengths
+
+    # Index of every move in its game, its first move being 0
+    plies = np.arange(len(moves)) - np.repeat(starts, lengths)
+
+    # Heights before every move: the amount of earlier moves of the same game in the same column
+    played = np.zeros((len(moves), column_count), dtype= np.int16)
+    played[np.arange(len(moves)), moves] = 1
+    heights_after = np.cumsum(played, axis= 0, dtype= np.int16)
+    heights_after -= np.repeat(heights_after[starts] - played[starts], lengths, axis= 0)
+    heights = heights_after - played
+
+    # Bit of every move, added to the bitboard of its grid code (the first move of a game being GRID_PLAYER1_COIN)
+    bits = np.left_shift(np.uint64(1), (moves * game.column_bit_count + heights[np.arange(len(moves)), moves]).astype(np.uint64))
+    coin_bits = np.zeros((len(moves), 2), dtype= np.uint64)
+    coin_bits[np.arange(len(moves)), plies % 2] = bits
+
+    # Every bit is only set once per game, thus the cumulative sum of the bits is their union
+    bitboards = np.cumsum(coin_bits, axis= 0, dtype= np.uint64)
+    bitboards -= np.repeat(bitboards[starts] - coin_bits[starts], lengths, axis= 0)
+    return bitboards, heights, plies
+
+def bitboards_to_boards(bitboards: np.ndarray, column_count: int = 7, row_count: int = 6, coins: Sequence[int] = (GRID_PLAYER1_COIN, GRID_PLAYER2_COIN)):
+    """
+    Returns the (N, rows, columns) int8 boards of (N, 2) bitboards, the cells of bitboard i holding coins[i].
+    Row 0 is the bottom row, as done by the gym environments.
+    """
+    check_board_size(column_count, row_count)
+    cell_bits = np.array([[column * (row_count + 1) + row for column in range(column_count)] for row in range(row_count)], dtype= np.uint64)
+    cells = (bitboards[:, :, None, None] >> cell_bits) & np.uint64(1)
+    return (cells[:, 0] * coins[0] + cells[:, 1] * coins[1]).astype(np.int8)
+
+####################################################
+# DATASET
+####################################################
+
+class MoveSequenceDataset:
+    """
+    Iterable over batches of transitions of the games in a self-play folder (see generate_self_play_games).
+    Every move is one transition for the player that made it, as seen by that player:
+        obs.obs        board before the move, (batch, rows, columns) int8
+        obs.mask       playable columns of obs.obs, (batch, columns) bool
+        act            column played
+        rew            reward_win when the move wins, reward_loss when the oponent wins with the next move,
+                       reward_draw when either move fills the board and reward_move otherwise
+        obs_next.obs   board the player sees on its next move, i.e. after the answer of the oponent (or after the last move of the game)
+        obs_next.mask  playable columns of obs_next.obs
+        done           whether the game ended with this move or the answer of the oponent
+    The observations are nested with their mask in the same way as those of the gym environments, as read by the tianshou policies.
+    With network_coin, the boards of both players show their own coins as network_coin (as with the neural MCTS agent),
+        otherwise the grid codes of the game are kept. Only the moves of the grid codes in coins are used.
+    With mirror_augment, every transition is mirrored (boards, masks and column) with a probability of 0.5.
+    With skip_random_openings, the random opening moves of the generator are not used, e.g. for supervised pretraining.
+    Every iteration is one epoch, the shards and the transitions within a shard being shuffled with a seed of its own.
+    A thread prefetches up to prefetch batches while the previous ones are being used.
+    The batches can be added to a ts.data.ReplayBuffer for a DQN or Rainbow policy (estimation_step 1, as the transitions are shuffled).
+    """
+
+    def __init__(self,
+                 path: str,
+                 batch_size: int,
+                 shuffle: bool = True,
+                 mirror_augment: bool = False,
+                 network_coin: Optional[int] = None,
+                 coins: Sequence[int] = (GRID_PLAYER1_COIN, GRID_PLAYER2_COIN),
+                 skip_random_openings: bool = False,
+                 drop_last: bool = False,
+                 prefetch: int = 4,
+                 seed: int = 0,
+                 reward_win: float = REWARD_WIN,
+                 reward_loss: float = REWARD_LOSS,
+                 reward_draw: float = REWARD_DRAW,
+                 reward_move: float = REWARD_MOVE):
+        self.path = path
+        self.index = load_index(path)
+        if self.index is None:
+            raise ValueError(f"{path} holds no self-play index, generate games with generate_self_play_games first.")
+
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.mirror_augment = mirror_augment
+        self.network_coin = network_coin
+        self.coins = tuple(coins)
+        self.skip_random_openings = skip_random_openings
+        self.drop_last = drop_last
+        self.prefetch = prefetch
+        self.seed = seed
+        self.reward_win = reward_win
+        self.reward_loss = reward_loss
+        self.reward_draw = reward_draw
+        self.reward_move = reward_move
+        self.column_count = self.index["column_count"]
+        self.row_count = self.index["row_count"]
+        check_board_size(self.column_count, self.row_count)
+        self.__epoch = 0
+
+    def shard_transitions(self, shard: dict):
+        """
+        Returns the transitions of all used moves of a shard (see load_shard) in game order as a ts.data.Batch.
+        The boards are built from bitboards, thus this is the expensive part of a batch, done for a shard at once.
+        """
+        lengths = shard["lengths"].astype(np.int64)
+        bitboards, heights, plies = replay_games(shard["moves"], lengths, self.column_count, self.row_count)
+        move_count = len(plies)
+        game_ends = np.repeat(np.cumsum(lengths), lengths)
+        results = np.repeat(shard["results"], lengths)
+
+        # Bitboards before every move, and after the answer of the oponent (or the last move of the game)
+        indices = np.arange(move_count)
+        next_indices = np.minimum(indices + 1, game_ends - 1)
+        bitboards_before = np.where((plies == 0)[:, None], np.uint64(0), bitboards[indices - 1])
+        bitboards_next = bitboards[next_indices]
+
+        # Heights of the columns after the answer of the oponent: the heights before that move with its coin added
+        heights_next = heights[next_indices].copy()
+        heights_next[np.arange(move_count), shard["moves"][next_indices]] += 1
+
+        # The game ends with this move or the answer of the oponent
+        last_move = indices == game_ends - 1
+        done = indices >= game_ends - 2
+        draw = results == RESULT_DRAW
+        rew = np.full(move_count, self.reward_move, dtype= np.float64)
+        rew[done & draw] = self.reward_draw
+        rew[done & ~draw & last_move] = self.reward_win
+        rew[done & ~draw & ~last_move] = self.reward_loss
+
+        # Only the moves of the used grid codes, optionally without the random openings
+        movers = np.where(plies % 2 == 0, GRID_PLAYER1_COIN, GRID_PLAYER2_COIN)
+        used = np.isin(movers, self.coins)
+        if self.skip_random_openings:
+            used &= plies >= self.index["random_opening_moves"]
+
+        return ts.data.Batch(bitboards= bitboards_before[used],
+                             bitboards_next= bitboards_next[used],
+                             mover= movers[used],
+                             mask= heights[used] < self.row_count,
+                             mask_next= heights_next[used] < self.row_count,
+                             act= shard["moves"][used].astype(np.int64),
+                             rew= rew[used],
+                             done= done[used])
+
+    def __boards(self, bitboards: np.ndarray, movers: np.ndarray):
+        """
+        Private function to build the boards of a batch, recoded such that the mover has network_coin if given.
+        """
+        boards = bitboards_to_boards(bitboards, self.column_count, self.row_count)
+        if self.network_coin is None:
+            return boards
+
+        # Swap the grid codes of the boards of the mover without network_coin
+        swap = movers != self.network_coin
+        boards[swap] = np.where(boards[swap] == 0, 0, 3 - boards[swap]).astype(np.int8)
+        return boards
+
+    def __batch(self, transitions: ts.data.Batch, random: np.random.Generator):
+        """
+        Private function to turn shard transitions into a batch of the dataset, optionally mirrored.
+        """
+        obs = self.__boards(transitions.bitboards, transitions.mover)
+        obs_next = self.__boards(transitions.bitboards_next, transitions.mover)
+        mask = transitions.mask.copy()
+        mask_next = transitions.mask_next.copy()
+        act = transitions.act.copy()
+
+        if self.mirror_augment:
+            mirror = random.random(len(act)) < 0.5
+            obs[mirror] = obs[mirror, :, ::-1]
+            obs_next[mirror] = obs_next[mirror, :, ::-1]
+            mask[mirror] = mask[mirror, ::-1]
+            mask_next[mirror] = mask_next[mirror, ::-1]
+            act[mirror] = self.column_count - 1 - act[mirror]
+
+        return ts.data.Batch(obs= ts.data.Batch(obs= obs, mask= mask),
+                             act= act,
+                             rew= transitions.rew,
+                             obs_next= ts.data.Batch(obs= obs_next, mask= mask_next),
+                             done= transitions.done)
+
+    def __produce(self, epoch: int, batches: queue.Queue, stop: threading.Event):
+        """
+        Private function run by the prefetch thread, putting the batches of one epoch on the queue followed by None.
+        """
+        def put(item):
+            while not stop.is_set():
+                try:
+                    batches.put(item, timeout= QUEUE_TIMEOUT)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        try:
+            random = np.random.default_rng([self.seed, epoch])
+            shards = list(self.index["shards"])
+            if self.shuffle:
+                shards = [shards[i] for i in random.permutation(len(shards))]
+
+            # Transitions left over from the previous shard, completed by the next one
+            remainder = None
+            for shard in shards:
+                transitions = self.shard_transitions(load_shard(self.path, shard["file"]))
+                if self.shuffle:
+                    transitions = transitions[random.permutation(len(transitions))]
+                if remainder is not None:
+                    transitions = ts.data.Batch.cat([remainder, transitions])
+
+                full_count = len(transitions) - len(transitions) % self.batch_size
+                for start in range(0, full_count, self.batch_size):
+                    if not put(self.__batch(transitions[start:start + self.batch_size], random)):
+                        return
+                remainder = transitions[full_count:] if full_count < len(transitions) else None
+
+            if remainder is not None and not self.drop_last:
+                if not put(self.__batch(remainder, random)):
+                    return
+            put(None)
+        except Exception as exception:
+            put(exception)
+
+    def __iter__(self):
+        """
+        Yields the batches of one epoch, read and replayed by the prefetch thread.
+        """
+        epoch = self.__epoch
+        self.__epoch += 1
+
+        batches = queue.Queue(maxsize= self.prefetch)
+        stop = threading.Event()
+        thread = threading.Thread(target= self.__produce, args= (epoch, batches, stop), daemon= True)
+        thread.start()
+        try:
+            while True:
+                batch = batches.get()
+                if batch is None:
+                    break
+                if isinstance(batch, Exception):
+                    raise batch
+                yield batch
+        finally:
+            # Stop the thread when the iteration is stopped early
+            stop.set()
+            thread.join()
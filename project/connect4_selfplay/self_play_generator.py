@@ -0,0 +1,350 @@
+####################################################
+# ABOUT THIS FILE
+####################################################
+# Description: Self-play generator writing connect four games as move sequences to sharded, compressed files
+#   Games between two players (random, MiniMax, MCTS or a saved Tianshou policy) are played by a pool of processes,
+#   one shard of games_per_shard games per task. Every game only stores its columns, thus a game takes up about 20 bytes before compression.
+#   The games of a shard are fully determined by the seed and the index of the shard, not by the amount of workers.
+#   Finished shards are listed in an index file, a stopped run continues with the shards that are not listed yet.
+#
+# Author name: Lennert Bontinck
+# Author email: lennert.bontinck@vub.be / info@lennertbontinck.com
+#
+# Folder layout:
+#   index.json           settings of the run and a summary per finished shard (file, games, moves and results)
+#   shard_000000.npz     compressed arrays of one shard:
+#                          moves          columns of all games, one after the other, (moves,) uint8
+#                          lengths        amount of moves per game, (games,) uint16
+#                          results        grid code of the winner (0 for a draw), (games,) int8
+#                          first_players  index of the player (0 or 1) that played the first coin, (games,) int8
+
+
+####################################################
+# IMPORTS
+####################################################
+
+# Files of the shards and the index
+import os
+import json
+
+# Worker processes
+import multiprocessing as mp
+
+# Seeding of the games
+import random as rnd
+
+# Allow for optionals
+from typing import Optional, Callable
+
+# Numpy for easy numerical data structures
+import numpy as np
+
+# Torch for loading saved policies
+import torch
+
+# Tianshou for the policies and batches
+import tianshou as ts
+
+# Bitboard game core for playing the games and the bots
+from connect4_core.bitboard_connect_four import BitboardConnectFour, GRID_PLAYER1_COIN, GRID_PLAYER2_COIN
+import minimax_agent.minimax_agent as minimaxbot
+import mcts_agent.mcts_agent as mctsbot
+
+####################################################
+# GLOBAL VARIABLES
+####################################################
+
+# Version of the folder layout, stored in the index
+FORMAT_VERSION = 1
+
+# File names
+INDEX_FILE = "index.json"
+SHARD_FILE = "shard_{:06d}.npz"
+
+# Result of a drawn game
+RESULT_DRAW = 0
+
+####################################################
+# PLAYERS
+####################################################
+# A player describes how to create a bot, such that it can be sent to the worker processes.
+# create returns an object with a predict(board) function returning a column, as the MiniMax bot has.
+
+class _RandomBot:
+    """
+    Bot playing a uniformly random playable column.
+    """
+
+    def __init__(self, seed: int):
+        self.__random = rnd.Random(seed)
+
+    def predict(self, board):
+        return self.__random.choice([column for column in range(board.shape[1]) if board[-1][column] == 0])
+
+class _PolicyBot:
+    """
+    Bot playing the column of a Tianshou policy, as the human vs bot game does.
+    """
+
+    def __init__(self, policy: ts.policy.BasePolicy):
+        self.policy = policy
+
+    def predict(self, board):
+        with torch.no_grad():
+            return int(self.policy(ts.data.Batch(obs= [board], info= {})).act[0])
+
+class RandomPlayer:
+    """
+    Player making uniformly random moves.
+    """
+
+    def __init__(self, name: str = "random"):
+        self.name = name
+
+    def create(self, coin: int, oponent_coin: int, column_count: int, row_count: int, seed: int):
+        return _RandomBot(seed)
+
+class MiniMaxPlayer:
+    """
+    MiniMax agent searching up to minimax_depth. Use no time budget to keep the games deterministic.
+    """
+
+    def __init__(self, minimax_depth: int, name: Optional[str] = None, **kwargs):
+        self.minimax_depth = minimax_depth
+        self.name = f"minimax_{minimax_depth}" if name is None else name
+        self.kwargs = kwargs
+
+    def create(self, coin: int, oponent_coin: int, column_count: int, row_count: int, seed: int):
+        return minimaxbot.MiniMaxConnectFourBot(coin= coin,
+                                                oponent_coin= oponent_coin,
+                                                column_count= column_count,
+                                                row_count= row_count,
+                                                minimax_depth= self.minimax_depth,
+                                                **self.kwargs)
+
+class MCTSPlayer:
+    """
+    MCTS agent doing the given amount of simulations per move. Use no time budget to keep the games deterministic.
+    """
+
+    def __init__(self, simulations: int, name: Optional[str] = None, **kwargs):
+        self.simulations = simulations
+        self.name = f"mcts_{simulations}" if name is None else name
+        self.kwargs = kwargs
+
+    def create(self, coin: int, oponent_coin: int, column_count: int, row_count: int, seed: int):
+        return mctsbot.MCTSConnectFourBot(coin= coin,
+                                          oponent_coin= oponent_coin,
+                                          column_count= column_count,
+                                          row_count= row_count,
+                                          simulations= self.simulations,
+                                          seed= seed,
+                                          **self.kwargs)
+
+class PolicyPlayer:
+    """
+    Tianshou policy with the weights saved in the .pth file at path, e.g. a best_policy_agent1.pth of the paper notebooks.
+    get_policy returns a policy with the architecture of the saved one, it should be picklable when processes are spawned.
+    """
+
+    def __init__(self, get_policy: Callable[[], ts.policy.BasePolicy], path: str, name: Optional[str] = None):
+        self.get_policy = get_policy
+        self.path = path
+        self.name = path if name is None else name
+
+    def create(self, coin: int, oponent_coin: int, column_count: int, row_count: int, seed: int):
+        # Workers share the CPU cores, one thread each avoids oversubscribing them
+        torch.set_num_threads(1)
+
+        policy = self.get_policy()
+        policy.load_state_dict(torch.load(self.path, map_location= torch.device("cpu")))
+        policy.eval()
+        return _PolicyBot(policy)
+
+####################################################
+# PLAYING GAMES
+####################################################
+
+def play_game(bots: dict, game: BitboardConnectFour, random: rnd.Random, random_opening_moves: int = 0):
+    """
+    Plays one game between the bots, a dictionary of grid code to bot, the player with GRID_PLAYER1_COIN starting.
+    The first random_opening_moves moves are random, such that deterministic bots do not play the same game over and over.
+    Invalid columns of a bot are replaced by a random playable column, as the human vs bot game does.
+    Returns the played columns and the grid code of the winner (RESULT_DRAW for a draw).
+    """
+    game.reset()
+    board = np.zeros((game.row_count, game.column_count), dtype= np.int8)
+    coin = GRID_PLAYER1_COIN
+    moves = []
+
+    while True:
+        if len(moves) < random_opening_moves:
+            column = random.choice(game.valid_locations())
+        else:
+            column = bots[coin].predict(board)
+            if not (0 <= column < game.column_count and game.is_valid_location(column)):
+                column = random.choice(game.valid_locations())
+
+        row = game.place_coin(column, coin)
+        board[row][column] = coin
+        moves.append(column)
+
+        if game.winning_board(coin):
+            return moves, coin
+        if game.full_board():
+            return moves, RESULT_DRAW
+        coin = GRID_PLAYER2_COIN if coin == GRID_PLAYER1_COIN else GRID_PLAYER1_COIN
+
+def _seed(*keys: int):
+    """
+    Private function returning a 32-bit seed derived from the given integers.
+    """
+    return int(np.random.SeedSequence(list(keys)).generate_state(1)[0])
+
+####################################################
+# SHARDS AND INDEX
+####################################################
+
+def load_index(path: str):
+    """
+    Returns the index of a self-play folder, None if there is none yet.
+    """
+    index_path = os.path.join(path, INDEX_FILE)
+    if not os.path.exists(index_path):
+        return None
+    with open(index_path) as file:
+        return json.load(file)
+
+def __write_index(path: str, index: dict):
+    """
+    Private function to replace the index file, written to a temporary file first such that a stopped run never leaves half an index.
+    """
+    temporary_path = os.path.join(path, INDEX_FILE + ".tmp")
+    with open(temporary_path, "w") as file:
+        json.dump(index, file, indent= 1)
+    os.replace(temporary_path, os.path.join(path, INDEX_FILE))
+
+def load_shard(path: str, file_name: str):
+    """
+    Returns the moves, lengths, results and first_players arrays of a shard (see the folder layout).
+    """
+    with np.load(os.path.join(path, file_name)) as shard:
+        return {key: shard[key] for key in ("moves", "lengths", "results", "first_players")}
+
+def _generate_shard(task: tuple):
+    """
+    Private function run by the worker processes, playing the games of one shard and writing them to its file.
+    Returns the summary of the shard for the index.
+    """
+    path, shard_index, game_count, players, seed, random_opening_moves, alternate_first_player, column_count, row_count = task
+    game = BitboardConnectFour(column_count= column_count, row_count= row_count)
+    random = rnd.Random(_seed(seed, shard_index))
+
+    # One bot per player and grid code, created when first needed
+    bots = {}
+    def get_bot(player_index: int, coin: int):
+        if (player_index, coin) not in bots:
+            oponent_coin = GRID_PLAYER2_COIN if coin == GRID_PLAYER1_COIN else GRID_PLAYER1_COIN
+            bots[player_index, coin] = players[player_index].create(coin, oponent_coin, column_count, row_count,
+                                                                    _seed(seed, shard_index, player_index, coin))
+        return bots[player_index, coin]
+
+    moves, lengths, results, first_players = [], [], [], []
+    for game_index in range(game_count):
+        # Bots using the global random generators (e.g. MiniMax breaking ties) play the same moves on every run
+        game_seed = _seed(seed, shard_index, game_index)
+        rnd.seed(game_seed)
+        np.random.seed(game_seed)
+
+        first_player = game_index % 2 if alternate_first_player else 0
+        game_moves, winner = play_game({GRID_PLAYER1_COIN: get_bot(first_player, GRID_PLAYER1_COIN),
+                                        GRID_PLAYER2_COIN: get_bot(1 - first_player, GRID_PLAYER2_COIN)},
+                                       game, random, random_opening_moves)
+        moves.extend(game_moves)
+        lengths.append(len(game_moves))
+        results.append(winner)
+        first_players.append(first_player)
+
+    for bot in bots.values():
+        if hasattr(bot, "close"):
+            bot.close()
+
+    # Write to a temporary file first, such that a stopped run never leaves half a shard
+    file_name = SHARD_FILE.format(shard_index)
+    temporary_path = os.path.join(path, file_name + ".tmp")
+    with open(temporary_path, "wb") as file:
+        np.savez_compressed(file,
+                            moves= np.array(moves, dtype= np.uint8),
+                            lengths= np.array(lengths, dtype= np.uint16),
+                            results= np.array(results, dtype= np.int8),
+                            first_players= np.array(first_players, dtype= np.int8))
+    os.replace(temporary_path, os.path.join(path, file_name))
+
+    # Wins are counted per player rather than per grid code
+    results = np.array(results)
+    first_players = np.array(first_players)
+    winners = np.where(results == GRID_PLAYER1_COIN, first_players, 1 - first_players)
+    return {"index": shard_index,
+            "file": file_name,
+            "games": game_count,
+            "moves": len(moves),
+            "draws": int(np.sum(results == RESULT_DRAW)),
+            "wins": [int(np.sum((results != RESULT_DRAW) & (winners == player_index))) for player_index in range(2)]}
+
+####################################################
+# GENERATOR
+####################################################
+
+def generate_self_play_games(path: str,
+                             players: tuple,
+                             game_count: int,
+                             seed: int = 0,
+                             games_per_shard: int = 10000,
+                             worker_count: Optional[int] = None,
+                             random_opening_moves: int = 2,
+                             alternate_first_player: bool = True,
+                             column_count: int = 7,
+                             row_count: int = 6):
+    """
+    Plays game_count games between the two players (e.g. (MiniMaxPlayer(4), MCTSPlayer(1000))) and stores them in the folder path.
+    Shards of games_per_shard games are played by worker_count processes (all cores per default).
+    With alternate_first_player the players take turns playing the first coin, otherwise the first player always starts.
+    The games are determined by the seed, given the bots themselves are deterministic (no time budgets).
+    If the folder holds the index of an earlier run with the same settings, only the shards missing from its index are played.
+    Returns the index, its shards summarising the games, moves, draws and wins per player.
+    """
+    settings = {"version": FORMAT_VERSION,
+                "players": [player.name for player in players],
+                "game_count": game_count,
+                "seed": seed,
+                "games_per_shard": games_per_shard,
+                "random_opening_moves": random_opening_moves,
+                "alternate_first_player": alternate_first_player,
+                "column_count": column_count,
+                "row_count": row_count}
+
+    # Continue an earlier run with the same settings
+    os.makedirs(path, exist_ok= True)
+    index = load_index(path)
+    if index is None:
+        index = dict(settings, shards= [])
+    elif {key: index.get(key) for key in settings} != settings:
+        raise ValueError(f"{os.path.join(path, INDEX_FILE)} belongs to a run with other settings, "
+                         f"expected {settings}. Use another folder or the settings of the earlier run.")
+
+    finished_shards = {shard["index"] for shard in index["shards"]}
+    shard_count = (game_count + games_per_shard - 1) // games_per_shard
+    tasks = [(path, shard_index, min(games_per_shard, game_count - shard_index * games_per_shard), tuple(players), seed,
+              random_opening_moves, alternate_first_player, column_count, row_count)
+             for shard_index in range(shard_count) if shard_index not in finished_shards]
+    __write_index(path, index)
+
+    # Add every finished shard to the index right away
+    context = mp.get_context()
+    with context.Pool(worker_count) as pool:
+        for shard in pool.imap_unordered(_generate_shard, tasks):
+            index["shards"].append(shard)
+            index["shards"].sort(key= lambda shard: shard["index"])
+            __write_index(path, index)
+
+    return index
@@ -0,0 +1,143 @@
+####################################################
+# ABOUT THIS FILE
+####################################################
+# Description: Elo ratings with confidence intervals for connect four tournaments, in the way of BayesElo
+#   Instead of updating the ratings game by game (which depends on the order of the games), the ratings are the maximum a posteriori
+#   estimate of a Bradley-Terry model of all games so far, with an advantage for the player with the first coin.
+#   The game counts are kept per (first player, second player), thus adding games is cheap
+#   and every fit starts from the previous ratings, needing only a few Newton steps.
+#   The confidence intervals follow from the curvature of the log-likelihood at the ratings.
+#
+# Author name: Lennert Bontinck
+# Author email: lennert.bontinck@vub.be / info@lennertbontinck.com
+#
+# Implementation based on: https://www.remi-coulom.fr/Bayesian-Elo/
+
+
+####################################################
+# IMPORTS
+####################################################
+
+# Numpy for easy numerical data structures
+import numpy as np
+
+####################################################
+# GLOBAL VARIABLES
+####################################################
+
+# Elo points per natural logit: a difference of 400 points means winning 10 times more often than losing
+ELO_PER_LOGIT = 400 / np.log(10)
+
+# Virtual draws added to every pair of players that played each other, keeping perfect scores from giving infinite ratings
+PRIOR_DRAWS = 2
+
+# Newton steps of a fit stop once the largest change (in logits) is below this tolerance
+FIT_TOLERANCE = 1e-6
+FIT_MAX_STEPS = 100
+
+# Normal quantile of the default 95% confidence intervals
+CONFIDENCE_Z = 1.96
+
+####################################################
+# ELO RATINGS
+####################################################
+
+class EloRatings:
+    """
+    Ratings of the players of a tournament, updated with add_game and computed with ratings.
+    The ratings are relative: their mean is 0 Elo.
+    The model expects the first player to win with probability 1 / (1 + 10^(-(elo_first - elo_second + first_move_advantage) / 400)),
+        a draw counts as half a win and half a loss.
+    """
+
+    def __init__(self, prior_draws: float = PRIOR_DRAWS):
+        self.prior_draws = prior_draws
+        self.players = []
+        self.__player_indices = {}
+
+        # Games and points of the first player, per (first player, second player)
+        self.__games = np.zeros((0, 0))
+        self.__points = np.zeros((0, 0))
+
+        # Ratings in logits followed by the first move advantage, kept to start the next fit
+        self.__parameters = np.zeros(1)
+
+    def __player_index(self, player: str):
+        """
+        Private function returning the index of a player, adding the player if it is new.
+        """
+        if player not in self.__player_indices:
+            self.__player_indices[player] = len(self.players)
+            self.players.append(player)
+            size = len(self.players)
+            self.__games = np.pad(self.__games, ((0, 1), (0, 1)))
+            self.__points = np.pad(self.__points, ((0, 1), (0, 1)))
+            self.__parameters = np.insert(self.__parameters, size - 1, 0.0)
+        return self.__player_indices[player]
+
+    def add_game(self, first_player: str, second_player: str, score: float):
+        """
+        Adds a game, score being 1 if the first player won, 0.5 for a draw and 0 if the second player won.
+        """
+        first = self.__player_index(first_player)
+        second = self.__player_index(second_player)
+        self.__games[first, second] += 1
+        self.__points[first, second] += score
+
+    def __fit(self):
+        """
+        Private function fitting the ratings and the first move advantage with Newton's method, starting from the previous fit.
+        Returns the covariance of the parameters (in logits).
+        """
+        size = len(self.players)
+
+        # Games of every pair that played, with the virtual draws split over both orders
+        played = (self.__games + self.__games.T) > 0
+        first, second = np.nonzero((self.__games > 0) | played)
+        games = self.__games[first, second] + self.prior_draws / 2 * played[first, second]
+        points = self.__points[first, second] + self.prior_draws / 4 * played[first, second]
+
+        # Every pair contributes to the ratings of both players and the advantage: x = rating_first - rating_second + advantage
+        design = np.zeros((len(first), size + 1))
+        design[np.arange(len(first)), first] = 1
+        design[np.arange(len(first)), second] = -1
+        design[:, size] = 1
+
+        parameters = self.__parameters
+        for _ in range(FIT_MAX_STEPS):
+            expected = 1 / (1 + np.exp(-(design @ parameters)))
+            gradient = design.T @ (points - games * expected)
+            information = (design.T * (games * expected * (1 - expected))) @ design
+
+            # The ratings can all be shifted by the same amount, the pseudo-inverse ignores that direction
+            step = np.linalg.pinv(information) @ gradient
+            parameters = parameters + step
+            parameters[:size] -= parameters[:size].mean()
+            if np.max(np.abs(step)) < FIT_TOLERANCE:
+                break
+
+        self.__parameters = parameters
+        expected = 1 / (1 + np.exp(-(design @ parameters)))
+        return np.linalg.pinv((design.T * (games * expected * (1 - expected))) @ design)
+
+    def ratings(self, confidence_z: float = CONFIDENCE_Z):
+        """
+        Returns the ratings sorted from best to worst, as a list of dictionaries with the name, elo, the half width of its confidence interval (elo_interval),
+            the amount of games and the score (points per game), together with the first move advantage in Elo.
+        """
+        if not self.players:
+            return [], 0.0
+
+        covariance = self.__fit()
+        size = len(self.players)
+        games = self.__games.sum(axis= 1) + self.__games.sum(axis= 0)
+        points = self.__points.sum(axis= 1) + (self.__games - self.__points).sum(axis= 0)
+
+        ratings = [{"name": player,
+                    "elo": float(self.__parameters[index] * ELO_PER_LOGIT),
+                    "elo_interval": float(confidence_z * np.sqrt(max(covariance[index, index], 0.0)) * ELO_PER_LOGIT),
+                    "games": int(games[index]),
+                    "score": float(points[index] / games[index]) if games[index] > 0 else None}
+                   for index, player in enumerate(self.players)]
+        ratings.sort(key= lambda rating: -rating["elo"])
+        return ratings, float(self.__parameters[size] * ELO_PER_LOGIT)
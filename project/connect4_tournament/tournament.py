@@ -0,0 +1,219 @@
+####################################################
+# ABOUT THIS FILE
+####################################################
+# Description: Round-robin tournament between connect four players (saved policies, MiniMax, MCTS and random)
+#   Every pair of players plays games_per_pairing games with each of both players having the first coin,
+#   every (first player, second player) pairing being one task of a pool of processes.
+#   The games are appended to a results file as soon as their pairing finished and the Elo ratings are refit after every pairing,
+#   thus a stopped tournament continues with the pairings missing from the results file.
+#
+# Author name: Lennert Bontinck
+# Author email: lennert.bontinck@vub.be / info@lennertbontinck.com
+#
+# Results file: one JSON line per game with the names of the first and second player, the game index,
+#   the score of the first player (1 win, 0.5 draw, 0 loss) and the amount of moves.
+
+
+####################################################
+# IMPORTS
+####################################################
+
+# Files of the results, ratings and saved policies
+import os
+import glob
+import json
+import zlib
+
+# Worker processes
+import multiprocessing as mp
+
+# Seeding of the games
+import random as rnd
+
+# Allow for optionals
+from typing import Optional, Callable, Sequence
+
+# Numpy for easy numerical data structures
+import numpy as np
+
+# Torch for checking the architecture of saved policies
+import torch
+
+# Players and games of the self-play generator
+from connect4_core.bitboard_connect_four import BitboardConnectFour, GRID_PLAYER1_COIN, GRID_PLAYER2_COIN
+from connect4_selfplay.self_play_generator import PolicyPlayer, play_game, RESULT_DRAW
+
+# Ratings of the players
+from connect4_tournament.elo_ratings import EloRatings, PRIOR_DRAWS
+
+####################################################
+# GLOBAL VARIABLES
+####################################################
+
+# Score of the first player per result of a game
+SCORES = {GRID_PLAYER1_COIN: 1.0, RESULT_DRAW: 0.5, GRID_PLAYER2_COIN: 0.0}
+
+####################################################
+# SAVED POLICIES
+####################################################
+
+def find_policy_players(root: str, architectures: dict, pattern: str = "**/*.pth"):
+    """
+    Returns a PolicyPlayer for every saved policy matching the pattern under root, e.g. the saved_variables folder of the paper notebooks.
+    architectures maps a name to a function creating a policy (see PolicyPlayer), the first one that loads the saved weights is used.
+    Saved policies none of the architectures can load are skipped, their paths being returned as the second value.
+    Players are named after the path of their file relative to root.
+    """
+    # One policy per architecture to try loading the weights into
+    policies = {name: get_policy() for name, get_policy in architectures.items()}
+
+    players, skipped_paths = [], []
+    for path in sorted(glob.glob(os.path.join(root, pattern), recursive= True)):
+        weights = torch.load(path, map_location= torch.device("cpu"))
+        for name, get_policy in architectures.items():
+            try:
+                policies[name].load_state_dict(weights)
+            except (RuntimeError, KeyError):
+                continue
+            players.append(PolicyPlayer(get_policy, path, name= os.path.relpath(path, root)))
+            break
+        else:
+            skipped_paths.append(path)
+    return players, skipped_paths
+
+####################################################
+# PAIRINGS
+####################################################
+
+def _seed(*names: str):
+    """
+    Private function returning a 32-bit seed derived from the given strings, the same in every process and run.
+    """
+    return int(np.random.SeedSequence([zlib.crc32(name.encode()) for name in names]).generate_state(1)[0])
+
+def _play_pairing(task: tuple):
+    """
+    Private function run by the worker processes, playing the games of one (first player, second player) pairing.
+    Returns the results of its games, in the format of the results file.
+    """
+    first_player, second_player, game_count, seed, random_opening_moves, column_count, row_count = task
+    game = BitboardConnectFour(column_count= column_count, row_count= row_count)
+    pairing_seed = _seed(str(seed), first_player.name, second_player.name)
+    random = rnd.Random(pairing_seed)
+
+    # Fresh bots per pairing, such that the games do not depend on the earlier pairings of the worker
+    bots = {GRID_PLAYER1_COIN: first_player.create(GRID_PLAYER1_COIN, GRID_PLAYER2_COIN, column_count, row_count, pairing_seed),
+            GRID_PLAYER2_COIN: second_player.create(GRID_PLAYER2_COIN, GRID_PLAYER1_COIN, column_count, row_count, pairing_seed + 1)}
+
+    results = []
+    for game_index in range(game_count):
+        # Bots using the global random generators (e.g. MiniMax breaking ties) play the same moves on every run
+        game_seed = _seed(str(seed), first_player.name, second_player.name, str(game_index))
+        rnd.seed(game_seed)
+        np.random.seed(game_seed)
+
+        moves, winner = play_game(bots, game, random, random_opening_moves)
+        results.append({"first": first_player.name,
+                        "second": second_player.name,
+                        "game": game_index,
+                        "score": SCORES[winner],
+                        "moves": len(moves)})
+
+    for bot in bots.values():
+        if hasattr(bot, "close"):
+            bot.close()
+    return results
+
+def __read_results(results_path: str):
+    """
+    Private function returning the games of an earlier run in the results file, skipping a line that was only partly written.
+    """
+    if not os.path.exists(results_path):
+        return []
+
+    results = []
+    with open(results_path) as file:
+        for line in file:
+            try:
+                results.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return results
+
+def __write_ratings(ratings_path: str, elo_ratings: EloRatings):
+    """
+    Private function to replace the ratings file, written to a temporary file first.
+    """
+    ratings, first_move_advantage = elo_ratings.ratings()
+    temporary_path = ratings_path + ".tmp"
+    with open(temporary_path, "w") as file:
+        json.dump({"first_move_advantage": first_move_advantage, "ratings": ratings}, file, indent= 1)
+    os.replace(temporary_path, ratings_path)
+
+####################################################
+# TOURNAMENT
+####################################################
+
+def run_tournament(players: Sequence,
+                   results_path: str,
+                   ratings_path: Optional[str] = None,
+                   games_per_pairing: int = 2,
+                   seed: int = 0,
+                   worker_count: Optional[int] = None,
+                   random_opening_moves: int = 2,
+                   prior_draws: float = PRIOR_DRAWS,
+                   on_pairing: Optional[Callable[[EloRatings], None]] = None,
+                   column_count: int = 7,
+                   row_count: int = 6):
+    """
+    Plays a round-robin tournament between the players (e.g. RandomPlayer(), MiniMaxPlayer(4) and the players of find_policy_players),
+        every player playing games_per_pairing games with the first coin and as many with the second coin against every other player.
+    The pairings are played by worker_count processes (all cores per default) and their games appended to the results file.
+    The first random_opening_moves moves of a game are random, such that deterministic players do not play the same game over and over.
+    After every pairing the ratings are refit and written to ratings_path (if given), and on_pairing(elo_ratings) is called.
+    Pairings of which the results file already holds all games are not played again, a partly written pairing only adds its missing games.
+    Player names should be unique. Returns the EloRatings of all games in the results file.
+    """
+    names = [player.name for player in players]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Player names should be unique, got {names}.")
+
+    # Continue with the games of an earlier run
+    elo_ratings = EloRatings(prior_draws= prior_draws)
+    finished_games = set()
+    for result in __read_results(results_path):
+        if (result["first"], result["second"], result["game"]) not in finished_games:
+            finished_games.add((result["first"], result["second"], result["game"]))
+            elo_ratings.add_game(result["first"], result["second"], result["score"])
+
+    tasks = [(first_player, second_player, games_per_pairing, seed, random_opening_moves, column_count, row_count)
+             for first_player in players for second_player in players
+             if first_player is not second_player
+             and any((first_player.name, second_player.name, game_index) not in finished_games for game_index in range(games_per_pairing))]
+
+    # Append the games of every pairing as soon as it finished
+    context = mp.get_context()
+    with context.Pool(worker_count) as pool, open(results_path, "a+") as results_file:
+        # End a line that was only partly written, such that the next game starts on a line of its own
+        if results_file.tell() > 0:
+            results_file.seek(results_file.tell() - 1)
+            if results_file.read(1) != "\n":
+                results_file.write("\n")
+
+        for results in pool.imap_unordered(_play_pairing, tasks):
+            # Games of a pairing that was stopped while being written are only added once
+            for result in results:
+                if (result["first"], result["second"], result["game"]) in finished_games:
+                    continue
+                results_file.write(json.dumps(result) + "\n")
+                elo_ratings.add_game(result["first"], result["second"], result["score"])
+            results_file.flush()
+
+            if ratings_path is not None:
+                __write_ratings(ratings_path, elo_ratings)
+            if on_pairing is not None:
+                on_pairing(elo_ratings)
+
+    if ratings_path is not None and elo_ratings.players:
+        __write_ratings(ratings_path, elo_ratings)
+    return elo_ratings
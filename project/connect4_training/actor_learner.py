@@ -0,0 +1,284 @@
+####################################################
+# ABOUT THIS FILE
+####################################################
+# Description: Asynchronous actor-learner training for the connect four environments
+#   Instead of alternating collecting and updating in one process as ts.trainer.offpolicy_trainer does,
+#   actor processes keep collecting transitions with a CPU copy of the policy while the learner process trains on them.
+#   Actors send their transitions over a bounded queue, thus they wait on the learner if it falls behind,
+#   the learner publishes its weights to the actors every publish_interval gradient steps.
+#   Published weights are copied into a single shared memory copy of the weights with a version counter,
+#   thus publishing never fails and actors load the latest weights once their version changed.
+#
+# Author name: Lennert Bontinck
+# Author email: lennert.bontinck@vub.be / info@lennertbontinck.com
+
+
+####################################################
+# IMPORTS
+####################################################
+
+# Worker processes and their queues
+import multiprocessing as mp
+import queue
+
+# Timing of the training
+import time
+
+# Allow for optionals
+from typing import Optional, Callable
+
+# Numpy for easy numerical data structures
+import numpy as np
+
+# Torch for the policy weights
+import torch
+
+# Tianshou for the collectors, replay buffers and policies
+import tianshou as ts
+
+####################################################
+# GLOBAL VARIABLES
+####################################################
+
+# Transitions per environment kept by the collector of an actor, only used for its episode statistics
+ACTOR_BUFFER_SIZE_PER_ENV = 64
+
+# Seconds between checks whether the training stopped or an actor failed while waiting on a queue
+QUEUE_TIMEOUT = 1
+
+####################################################
+# POLICY WEIGHTS
+####################################################
+
+def get_policy_weights(policy: ts.policy.BasePolicy):
+    """
+    Returns a CPU copy of the weights of a policy.
+    The policies of a MultiAgentPolicyManager are not registered as its modules, thus their weights are returned per agent.
+    """
+    if isinstance(policy, ts.policy.MultiAgentPolicyManager):
+        return {agent: get_policy_weights(agent_policy) for agent, agent_policy in policy.policies.items()}
+    return {key: value.detach().cpu().clone() for key, value in policy.state_dict().items()}
+
+def set_policy_weights(policy: ts.policy.BasePolicy, weights: dict):
+    """
+    Loads weights returned by get_policy_weights into a policy with the same architecture.
+    """
+    if isinstance(policy, ts.policy.MultiAgentPolicyManager):
+        for agent, agent_policy in policy.policies.items():
+            set_policy_weights(agent_policy, weights[agent])
+    else:
+        policy.load_state_dict(weights)
+
+def _share_weights(weights: dict):
+    """
+    Private function moving weights returned by get_policy_weights to shared memory, such that all processes use the same tensors.
+    """
+    for value in weights.values():
+        if isinstance(value, dict):
+            _share_weights(value)
+        else:
+            value.share_memory_()
+    return weights
+
+def _copy_weights(target: dict, source: dict):
+    """
+    Private function copying weights returned by get_policy_weights into weights of the same architecture, e.g. the shared weights.
+    """
+    for key, value in source.items():
+        if isinstance(value, dict):
+            _copy_weights(target[key], value)
+        else:
+            target[key].copy_(value)
+
+####################################################
+# ACTOR PROCESS
+####################################################
+
+class _ForwardingReplayBuffer(ts.data.VectorReplayBuffer):
+    """
+    Small replay buffer of an actor, keeping the transitions added since the last call of pop_transitions.
+    """
+
+    def __init__(self, total_size: int, buffer_num: int, buffer_id_offset: int):
+        super().__init__(total_size, buffer_num)
+        self.buffer_id_offset = buffer_id_offset
+        self.pending_transitions = []
+
+    def add(self, batch: ts.data.Batch, buffer_ids=None):
+        buffer_ids = np.arange(self.buffer_num) if buffer_ids is None else np.asarray(buffer_ids)
+        transitions = ts.data.Batch(obs= batch.obs, act= batch.act, rew= batch.rew, done= batch.done, obs_next= batch.obs_next)
+        self.pending_transitions.append((ts.data.Batch(transitions, copy= True), buffer_ids + self.buffer_id_offset))
+        return super().add(batch, buffer_ids)
+
+    def pop_transitions(self):
+        """
+        Returns the (transitions, learner buffer ids) added since the last call, one item per collector step.
+        """
+        transitions, self.pending_transitions = self.pending_transitions, []
+        return transitions
+
+def _actor(actor_index: int,
+           get_policy: Callable[[], ts.policy.BasePolicy],
+           get_envs: Callable[[], ts.env.BaseVectorEnv],
+           shared_weights: dict,
+           weight_version,
+           transition_queue,
+           stop_event,
+           step_per_collect: int,
+           train_fn: Optional[Callable[[ts.policy.BasePolicy, int], None]],
+           actor_num: int):
+    """
+    Collects transitions with a CPU copy of the policy until the training stops.
+    The transitions and statistics of every collect are put on the transition queue,
+        the shared weights are loaded before every collect if the learner published new ones.
+    """
+    # Actors share the CPU cores, one thread each avoids oversubscribing them
+    torch.set_num_threads(1)
+
+    policy = get_policy()
+    with weight_version.get_lock():
+        set_policy_weights(policy, shared_weights)
+        loaded_version = weight_version.value
+    envs = get_envs()
+    buffer = _ForwardingReplayBuffer(ACTOR_BUFFER_SIZE_PER_ENV * len(envs), len(envs), buffer_id_offset= actor_index * len(envs))
+    collector = ts.data.Collector(policy= policy, env= envs, buffer= buffer, exploration_noise= True)
+
+    env_step = 0
+    try:
+        while not stop_event.is_set():
+            # Use the latest published weights, the lock keeps the learner from publishing while they are loaded
+            if weight_version.value != loaded_version:
+                with weight_version.get_lock():
+                    set_policy_weights(policy, shared_weights)
+                    loaded_version = weight_version.value
+
+            # Estimate of the total amount of collected transitions, as all actors collect at a similar pace
+            if train_fn is not None:
+                train_fn(policy, env_step * actor_num)
+
+            policy.train()
+            result = collector.collect(n_step= step_per_collect)
+            env_step += result["n/st"]
+            statistics = {"n/ep": result["n/ep"], "n/st": result["n/st"], "rews": result["rews"], "lens": result["lens"]}
+
+            # Wait on the learner if the queue is full, unless the training stops
+            message = (buffer.pop_transitions(), statistics)
+            while not stop_event.is_set():
+                try:
+                    transition_queue.put(message, timeout= QUEUE_TIMEOUT)
+                    break
+                except queue.Full:
+                    pass
+    finally:
+        # The learner stops reading the queue, do not wait on it to exit
+        transition_queue.cancel_join_thread()
+        envs.close()
+
+####################################################
+# LEARNER
+####################################################
+
+def actor_learner_trainer(policy: ts.policy.BasePolicy,
+                          get_actor_policy: Callable[[], ts.policy.BasePolicy],
+                          get_actor_envs: Callable[[], ts.env.BaseVectorEnv],
+                          buffer: ts.data.ReplayBuffer,
+                          actor_num: int,
+                          max_env_step: int,
+                          batch_size: int,
+                          step_per_collect: int = 10,
+                          update_per_step: float = 0.1,
+                          publish_interval: int = 100,
+                          queue_size: int = 64,
+                          train_fn: Optional[Callable[[ts.policy.BasePolicy, int], None]] = None,
+                          logger: Optional[ts.utils.BaseLogger] = None):
+    """
+    Trains the policy in this process (the learner) on transitions collected by actor_num actor processes.
+    Every actor creates its own CPU policy using get_actor_policy (same architecture as policy) and vector environment using get_actor_envs.
+    The environments of actor i are stored in the sub-buffers i * env_num up to (i + 1) * env_num of buffer,
+        thus the buffer should have at least actor_num * env_num sub-buffers.
+    The learner does update_per_step gradient steps of batch_size per received transition, as offpolicy_trainer does,
+        and publishes its weights to the actors every publish_interval gradient steps.
+    train_fn(actor_policy, env_step) is called by the actors before every collect, e.g. to set the epsilon of the actor policy.
+    Training stops after max_env_step transitions and their gradient steps. The get functions and train_fn should be picklable when processes are spawned.
+    Returns a dictionary with the amount of transitions, gradient steps and the duration of the training.
+    """
+    context = mp.get_context()
+    transition_queue = context.Queue(maxsize= queue_size)
+    stop_event = context.Event()
+
+    # Start the actors with the current weights, published weights replace these shared weights and increase their version
+    shared_weights = _share_weights(get_policy_weights(policy))
+    weight_version = context.Value("q", 0)
+    actors = []
+    for actor_index in range(actor_num):
+        actor = context.Process(target= _actor,
+                                args= (actor_index, get_actor_policy, get_actor_envs, shared_weights, weight_version,
+                                       transition_queue, stop_event, step_per_collect, train_fn, actor_num),
+                                daemon= True)
+        actor.start()
+        actors.append(actor)
+
+    env_step = 0
+    gradient_step = 0
+    pending_updates = 0.0
+    start_time = time.time()
+    try:
+        while True:
+            can_update = pending_updates >= 1 and len(buffer) >= batch_size
+
+            # Once enough transitions are collected the actors stop, the remaining gradient steps are still done
+            message = None
+            if env_step >= max_env_step:
+                stop_event.set()
+                if not can_update:
+                    break
+            else:
+                # Wait for transitions when there is nothing to train on, otherwise only take what already arrived
+                try:
+                    if can_update:
+                        message = transition_queue.get_nowait()
+                    else:
+                        message = transition_queue.get(timeout= QUEUE_TIMEOUT)
+                except queue.Empty:
+                    failed_actors = [index for index, actor in enumerate(actors) if not actor.is_alive()]
+                    if failed_actors:
+                        raise RuntimeError(f"Actor(s) {failed_actors} stopped unexpectedly.")
+
+            if message is not None:
+                transitions, statistics = message
+                for batch, buffer_ids in transitions:
+                    buffer.add(batch, buffer_ids)
+                env_step += statistics["n/st"]
+                pending_updates += statistics["n/st"] * update_per_step
+
+                if logger is not None and statistics["n/ep"] > 0:
+                    logger.log_train_data({"n/ep": statistics["n/ep"],
+                                           "rew": np.mean(statistics["rews"]),
+                                           "len": np.mean(statistics["lens"])}, env_step)
+
+            # Gradient steps, one at a time such that new transitions are added in between
+            if pending_updates >= 1 and len(buffer) >= batch_size:
+                policy.train()
+                losses = policy.update(batch_size, buffer)
+                pending_updates -= 1
+                gradient_step += 1
+
+                if logger is not None:
+                    logger.log_update_data(losses, gradient_step)
+
+                # Publish the weights, replacing weights the actors did not load yet
+                if gradient_step % publish_interval == 0:
+                    weights = get_policy_weights(policy)
+                    with weight_version.get_lock():
+                        _copy_weights(shared_weights, weights)
+                        weight_version.value += 1
+    finally:
+        stop_event.set()
+        for actor in actors:
+            actor.join(timeout= 10 * QUEUE_TIMEOUT)
+            if actor.is_alive():
+                actor.terminate()
+
+    return {"env_step": env_step,
+            "gradient_step": gradient_step,
+            "duration": time.time() - start_time}
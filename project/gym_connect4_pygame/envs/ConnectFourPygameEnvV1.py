@@ -28,12 +28,15 @@ import gym
 # Allow for optionals
 from typing import Optional
 
-# Pygame may be used for visualisation reasons
-import pygame
+# Pygame may be used for visualisation reasons, it is only imported when rendering in human mode (see _import_pygame)
+pygame = None
 
 # Numpy for easy numerical data structures
 import numpy as np
 
+# Shared win detection for any board size
+from connect4_core.win_detection import winning_move
+
 ####################################################
 # GLOBAL VARIABLES
 ####################################################
@@ -56,6 +59,20 @@ REWARD_DRAW = 5
 REWARD_INVALID = -1
 REWARD_MOVE = 0
 
+####################################################
+# LAZY PYGAME IMPORT
+####################################################
+
+def _import_pygame():
+    """
+    Imports pygame on the first render in human mode, keeping it out of headless (e.g. training) processes.
+    """
+    global pygame
+    if pygame is None:
+        import pygame as pygame_module
+        pygame = pygame_module
+    return pygame
+
 ####################################################
 # MAIN ENVIRONMENT CLASS
 ####################################################
@@ -115,6 +132,10 @@ class ConnectFourPygameEnvV1(gym.Env):
         # Create an initial empty board
         self.__board = self._empty_board()
         
+        # Keep track of the last placed coin, only lines through it can have been completed
+        self.__last_move_row = None
+        self.__last_move_column = None
+        
         # Keep track of who's turn it is
         self.__player_one_playing = True  
         self.__current_players_coin = GRID_PLAYER1_COIN if self.__player_one_playing else GRID_PLAYER2_COIN
@@ -221,7 +242,8 @@ class ConnectFourPygameEnvV1(gym.Env):
             return
         
         if (not hasattr(self, '_ConnectFourPygameEnvV1__screen') and mode == "human") or (self.__screen is None and mode == "human"):
-            # First time using human mode, init the pygame
+            # First time using human mode, import and init the pygame
+            _import_pygame()
             pygame.init()
             pygame.display.init()
             
@@ -322,6 +344,10 @@ class ConnectFourPygameEnvV1(gym.Env):
             
             # Place the coin
             self.__board[free_space_row][column] = self.__current_players_coin
+            
+            # Remember the placed coin for the win check
+            self.__last_move_row = free_space_row
+            self.__last_move_column = column
             return True
         else: 
             return False
@@ -329,38 +355,9 @@ class ConnectFourPygameEnvV1(gym.Env):
     def _winning_board(self):
         """
         Returns whether or not the board is won by the playing player.
-        Should be called after placing a piece.
+        Should be called after placing a piece, only the four lines through the last placed coin are checked.
         """
-        # check all horizontal locations
-        for c in range(self.grid_column_count - 3):
-            for r in range(self.grid_row_count):
-                if self.__board[r][c] == self.__current_players_coin and self.__board[r][c + 1] == self.__current_players_coin and self.__board[r][c + 2] == self.__current_players_coin and \
-                    self.__board[r][c + 3] == self.__current_players_coin:
-                        return True
-                    
-        # check vertical locations for win
-        for c in range(self.grid_column_count):
-            for r in range(self.grid_row_count - 3):
-                if self.__board[r][c] == self.__current_players_coin and self.__board[r + 1][c] == self.__current_players_coin and self.__board[r + 2][c] == self.__current_players_coin and \
-                    self.__board[r + 3][c] == self.__current_players_coin:
-                        return True
-
-        # check positively sloped diagonals
-        for c in range(self.grid_column_count - 3):
-            for r in range(self.grid_row_count - 3):
-                if self.__board[r][c] == self.__current_players_coin and self.__board[r + 1][c + 1] == self.__current_players_coin and self.__board[r + 2][c + 2] == self.__current_players_coin and \
-                    self.__board[r + 3][c + 3] == self.__current_players_coin:
-                        return True
-
-        # check negatively sloped diagonals
-        for c in range(self.grid_column_count - 3):
-            for r in range(3, self.grid_row_count):
-                if self.__board[r][c] == self.__current_players_coin and self.__board[r - 1][c + 1] == self.__current_players_coin and self.__board[r - 2][c + 2] == self.__current_players_coin and \
-                    self.__board[r - 3][c + 3] == self.__current_players_coin:
-                        return True
-                
-        # No winning board
-        return False
+        return winning_move(self.__board, self.__last_move_row, self.__last_move_column, self.__current_players_coin)
         
     def _full_board(self):
         """
@@ -30,20 +30,20 @@ import gym
 # Allow for optionals
 from typing import Optional
 
-# Pygame may be used for visualisation reasons
-import pygame
+# Pygame may be used for visualisation reasons, it is only imported when rendering in human mode (see _import_pygame)
+pygame = None
 
 # Numpy for easy numerical data structures
 import numpy as np
 
-# Allow for deep copies
-import copy
-
 # Use pettingzoo for generalised multi agent
 from pettingzoo import AECEnv
 from pettingzoo.utils import wrappers
 from pettingzoo.utils.agent_selector import agent_selector
 
+# Bitboard game core for fast game logic
+from connect4_core.bitboard_connect_four import BitboardConnectFour
+
 ####################################################
 # GLOBAL VARIABLES
 ####################################################
@@ -67,6 +67,20 @@ REWARD_INVALID = -1
 REWARD_MOVE = 0
 REWARD_BLOCKING = 0
 
+####################################################
+# LAZY PYGAME IMPORT
+####################################################
+
+def _import_pygame():
+    """
+    Imports pygame on the first render in human mode, keeping it out of headless (e.g. training) processes.
+    """
+    global pygame
+    if pygame is None:
+        import pygame as pygame_module
+        pygame = pygame_module
+    return pygame
+
 ####################################################
 # GLOBAL FUNCTIONS FOR PETTING ZOO COMPATIBILITY
 ####################################################
@@ -77,10 +91,12 @@ def env(reward_win: int = REWARD_WIN,
         reward_invalid: int = REWARD_INVALID,
         reward_move: int = REWARD_MOVE,
         reward_blocking: int = REWARD_BLOCKING,
-        allow_invalid_move: bool = True
+        allow_invalid_move: bool = True,
+        fast_path: bool = False
         ):
     """
     Returns the environment with all it's wrappers.
+    With fast_path, the unwrapped environment is returned instead which does the checks of the wrappers inline.
     """
     
     env = raw_env(reward_win= reward_win,
@@ -89,8 +105,12 @@ def env(reward_win: int = REWARD_WIN,
                   reward_invalid= reward_invalid,
                   reward_move= reward_move,
                   reward_blocking= reward_blocking,
-                  allow_invalid_move = allow_invalid_move)
-    env = wrappers.TerminateIllegalWrapper(env, illegal_reward=REWARD_INVALID)
+                  allow_invalid_move = allow_invalid_move,
+                  inline_checks= fast_path)
+    if fast_path:
+        return env
+    
+    env = wrappers.TerminateIllegalWrapper(env, illegal_reward=reward_invalid)
     env = wrappers.AssertOutOfBoundsWrapper(env)
     env = wrappers.OrderEnforcingWrapper(env)
     return env
@@ -131,7 +151,14 @@ class raw_env(AECEnv):
                  reward_invalid: int = REWARD_INVALID,
                  reward_move: int = REWARD_MOVE,
                  reward_blocking: int = REWARD_BLOCKING,
-                 allow_invalid_move: bool = True):
+                 allow_invalid_move: bool = True,
+                 inline_checks: bool = False):
+        """
+        With inline_checks, step does the checks of the PettingZoo wrappers used by env() itself:
+            - reset should be called before step (OrderEnforcingWrapper)
+            - the action should be a column of the board (AssertOutOfBoundsWrapper)
+            - a move in a full column ends the game when invalid moves are not allowed (TerminateIllegalWrapper)
+        """
         # Init from super which is a Petting Zoo class
         # NOTE: V2 edits w.r.t. PettingZoo and Tianshou multi-agent coding convention        
         super().__init__()
@@ -149,6 +176,7 @@ class raw_env(AECEnv):
         self.reward_move = reward_move
         self.reward_blocking = reward_blocking
         self.allow_invalid_move = allow_invalid_move
+        self.inline_checks = inline_checks
         
         # Our game allows for two agents to play
         # NOTE: V2 edits w.r.t. PettingZoo and Tianshou multi-agent coding convention
@@ -184,18 +212,14 @@ class raw_env(AECEnv):
         """
         Private function to get the observtions in the specified format.
         Our action mask always allows all columns as it should be learned that wrong pieces results in remaing the same agent.
+        Both are int8 read-only views that follow the live game, thus nothing is copied or built per call.
+        Copy an observation if it should be kept after the next step, a reset starts a new board and leaves the old one intact.
         """
         # NOTE: V2 edits w.r.t. PettingZoo and Tianshou multi-agent coding convention
-        if self.allow_invalid_move:
-            return {
-                "observation": self.__board,
-                "action_mask": [1 for column in range(self.grid_column_count)]
-                }
-        else:
-            return {
-                "observation": self.__board,
-                "action_mask": [self._is_valid_location(column) for column in range(self.grid_column_count)]
-                }
+        return {
+            "observation": self.__observation,
+            "action_mask": self.__observation_action_mask
+            }
             
 
     def _get_info(self):
@@ -215,6 +239,23 @@ class raw_env(AECEnv):
         # Create an initial empty board
         self.__board = self._empty_board()
         
+        # Action mask, kept up to date when a column fills up if invalid moves are not allowed
+        self.__action_mask = np.ones(self.grid_column_count, dtype=np.int8)
+        
+        # Read-only views of the board and action mask handed out as observations
+        self.__observation = self.__board.view()
+        self.__observation.flags.writeable = False
+        self.__observation_action_mask = self.__action_mask.view()
+        self.__observation_action_mask.flags.writeable = False
+        
+        # Bitboard core used for the game logic, the board above mirrors it for observations and rendering
+        self.__game = BitboardConnectFour(column_count= self.grid_column_count,
+                                          row_count= self.grid_row_count)
+        
+        # Keep track of the last placed coin, only lines through it can have been completed
+        self.__last_move_row = None
+        self.__last_move_column = None
+        
         # Keep track of who's turn it is
         self.__player_one_playing = True
         self.__current_players_coin = GRID_PLAYER1_COIN if self.__player_one_playing else GRID_PLAYER2_COIN
@@ -256,20 +297,36 @@ class raw_env(AECEnv):
             - Move leading to loss: -10
             - Move leading to draw: +5
         """
+        
+        # Checks of the PettingZoo wrappers, done inline for the unwrapped fast path
+        if self.inline_checks:
+            if not hasattr(self, "_raw_env__game"):
+                raise AttributeError("reset() needs to be called before step().")
+            assert 0 <= action < self.grid_column_count, "action is not in action space"
 
         # If the game was done, let it know using parent function
         # NOTE: edit for V2
         if self.dones[self.agent_selection]:
             return self._was_done_step(action)
         
+        # Illegal move terminates the game for the unwrapped fast path, as the TerminateIllegalWrapper does
+        if self.inline_checks and not self.allow_invalid_move and not self._is_valid_location(column= action):
+            self.__visual_title = f"P{self.__current_players_coin} INVALID MOVE"
+            self.__game_finished = True
+            
+            # Only the current agent gets the invalid move reward, the done agents step first as with the wrapper
+            self._cumulative_rewards = {i: 0 for i in self.agents}
+            self.dones = {i: True for i in self.agents}
+            self.rewards = {i: 0 for i in self.agents}
+            self.rewards[self.agent_selection] = float(self.reward_invalid)
+            self._accumulate_rewards()
+            self._dones_step_first()
+            return
+        
         # Update agent selection
         # NOTE: edit for v2 to be Petting Zoo like
         next_agent = self._agent_selector.next()
         
-        # Keep a copy of the old board if we want to check for blocking reward
-        if self.reward_blocking != 0:
-            old_board = copy.deepcopy(self.__board)
-        
         # Try to place the peace
         player_made_valid_move = self._place_piece_in_column(column= action)
         
@@ -318,7 +375,7 @@ class raw_env(AECEnv):
             
             # Check if a blocking move was made and a reward should be given
             if self.reward_blocking != 0:
-                if self._blocking_move(board = old_board, action= action, oponent_coin= GRID_PLAYER2_COIN if self.__player_one_playing else GRID_PLAYER1_COIN):
+                if self._blocking_move(action= action, oponent_coin= GRID_PLAYER2_COIN if self.__player_one_playing else GRID_PLAYER1_COIN):
                     # Reward current agent for doing a blocking move
                     self.rewards[self.agent_selection] += self.reward_blocking
                     self.rewards[next_agent] += 0
@@ -352,7 +409,8 @@ class raw_env(AECEnv):
             return
         
         if (not hasattr(self, '_raw_env__screen') and mode == "human") or (self.__screen is None and mode == "human"):
-            # First time using human mode, init the pygame
+            # First time using human mode, import and init the pygame
+            _import_pygame()
             pygame.init()
             pygame.display.init()
             
@@ -447,30 +505,23 @@ class raw_env(AECEnv):
     
     def _empty_board(self):
         """
-        Returns an empty board in the form of a row x column numpy ndarray.
+        Returns an empty board in the form of a row x column int8 numpy ndarray, as declared by the observation space.
         """
-        board = np.zeros((self.grid_row_count, self.grid_column_count))
+        board = np.zeros((self.grid_row_count, self.grid_column_count), dtype=np.int8)
         return board
 
     def _is_valid_location(self, column: int):
         """
         Check if a column is playable.
         """
-        # Column is playable if top piece is not yet set
-        return self.__board[self.grid_row_count - 1][column] == GRID_EMPTY_SPACE
+        # Column is playable if it is not yet filled up, O(1) using the bitboard column heights
+        return self.__game.is_valid_location(column)
 
     def _get_free_space_row(self, column: int):
         """
         Returns the next open row for a specified column or -1 if no open row was found.
         """    
-        # Loop all rows until a row is found where there is an empty space
-        for row in range(self.grid_row_count):
-            if self.__board[row][column] == GRID_EMPTY_SPACE:
-                # Open row found, return it
-                return row
-            
-        # No open rows found, return -1
-        return -1
+        return self.__game.get_free_space_row(column)
 
     def _place_piece_in_column(self, column: int):
         """
@@ -478,11 +529,19 @@ class raw_env(AECEnv):
         Returns true if move was valid, false if the move was not valid and thus nothing was done.
         """
         if self._is_valid_location(column= column):
-            # Determine the row by looking for first free space in that column
-            free_space_row = self._get_free_space_row(column= column)
+            # Place the coin in the bitboard core, which returns the row it landed in
+            free_space_row = self.__game.place_coin(column= column, coin= self.__current_players_coin)
             
-            # Place the coin
+            # Mirror the coin on the numpy board used for observations
             self.__board[free_space_row][column] = self.__current_players_coin
+            
+            # Remember the placed coin for the win check
+            self.__last_move_row = free_space_row
+            self.__last_move_column = column
+            
+            # A full column can no longer be played
+            if not self.allow_invalid_move and free_space_row == self.grid_row_count - 1:
+                self.__action_mask[column] = 0
             return True
         else: 
             return False
@@ -490,97 +549,28 @@ class raw_env(AECEnv):
     def _winning_board(self):
         """
         Returns whether or not the board is won by the playing player.
-        Should be called after placing a piece.
-        """
-        # check all horizontal locations
-        for c in range(self.grid_column_count - 3):
-            for r in range(self.grid_row_count):
-                if self.__board[r][c] == self.__current_players_coin and self.__board[r][c + 1] == self.__current_players_coin and self.__board[r][c + 2] == self.__current_players_coin and \
-                    self.__board[r][c + 3] == self.__current_players_coin:
-                        return True
-                    
-        # check vertical locations for win
-        for c in range(self.grid_column_count):
-            for r in range(self.grid_row_count - 3):
-                if self.__board[r][c] == self.__current_players_coin and self.__board[r + 1][c] == self.__current_players_coin and self.__board[r + 2][c] == self.__current_players_coin and \
-                    self.__board[r + 3][c] == self.__current_players_coin:
-                        return True
-
-        # check positively sloped diagonals
-        for c in range(self.grid_column_count - 3):
-            for r in range(self.grid_row_count - 3):
-                if self.__board[r][c] == self.__current_players_coin and self.__board[r + 1][c + 1] == self.__current_players_coin and self.__board[r + 2][c + 2] == self.__current_players_coin and \
-                    self.__board[r + 3][c + 3] == self.__current_players_coin:
-                        return True
-
-        # check negatively sloped diagonals
-        for c in range(self.grid_column_count - 3):
-            for r in range(3, self.grid_row_count):
-                if self.__board[r][c] == self.__current_players_coin and self.__board[r - 1][c + 1] == self.__current_players_coin and self.__board[r - 2][c + 2] == self.__current_players_coin and \
-                    self.__board[r - 3][c + 3] == self.__current_players_coin:
-                        return True
-                
-        # No winning board
-        return False
+        Should be called after placing a piece, only the four lines through the last placed coin are checked.
+        """
+        return self.__game.winning_move(column= self.__last_move_column,
+                                        row= self.__last_move_row,
+                                        coin= self.__current_players_coin)
         
-    def _blocking_move(self, board, action, oponent_coin):
+    def _blocking_move(self, action, oponent_coin):
         """
-        Returns whether or a given action by a given agent would be a blocking move.
+        Returns whether or not the coin just placed in the given column was a blocking move.
         Needs the oponent coin to check this.
         """
-        
-        if board[self.grid_row_count - 1][action] != GRID_EMPTY_SPACE:
-            # Invalid move and thus no blocking move
-            return False
-        
-        # Place piece af is it were oponent piece
-        for row in range(self.grid_row_count):
-            if board[row][action] == GRID_EMPTY_SPACE:
-                # Open row found, place piece and break loop
-                board[row][action] = oponent_coin
-                break
-        
-        # Check for win as before, if there is a win for the oponents piece, then the placed piece was a blocking piece.
-        
-        # check all horizontal locations
-        for c in range(self.grid_column_count - 3):
-            for r in range(self.grid_row_count):
-                if board[r][c] == oponent_coin and board[r][c + 1] == oponent_coin and board[r][c + 2] == oponent_coin and board[r][c + 3] == oponent_coin:
-                        return True
-                    
-        # check vertical locations for win
-        for c in range(self.grid_column_count):
-            for r in range(self.grid_row_count - 3):
-                if board[r][c] == oponent_coin and board[r + 1][c] == oponent_coin and board[r + 2][c] == oponent_coin and board[r + 3][c] == oponent_coin:
-                        return True
-
-        # check positively sloped diagonals
-        for c in range(self.grid_column_count - 3):
-            for r in range(self.grid_row_count - 3):
-                if board[r][c] == oponent_coin and board[r + 1][c + 1] == oponent_coin and board[r + 2][c + 2] == oponent_coin and board[r + 3][c + 3] == oponent_coin:
-                        return True
-
-        # check negatively sloped diagonals
-        for c in range(self.grid_column_count - 3):
-            for r in range(3, self.grid_row_count):
-                if board[r][c] == oponent_coin and board[r - 1][c + 1] == oponent_coin and board[r - 2][c + 2] == oponent_coin and board[r - 3][c + 3] == oponent_coin:
-                        return True
-                
-        # No winning board for oponent piece, so it was not a blocking piece
-        return False
+        # The placed coin blocked if an oponent coin in that same cell would have won, checked on the live board without copying it
+        return self.__game.winning_move(column= action,
+                                        row= self.__last_move_row,
+                                        coin= oponent_coin)
         
     def _full_board(self):
         """
         Checks if the board is full.
         Call this after winning_board to check for tie.
         """
-        # If valid moves -> not full
-        for column in range(self.grid_column_count):
-            if self._is_valid_location(column):
-                return False
-            
-        # No valid locations found, board full
-        return True
+        return self.__game.full_board()
         
         
         
@@ -0,0 +1,342 @@
+####################################################
+# ABOUT THIS FILE
+####################################################
+# Subprocess vector environment for the V2 connect four environment (raw_env).
+# The environments are split over worker processes, each stepping its own slice of environments.
+# All boards, action masks, rewards and done flags live in one multiprocessing.shared_memory block,
+#   the main process and the workers only synchronise using a barrier, thus no observations are pickled.
+#
+# It follows the interface of a Tianshou vector environment and can thus be used instead of
+#   ts.env.SubprocVectorEnv([get_env for _ in range(training_env_num)]) in a ts.data.Collector.
+
+####################################################
+# INFO ABOUT THE AUTHOR
+####################################################
+# Name: Lennert Bontinck
+# Email: lennert.bontinck@vub.be / info@lennertbontinck.com
+
+
+####################################################
+# IMPORTS
+####################################################
+
+# Gym for providing the spaces
+import gym
+
+# Allow for optionals
+from typing import Optional, Union, List
+
+# Numpy for easy numerical data structures
+import numpy as np
+
+# Worker processes sharing one block of memory
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+# Connect four environment stepped by the workers
+from gym_connect4_pygame.envs.ConnectFourPygameEnvV2 import raw_env, REWARD_WIN, REWARD_LOSS, REWARD_DRAW, REWARD_INVALID, REWARD_MOVE, REWARD_BLOCKING
+
+####################################################
+# GLOBAL VARIABLES
+####################################################
+
+# COMMANDS PER ENVIRONMENT
+COMMAND_NONE = 0
+COMMAND_STEP = 1
+COMMAND_RESET = 2
+
+# Seconds to wait on the workers before considering them broken
+BARRIER_TIMEOUT = 60
+
+####################################################
+# SHARED MEMORY LAYOUT
+####################################################
+
+def _shared_array_specs(env_num: int, worker_num: int, grid_column_count: int, grid_row_count: int):
+    """
+    Returns the (name, shape, dtype) of all arrays in the shared memory block.
+    """
+    return [
+        ("boards", (env_num, grid_row_count, grid_column_count), np.int8),
+        ("masks", (env_num, grid_column_count), np.bool_),
+        ("rewards", (env_num, 2), np.float64),
+        ("dones", (env_num,), np.bool_),
+        ("players", (env_num,), np.int8), # 0 for player 1, 1 for player 2
+        ("actions", (env_num,), np.int64),
+        ("commands", (env_num,), np.int8),
+        ("errors", (worker_num,), np.bool_),
+        ("stop", (1,), np.bool_),
+        ]
+
+def _shared_arrays(buffer, env_num: int, worker_num: int, grid_column_count: int, grid_row_count: int):
+    """
+    Returns the numpy views on a shared memory buffer, or the amount of bytes needed if no buffer is given.
+    Every array starts at a multiple of 8 bytes.
+    """
+    arrays = {}
+    offset = 0
+    for name, shape, dtype in _shared_array_specs(env_num, worker_num, grid_column_count, grid_row_count):
+        size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        if buffer is not None:
+            arrays[name] = np.ndarray(shape, dtype=dtype, buffer=buffer, offset=offset)
+        offset += (size + 7) // 8 * 8
+    return arrays if buffer is not None else offset
+
+####################################################
+# WORKER PROCESS
+####################################################
+
+def _worker(worker_index: int,
+            env_ids: List[int],
+            shared_memory_name: str,
+            barrier,
+            env_num: int,
+            worker_num: int,
+            env_kwargs: dict):
+    """
+    Steps the environments of one slice, each round starts and ends by waiting on the barrier.
+    Results are written straight into the shared memory block.
+    """
+    block = shared_memory.SharedMemory(name= shared_memory_name)
+    arrays = _shared_arrays(block.buf, env_num, worker_num, env_kwargs["grid_column_count"], env_kwargs["grid_row_count"])
+    agent_indices = {"player_1": 0, "player_2": 1}
+
+    # Unwrapped environments, the checks of the PettingZoo wrappers are done inline
+    envs = {env_id: raw_env(inline_checks= True, **env_kwargs) for env_id in env_ids}
+
+    try:
+        while True:
+            barrier.wait()
+            if arrays["stop"][0]:
+                break
+
+            try:
+                for env_id, env in envs.items():
+                    command = arrays["commands"][env_id]
+                    if command == COMMAND_NONE:
+                        continue
+                    if command == COMMAND_STEP:
+                        env.step(int(arrays["actions"][env_id]))
+                    else:
+                        env.reset()
+
+                    # Write the result as the Tianshou PettingZooEnv wrapper would return it
+                    observation = env.observe(env.agent_selection)
+                    arrays["boards"][env_id] = observation["observation"]
+                    arrays["masks"][env_id] = observation["action_mask"]
+                    arrays["rewards"][env_id, 0] = env.rewards["player_1"]
+                    arrays["rewards"][env_id, 1] = env.rewards["player_2"]
+                    arrays["dones"][env_id] = env.dones[env.agent_selection]
+                    arrays["players"][env_id] = agent_indices[env.agent_selection]
+            except Exception:
+                arrays["errors"][worker_index] = True
+
+            barrier.wait()
+    finally:
+        del arrays
+        block.close()
+
+####################################################
+# MAIN VECTOR ENVIRONMENT CLASS
+####################################################
+
+class ConnectFourSharedMemoryVectorEnv:
+    """
+    Plays env_num V2 connect four environments (raw_env) spread over worker_num processes, following the interface of a Tianshou vector environment.
+    The results of the environments are kept in one shared memory block, thus only the actions and results are exchanged through memory.
+    Observations are returned as {"agent_id": ..., "obs": ..., "mask": ...} and rewards as the rewards of both players,
+        which is the same as the Tianshou PettingZooEnv wrapper returns for each environment.
+    The environments run unwrapped with the checks of the PettingZoo wrappers done inline (see env(..., fast_path= True)).
+    """
+
+    def __init__(self,
+                 env_num: int,
+                 worker_num: int = 1,
+                 grid_column_count: int = 7,
+                 grid_row_count: int = 6,
+                 reward_win: int = REWARD_WIN,
+                 reward_loss: int = REWARD_LOSS,
+                 reward_draw: int = REWARD_DRAW,
+                 reward_invalid: int = REWARD_INVALID,
+                 reward_move: int = REWARD_MOVE,
+                 reward_blocking: int = REWARD_BLOCKING,
+                 allow_invalid_move: bool = True):
+        if not 1 <= worker_num <= env_num:
+            raise ValueError(f"Expected between 1 and {env_num} workers, got {worker_num}.")
+
+        # Store game specific settings
+        self.env_num = env_num
+        self.worker_num = worker_num
+        self.grid_column_count = grid_column_count
+        self.grid_row_count = grid_row_count
+        self.closed = False
+
+        # All environments are stepped at once, as the Tianshou Collector expects (e.g. not an async vector environment)
+        self.is_async = False
+
+        # Our game allows for two agents to play
+        self.agents = ["player_1", "player_2"]
+        self.__agent_ids = np.array(self.agents)
+
+        # Observation and action space of each environment, as the list a Tianshou vector environment provides
+        single_observation_space = gym.spaces.Dict(
+            {
+                "observation": gym.spaces.Box(
+                    low=0,
+                    high=2,
+                    shape=((self.grid_row_count, self.grid_column_count)),
+                    dtype=np.int8
+                    ),
+                "action_mask": gym.spaces.Box(
+                    low=0,
+                    high=1,
+                    shape=(self.grid_column_count,),
+                    dtype=np.int8),
+            }
+        )
+        self.observation_space = [single_observation_space for _ in range(self.env_num)]
+        self.action_space = [gym.spaces.Discrete(self.grid_column_count) for _ in range(self.env_num)]
+
+        # Shared memory block holding the state of all environments
+        self.__block = shared_memory.SharedMemory(create= True,
+                                                  size= _shared_arrays(None, env_num, worker_num, grid_column_count, grid_row_count))
+        self.__arrays = _shared_arrays(self.__block.buf, env_num, worker_num, grid_column_count, grid_row_count)
+        for array in self.__arrays.values():
+            array.fill(0)
+
+        # Start the workers, each one steps a consecutive slice of environments
+        env_kwargs = {
+            "grid_column_count": grid_column_count,
+            "grid_row_count": grid_row_count,
+            "reward_win": reward_win,
+            "reward_loss": reward_loss,
+            "reward_draw": reward_draw,
+            "reward_invalid": reward_invalid,
+            "reward_move": reward_move,
+            "reward_blocking": reward_blocking,
+            "allow_invalid_move": allow_invalid_move,
+            }
+        self.__barrier = mp.Barrier(worker_num + 1)
+        self.__workers = []
+        for worker_index, env_ids in enumerate(np.array_split(np.arange(env_num), worker_num)):
+            worker = mp.Process(target= _worker,
+                                args= (worker_index, env_ids.tolist(), self.__block.name, self.__barrier, env_num, worker_num, env_kwargs),
+                                daemon= True)
+            worker.start()
+            self.__workers.append(worker)
+
+    def __len__(self):
+        """
+        Returns the amount of environments.
+        """
+        return self.env_num
+
+    def __del__(self):
+        if not getattr(self, "closed", True):
+            self.close()
+
+    def _get_ids(self, id: Optional[Union[int, List[int], np.ndarray]] = None):
+        """
+        Private function to convert the Tianshou id argument to an array of environment indices.
+        """
+        if id is None:
+            return np.arange(self.env_num)
+        return np.atleast_1d(np.asarray(id, dtype=np.int64))
+
+    def _run(self, ids: np.ndarray, command: int):
+        """
+        Private function to let the workers run a command on the specified environments and wait for the results.
+        """
+        commands = self.__arrays["commands"]
+        commands.fill(COMMAND_NONE)
+        commands[ids] = command
+
+        # Start and finish barrier of the round
+        self.__barrier.wait(timeout= BARRIER_TIMEOUT)
+        self.__barrier.wait(timeout= BARRIER_TIMEOUT)
+
+        if self.__arrays["errors"].any():
+            raise RuntimeError(f"Connect four worker(s) {np.nonzero(self.__arrays['errors'])[0].tolist()} failed.")
+
+    def _get_obs(self, ids: np.ndarray):
+        """
+        Private function to copy the observations of the specified environments out of the shared memory.
+        """
+        return {
+            "agent_id": self.__agent_ids[self.__arrays["players"][ids]],
+            "obs": self.__arrays["boards"][ids],
+            "mask": self.__arrays["masks"][ids]
+            }
+
+    def _get_info(self, ids: np.ndarray):
+        """
+        Private function to get the info of the specified environments.
+        """
+        return {
+            "current_player": (self.__arrays["players"][ids] + 1).astype(np.int8)
+            }
+
+    def reset(self, id: Optional[Union[int, List[int], np.ndarray]] = None):
+        """
+        Resets the specified environments (all per default) to an empty board and returns their observations.
+        """
+        ids = self._get_ids(id)
+        self._run(ids, COMMAND_RESET)
+        return self._get_obs(ids)
+
+    def step(self, action: np.ndarray, id: Optional[Union[int, List[int], np.ndarray]] = None):
+        """
+        Performs one action (e.g. coin insert in provided column) for each of the specified environments.
+        Returns the observations, rewards of both players, done flags and info of those environments.
+        """
+        ids = self._get_ids(id)
+        action = np.atleast_1d(np.asarray(action, dtype=np.int64))
+
+        # Ensure there is one action per environment and the actions are valid columns
+        if len(action) != len(ids):
+            raise ValueError(f"Expected {len(ids)} actions, got {len(action)}.")
+        if np.any((action < 0) | (action >= self.grid_column_count)):
+            raise ValueError(f"Actions should be columns in [0, {self.grid_column_count}), got {action}.")
+
+        self.__arrays["actions"][ids] = action
+        self._run(ids, COMMAND_STEP)
+        return self._get_obs(ids), self.__arrays["rewards"][ids], self.__arrays["dones"][ids], self._get_info(ids)
+
+    def seed(self, seed: Optional[Union[int, List[int]]] = None):
+        """
+        The game itself is deterministic, seeding is only supported for compatibility with Tianshou.
+        """
+        return [seed for _ in range(self.env_num)]
+
+    def render(self, mode: str = 'terminal', id: Optional[Union[int, List[int], np.ndarray]] = None):
+        """
+        Renders the specified environments (all per default) to the terminal.
+        """
+        if mode != "terminal":
+            raise NotImplementedError("test: Unknown render option, choose from: ['terminal']")
+
+        for board in self.__arrays["boards"][self._get_ids(id)]:
+            print(np.flip(board, 0))
+
+    def close(self):
+        """
+        Stops the workers and frees the shared memory block.
+        """
+        if self.closed:
+            return
+        self.closed = True
+
+        # Let the workers leave their loop
+        self.__arrays["stop"][0] = True
+        try:
+            self.__barrier.wait(timeout= BARRIER_TIMEOUT)
+        except Exception:
+            pass
+        for worker in self.__workers:
+            worker.join(timeout= BARRIER_TIMEOUT)
+            if worker.is_alive():
+                worker.terminate()
+
+        self.__arrays = {}
+        self.__block.close()
+        self.__block.unlink()
@@ -0,0 +1,310 @@
+####################################################
+# ABOUT THIS FILE
+####################################################
+# Batched connect four environment which plays N games at once.
+# All boards are stored in a single numpy array and every step applies N moves using vectorized numpy operations,
+#   no Python loop per board is used.
+#
+# The rules and rewards mirror the V2 gym environment (ConnectFourPygameEnvV2) wrapped in a Tianshou PettingZooEnv.
+# It follows the interface of a Tianshou vector environment and can thus be used instead of
+#   ts.env.DummyVectorEnv([get_env for _ in range(training_env_num)]) in a ts.data.Collector.
+
+####################################################
+# INFO ABOUT THE AUTHOR
+####################################################
+# Name: Lennert Bontinck
+# Email: lennert.bontinck@vub.be / info@lennertbontinck.com
+
+
+####################################################
+# IMPORTS
+####################################################
+
+# Gym for providing the spaces
+import gym
+
+# Allow for optionals
+from typing import Optional, Union, List
+
+# Numpy for easy numerical data structures
+import numpy as np
+
+# Shared win detection for boards too large for a bitboard
+from connect4_core.win_detection import winning_boards
+
+####################################################
+# GLOBAL VARIABLES
+####################################################
+
+# GRID CODES
+GRID_EMPTY_SPACE = 0
+GRID_PLAYER1_COIN = 1
+GRID_PLAYER2_COIN = 2
+
+# REWARDS
+REWARD_WIN = 10
+REWARD_LOSS = -10
+REWARD_DRAW = 5
+REWARD_INVALID = -1
+REWARD_MOVE = 0
+REWARD_BLOCKING = 0
+
+####################################################
+# MAIN VECTOR ENVIRONMENT CLASS
+####################################################
+
+class ConnectFourVectorEnv:
+    """
+    Plays env_num connect four games at once, following the interface of a Tianshou vector environment.
+    The boards are stored in one (env_num, rows, columns) int8 array, the game logic uses one bitboard per player and board.
+    Boards that do not fit in a 64-bit bitboard, e.g. 10x8, are checked for wins on the int8 boards using the shared win detection.
+    Observations are returned as {"agent_id": ..., "obs": ..., "mask": ...} like the Tianshou PettingZooEnv wrapper does.
+    Rewards are returned per step for both players, e.g. with shape (env_num, 2).
+    When auto_reset is enabled, finished games are reset at the start of the next step call,
+        thus the terminal observation is still returned by the step that finished the game.
+    """
+
+    def __init__(self,
+                 env_num: int,
+                 grid_column_count: int = 7,
+                 grid_row_count: int = 6,
+                 reward_win: int = REWARD_WIN,
+                 reward_loss: int = REWARD_LOSS,
+                 reward_draw: int = REWARD_DRAW,
+                 reward_invalid: int = REWARD_INVALID,
+                 reward_move: int = REWARD_MOVE,
+                 reward_blocking: int = REWARD_BLOCKING,
+                 allow_invalid_move: bool = True,
+                 auto_reset: bool = True):
+        # Store game specific settings
+        self.env_num = env_num
+        self.grid_column_count = grid_column_count
+        self.grid_row_count = grid_row_count
+        self.reward_win = reward_win
+        self.reward_loss = reward_loss
+        self.reward_draw = reward_draw
+        self.reward_invalid = reward_invalid
+        self.reward_move = reward_move
+        self.reward_blocking = reward_blocking
+        self.allow_invalid_move = allow_invalid_move
+        self.auto_reset = auto_reset
+
+        # All environments are stepped at once, as the Tianshou Collector expects (e.g. not an async vector environment)
+        self.is_async = False
+
+        # Our game allows for two agents to play
+        self.agents = ["player_1", "player_2"]
+        self.__agent_ids = np.array(self.agents)
+
+        # Observation and action space of each environment, as the list a Tianshou vector environment provides
+        single_observation_space = gym.spaces.Dict(
+            {
+                "observation": gym.spaces.Box(
+                    low=0,
+                    high=2,
+                    shape=((self.grid_row_count, self.grid_column_count)),
+                    dtype=np.int8
+                    ),
+                "action_mask": gym.spaces.Box(
+                    low=0,
+                    high=1,
+                    shape=(self.grid_column_count,),
+                    dtype=np.int8),
+            }
+        )
+        self.observation_space = [single_observation_space for _ in range(self.env_num)]
+        self.action_space = [gym.spaces.Discrete(self.grid_column_count) for _ in range(self.env_num)]
+
+        # Bitboard constants: each column takes up rows + 1 bits, the top one being a sentinel
+        # A bitboard should fit in a 64-bit integer, otherwise the int8 boards are used for the win detection
+        column_bit_count = self.grid_row_count + 1
+        self.__use_bitboards = self.grid_column_count * column_bit_count <= 64
+        if self.__use_bitboards:
+            self.__direction_shifts = [np.uint64(shift) for shift in (1, column_bit_count, column_bit_count - 1, column_bit_count + 1)]
+            cell_indices = np.arange(self.grid_column_count)[:, None] * column_bit_count + np.arange(self.grid_row_count)[None, :]
+            self.__cell_bits = np.left_shift(np.uint64(1), cell_indices.astype(np.uint64))
+
+        # Game state of all boards
+        self.__boards = np.zeros((self.env_num, self.grid_row_count, self.grid_column_count), dtype=np.int8)
+        self.__bitboards = np.zeros((self.env_num, 2), dtype=np.uint64)
+        self.__heights = np.zeros((self.env_num, self.grid_column_count), dtype=np.int64)
+        self.__move_counts = np.zeros(self.env_num, dtype=np.int64)
+        self.__players = np.zeros(self.env_num, dtype=np.int64) # 0 for player 1, 1 for player 2
+        self.__dones = np.zeros(self.env_num, dtype=bool)
+
+    def __len__(self):
+        """
+        Returns the amount of environments.
+        """
+        return self.env_num
+
+    def _get_ids(self, id: Optional[Union[int, List[int], np.ndarray]] = None):
+        """
+        Private function to convert the Tianshou id argument to an array of board indices.
+        """
+        if id is None:
+            return np.arange(self.env_num)
+        return np.atleast_1d(np.asarray(id, dtype=np.int64))
+
+    def _get_obs(self, ids: np.ndarray):
+        """
+        Private function to get the observations of the specified boards in the Tianshou PettingZooEnv format.
+        """
+        if self.allow_invalid_move:
+            mask = np.ones((len(ids), self.grid_column_count), dtype=bool)
+        else:
+            mask = self.__heights[ids] < self.grid_row_count
+
+        return {
+            "agent_id": self.__agent_ids[self.__players[ids]],
+            "obs": self.__boards[ids],
+            "mask": mask
+            }
+
+    def _get_info(self, ids: np.ndarray):
+        """
+        Private function to get the info of the specified boards.
+        """
+        return {
+            "current_player": (self.__players[ids] + 1).astype(np.int8)
+            }
+
+    def _has_four_in_a_row(self, bitboards: np.ndarray):
+        """
+        Returns for each bitboard whether or not it contains four connected coins in any direction.
+        """
+        won = np.zeros(bitboards.shape, dtype=bool)
+        for shift in self.__direction_shifts:
+            pairs = bitboards & (bitboards >> shift)
+            won |= (pairs & (pairs >> (shift + shift))) != 0
+        return won
+
+    def _reset_boards(self, ids: np.ndarray):
+        """
+        Private function to empty the specified boards.
+        """
+        self.__boards[ids] = GRID_EMPTY_SPACE
+        self.__bitboards[ids] = 0
+        self.__heights[ids] = 0
+        self.__move_counts[ids] = 0
+        self.__players[ids] = 0
+        self.__dones[ids] = False
+
+    def reset(self, id: Optional[Union[int, List[int], np.ndarray]] = None):
+        """
+        Resets the specified environments (all per default) to an empty board and returns their observations.
+        """
+        ids = self._get_ids(id)
+        self._reset_boards(ids)
+        return self._get_obs(ids)
+
+    def step(self, action: np.ndarray, id: Optional[Union[int, List[int], np.ndarray]] = None):
+        """
+        Performs one action (e.g. coin insert in provided column) for each of the specified environments.
+        Returns the observations, rewards of both players, done flags and info of those environments.
+        Rewards follow the V2 environment:
+            - Regular move: reward_move (+ reward_blocking if the move blocked a win of the oponent)
+            - Invalid move (e.g. full column): reward_invalid, game ends if invalid moves are not allowed
+            - Move leading to win: reward_win for the player, reward_loss for the oponent
+            - Move leading to draw: reward_draw for both players
+        """
+        ids = self._get_ids(id)
+        action = np.atleast_1d(np.asarray(action, dtype=np.int64))
+
+        # Ensure there is one action per environment and the actions are valid columns
+        if len(action) != len(ids):
+            raise ValueError(f"Expected {len(ids)} actions, got {len(action)}.")
+        if np.any((action < 0) | (action >= self.grid_column_count)):
+            raise ValueError(f"Actions should be columns in [0, {self.grid_column_count}), got {action}.")
+
+        # Finished games of the previous step start over
+        if self.auto_reset:
+            finished_ids = ids[self.__dones[ids]]
+            if len(finished_ids) > 0:
+                self._reset_boards(finished_ids)
+
+        rewards = np.zeros((len(ids), 2), dtype=np.float64)
+        players = self.__players[ids]
+        rows = self.__heights[ids, action]
+
+        # Games that were not auto reset ignore actions once finished
+        playing = ~self.__dones[ids]
+        valid = playing & (rows < self.grid_row_count)
+
+        # Invalid move: board stays as it was, current player gets negative reward
+        invalid = playing & ~valid
+        rewards[invalid, players[invalid]] += self.reward_invalid
+        if not self.allow_invalid_move:
+            # Without invalid moves the game is terminated, as done by the PettingZoo TerminateIllegalWrapper
+            self.__dones[ids[invalid]] = True
+
+        # Place the coins of the valid moves
+        valid_positions = np.nonzero(valid)[0]
+        valid_ids = ids[valid_positions]
+        valid_players = players[valid_positions]
+        valid_actions = action[valid_positions]
+        valid_rows = rows[valid_positions]
+
+        # A move is blocking if the oponent would have won by placing a coin there
+        if self.__use_bitboards:
+            bits = self.__cell_bits[valid_actions, valid_rows]
+            if self.reward_blocking != 0:
+                blocking = self._has_four_in_a_row(self.__bitboards[valid_ids, 1 - valid_players] | bits)
+            self.__bitboards[valid_ids, valid_players] |= bits
+        elif self.reward_blocking != 0:
+            oponent_boards = self.__boards[valid_ids]
+            oponent_boards[np.arange(len(valid_ids)), valid_rows, valid_actions] = 2 - valid_players
+            blocking = winning_boards(oponent_boards, 2 - valid_players)
+
+        self.__heights[valid_ids, valid_actions] += 1
+        self.__move_counts[valid_ids] += 1
+        self.__boards[valid_ids, valid_rows, valid_actions] = valid_players + 1
+
+        # Determine the result of the valid moves
+        if self.__use_bitboards:
+            won = self._has_four_in_a_row(self.__bitboards[valid_ids, valid_players])
+        else:
+            won = winning_boards(self.__boards[valid_ids], valid_players + 1)
+        full = ~won & (self.__move_counts[valid_ids] == self.grid_column_count * self.grid_row_count)
+        ongoing = ~(won | full)
+
+        # One player wins and the other loses
+        rewards[valid_positions[won], valid_players[won]] += self.reward_win
+        rewards[valid_positions[won], 1 - valid_players[won]] += self.reward_loss
+
+        # Board filling move, tie
+        rewards[valid_positions[full]] += self.reward_draw
+
+        # Reward current player for doing a (blocking) move
+        rewards[valid_positions[ongoing], valid_players[ongoing]] += self.reward_move
+        if self.reward_blocking != 0:
+            blocked = ongoing & blocking
+            rewards[valid_positions[blocked], valid_players[blocked]] += self.reward_blocking
+
+        # Finish games and switch players for the others
+        self.__dones[valid_ids[~ongoing]] = True
+        self.__players[valid_ids[ongoing]] = 1 - valid_players[ongoing]
+
+        return self._get_obs(ids), rewards, self.__dones[ids].copy(), self._get_info(ids)
+
+    def seed(self, seed: Optional[Union[int, List[int]]] = None):
+        """
+        The game itself is deterministic, seeding is only supported for compatibility with Tianshou.
+        """
+        return [seed for _ in range(self.env_num)]
+
+    def render(self, mode: str = 'terminal', id: Optional[Union[int, List[int], np.ndarray]] = None):
+        """
+        Renders the specified environments (all per default) to the terminal.
+        """
+        if mode != "terminal":
+            raise NotImplementedError("test: Unknown render option, choose from: ['terminal']")
+
+        for board in self.__boards[self._get_ids(id)]:
+            print(np.flip(board, 0))
+
+    def close(self):
+        """
+        No resources to free, supported for compatibility with Tianshou.
+        """
+        return
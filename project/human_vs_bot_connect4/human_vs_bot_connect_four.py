@@ -23,6 +23,9 @@ import random as rnd
 
 sys.path.append('../')
 import minimax_agent.minimax_agent as minimaxbot
+import mcts_agent.mcts_agent as mctsbot
+import mcts_agent.neural_mcts_agent as neuralmctsbot
+from connect4_core.win_detection import winning_board
 
 ####################################################
 # INITIALIZE PYGAME
@@ -122,36 +125,8 @@ def __winning_board(board: np.ndarray, grid_player_coin: int):
     Returns whether or not the board is won by the provided player.
     Should be called after placing a piece.
     """
-    # check all horizontal locations
-    for c in range(GRID_COLUMN_COUNT - 3):
-        for r in range(GRID_ROW_COUNT):
-            if board[r][c] == grid_player_coin and board[r][c + 1] == grid_player_coin and board[r][c + 2] == grid_player_coin and \
-                    board[r][c + 3] == grid_player_coin:
-                return True
-
-    # check vertical locations for win
-    for c in range(GRID_COLUMN_COUNT):
-        for r in range(GRID_ROW_COUNT - 3):
-            if board[r][c] == grid_player_coin and board[r + 1][c] == grid_player_coin and board[r + 2][c] == grid_player_coin and \
-                    board[r + 3][c] == grid_player_coin:
-                return True
-
-    # check positively sloped diagonals
-    for c in range(GRID_COLUMN_COUNT - 3):
-        for r in range(GRID_ROW_COUNT - 3):
-            if board[r][c] == grid_player_coin and board[r + 1][c + 1] == grid_player_coin and board[r + 2][c + 2] == grid_player_coin and \
-                    board[r + 3][c + 3] == grid_player_coin:
-                return True
-
-    # check negatively sloped diagonals
-    for c in range(GRID_COLUMN_COUNT - 3):
-        for r in range(3, GRID_ROW_COUNT):
-            if board[r][c] == grid_player_coin and board[r - 1][c + 1] == grid_player_coin and board[r - 2][c + 2] == grid_player_coin and \
-                    board[r - 3][c + 3] == grid_player_coin:
-                return True
-            
-    # No winning board
-    return False
+    # Check all windows of four cells in one numpy call
+    return winning_board(board, grid_player_coin)
     
 def __full_board(board: np.ndarray):
     """
@@ -353,8 +328,8 @@ def play_game(player1 = "me",
     while not game_finished:  
         if player_one_playing and player1!="me":
             
-            if isinstance(player1, minimaxbot.MiniMaxConnectFourBot):
-                # player 1 is minimax agent
+            if isinstance(player1, (minimaxbot.MiniMaxConnectFourBot, mctsbot.MCTSConnectFourBot, neuralmctsbot.NeuralMCTSConnectFourBot)):
+                # player 1 is minimax or (neural) MCTS agent
                 bot_selected_column = player1.predict(board)
             else:
                 # Player 1 is a pytorch bot, let the bot choose a move
@@ -380,9 +355,9 @@ def play_game(player1 = "me",
             
             
         if (not player_one_playing) and player2!="me":
-            if isinstance(player2, minimaxbot.MiniMaxConnectFourBot):
-                # player 2 is minimax agent
-                bot_selected_column = player1.predict(board)
+            if isinstance(player2, (minimaxbot.MiniMaxConnectFourBot, mctsbot.MCTSConnectFourBot, neuralmctsbot.NeuralMCTSConnectFourBot)):
+                # player 2 is minimax or (neural) MCTS agent
+                bot_selected_column = player2.predict(board)
             else:
                 # Player 2 is a pytorch bot, let the bot choose a move
                 observation = ts.data.Batch(obs= [board],
@@ -0,0 +1,270 @@
+####################################################
+# ABOUT THIS FILE
+####################################################
+# Description: Monte Carlo Tree Search (MCTS) agent for connect four
+#   Every simulation selects a path through the tree using UCT, adds one new node and plays a fast rollout on bitboards.
+#   The subtree of the played column and the column of the oponent is reused by the next prediction.
+#
+# Author name: Lennert Bontinck
+# Author email: lennert.bontinck@vub.be / info@lennertbontinck.com
+#
+# Implementation based on: https://www.chessprogramming.org/UCT
+
+
+####################################################
+# IMPORTS
+####################################################
+
+import math
+import time
+import random as rnd
+from typing import Optional
+
+# Bitboard game core for loading boards and the winning cells of the tree and rollouts
+from connect4_core.bitboard_connect_four import BitboardConnectFour
+
+####################################################
+# GLOBAL VARIABLES
+####################################################
+
+# ROLLOUT POLICIES
+ROLLOUT_RANDOM = "random" # uniformly random columns
+ROLLOUT_HEURISTIC = "heuristic" # play a winning column, otherwise block a winning column of the oponent, otherwise random
+
+# Results of a simulation for the player that moved into a node
+RESULT_WIN = 1.0
+RESULT_DRAW = 0.5
+
+# Amount of simulations between checks of the time budget
+TIME_CHECK_INTERVAL = 16
+
+####################################################
+# SEARCH TREE
+####################################################
+
+class _Node:
+    """
+    Node of the search tree, the player that moved into the node is the one its wins are counted for.
+    """
+    __slots__ = ("children", "untried_columns", "visits", "wins", "terminal_result")
+
+    def __init__(self, untried_columns: list, terminal_result: Optional[float] = None):
+        self.children = {}
+        self.untried_columns = untried_columns
+        self.visits = 0
+        self.wins = 0.0
+        self.terminal_result = terminal_result
+
+####################################################
+# MCTS AGENT
+####################################################
+
+class MCTSConnectFourBot:
+    def __init__(self,
+                 coin: int,
+                 oponent_coin: int,
+                 column_count: int,
+                 row_count: int,
+                 simulations: Optional[int] = 10000,
+                 time_budget: Optional[float] = None,
+                 exploration: float = math.sqrt(2),
+                 rollout: str = ROLLOUT_HEURISTIC,
+                 reuse_tree: bool = True,
+                 seed: Optional[int] = None):
+        """
+        Creates a Monte Carlo Tree Search bot for our custom connect four application, with the same predict(board) interface as the MiniMax bot.
+        A prediction stops after the given amount of simulations or once the time budget in seconds passed, whichever comes first.
+        At least one of both should be given. The most visited column of the root is played.
+        Rollouts are either random or heuristic (see ROLLOUT_HEURISTIC) and are played on bitboards.
+        With reuse_tree, the subtree of the played column and the column the oponent answered with is kept for the next prediction.
+        """
+        if simulations is None and time_budget is None:
+            raise ValueError("Provide a simulations and/or time_budget budget.")
+        if rollout not in (ROLLOUT_RANDOM, ROLLOUT_HEURISTIC):
+            raise ValueError(f"Unknown rollout {rollout}, choose from: {[ROLLOUT_RANDOM, ROLLOUT_HEURISTIC]}")
+
+        self.coin = coin
+        self.oponent_coin = oponent_coin
+        self.column_count = column_count
+        self.row_count = row_count
+        self.simulations = simulations
+        self.time_budget = time_budget
+        self.exploration = exploration
+        self.rollout = rollout
+        self.reuse_tree = reuse_tree
+        self.__random = rnd.Random(seed)
+
+        # Bitboard game core for loading boards, the search itself works on plain integers
+        self.__game = BitboardConnectFour(column_count= column_count, row_count= row_count)
+        self.__cell_count = column_count * row_count
+
+        # Root of the reusable tree and the state (bitboards, heights) it belongs to, e.g. after the last played column
+        self.__root = None
+        self.__root_state = None
+
+        # Search statistics
+        self.simulation_count = 0
+        self.reused_visits = 0
+
+    def predict(self, board):
+        """
+        Returns the column to play for the bot on a row x column numpy board with grid codes.
+        """
+        self.__game.load_board(board)
+        bitboards = (self.__game.bitboards[self.coin - 1], self.__game.bitboards[self.oponent_coin - 1])
+        heights = tuple(self.__game.heights)
+
+        # Continue from the subtree of the previous prediction if the oponent played a column of it
+        root = self.__find_reusable_root(bitboards, heights) if self.reuse_tree else None
+        if root is None:
+            root = _Node(self.__game.candidate_columns(bitboards[0], bitboards[1]))
+        self.reused_visits = root.visits
+
+        # Simulate until the budget is used
+        deadline = None if self.time_budget is None else time.time() + self.time_budget
+        self.simulation_count = 0
+        while self.simulations is None or self.simulation_count < self.simulations:
+            if deadline is not None and self.simulation_count % TIME_CHECK_INTERVAL == 0 and time.time() > deadline:
+                break
+            self.__simulate(root, bitboards, heights)
+            self.simulation_count += 1
+
+        # Most visited column, a fully explored root might have no children if the game is over
+        if not root.children:
+            return self.__random.choice(self.__valid_columns(heights))
+        column = max(root.children, key= lambda col: root.children[col].visits)
+
+        # Keep the subtree of the played column
+        own_bitboard = bitboards[0] | (1 << (column * (self.row_count + 1) + heights[column]))
+        next_heights = heights[:column] + (heights[column] + 1,) + heights[column + 1:]
+        self.__root = root.children[column]
+        self.__root_state = ((own_bitboard, bitboards[1]), next_heights)
+        return column
+
+    def __valid_columns(self, heights):
+        """
+        Returns the playable columns for the given column heights.
+        """
+        return [column for column in range(self.column_count) if heights[column] < self.row_count]
+
+    def __find_reusable_root(self, bitboards, heights):
+        """
+        Returns the node of the kept subtree matching the given state (one oponent coin after the stored state) or None.
+        """
+        if self.__root is None:
+            return None
+
+        (own_bitboard, oponent_bitboard), root_heights = self.__root_state
+        if bitboards[0] != own_bitboard:
+            return None
+
+        # Exactly one column should have grown, by a coin of the oponent
+        changed_columns = [column for column in range(self.column_count) if heights[column] != root_heights[column]]
+        if len(changed_columns) != 1 or heights[changed_columns[0]] != root_heights[changed_columns[0]] + 1:
+            return None
+        column = changed_columns[0]
+        if bitboards[1] != oponent_bitboard | (1 << (column * (self.row_count + 1) + root_heights[column])):
+            return None
+
+        return self.__root.children.get(column)
+
+    def __simulate(self, root: _Node, root_bitboards, root_heights):
+        """
+        Runs one simulation: selection, expansion, rollout and backpropagation.
+        Player 0 is the bot (to move at the root) and player 1 the oponent.
+        """
+        column_bit_count = self.row_count + 1
+        bitboards = list(root_bitboards)
+        heights = list(root_heights)
+        move_count = sum(heights)
+        player = 0
+        node = root
+        path = [root]
+
+        # Selection, descend through fully expanded nodes using UCT
+        while not node.untried_columns and node.children and node.terminal_result is None:
+            log_visits = math.log(node.visits)
+            best_value = -math.inf
+            for col, child in node.children.items():
+                value = child.wins / child.visits + self.exploration * math.sqrt(log_visits / child.visits)
+                if value > best_value:
+                    best_value = value
+                    column = col
+                    node_child = child
+            node = node_child
+            bitboards[player] |= 1 << (column * column_bit_count + heights[column])
+            heights[column] += 1
+            move_count += 1
+            player ^= 1
+            path.append(node)
+
+        # Expansion, add a child for a random untried column
+        if node.terminal_result is None and node.untried_columns:
+            column = node.untried_columns.pop(self.__random.randrange(len(node.untried_columns)))
+            bitboards[player] |= 1 << (column * column_bit_count + heights[column])
+            heights[column] += 1
+            move_count += 1
+
+            if self.__game.has_four_in_a_row(bitboards[player]):
+                child = _Node([], terminal_result= RESULT_WIN)
+            elif move_count == self.__cell_count:
+                child = _Node([], terminal_result= RESULT_DRAW)
+            else:
+                child = _Node(self.__game.candidate_columns(bitboards[player ^ 1], bitboards[player]))
+            node.children[column] = child
+            node = child
+            player ^= 1
+            path.append(node)
+
+        # Rollout, result for the player that moved into the last node of the path
+        if node.terminal_result is not None:
+            result = node.terminal_result
+        else:
+            winner = self.__rollout(bitboards, heights, move_count, player)
+            result = RESULT_DRAW if winner is None else (RESULT_WIN if winner != player else 0.0)
+
+        # Backpropagation, the result flips between the players of consecutive nodes
+        for path_node in reversed(path):
+            path_node.visits += 1
+            path_node.wins += result
+            result = 1.0 - result
+
+    def __rollout(self, bitboards: list, heights: list, move_count: int, player: int):
+        """
+        Plays the game to the end from the given state, player being the one to move.
+        Returns the winning player or None for a draw.
+        """
+        game = self.__game
+        random = self.__random
+        column_bit_count = self.row_count + 1
+        heuristic = self.rollout == ROLLOUT_HEURISTIC
+        valid_columns = self.__valid_columns(heights)
+
+        while move_count < self.__cell_count:
+            column = None
+            if heuristic:
+                mask = bitboards[0] | bitboards[1]
+                possible = (mask + game.bottom_mask) & game.board_mask
+
+                # Win if possible, otherwise block a win of the oponent
+                cells = game.winning_cells(bitboards[player], mask) & possible
+                if cells:
+                    return player
+                cells = game.winning_cells(bitboards[player ^ 1], mask) & possible
+                if cells:
+                    column = ((cells & -cells).bit_length() - 1) // column_bit_count
+
+            if column is None:
+                column = valid_columns[random.randrange(len(valid_columns))]
+
+            bitboards[player] |= 1 << (column * column_bit_count + heights[column])
+            heights[column] += 1
+            move_count += 1
+            if heights[column] == self.row_count:
+                valid_columns.remove(column)
+
+            if not heuristic and game.has_four_in_a_row(bitboards[player]):
+                return player
+            player ^= 1
+
+        return None
@@ -0,0 +1,364 @@
+####################################################
+# ABOUT THIS FILE
+####################################################
+# Description: Neural Monte Carlo Tree Search agent for connect four (AlphaZero-style search)
+#   Instead of playing rollouts, the leaves of the tree are evaluated by the Q-network of a trained DQN or Rainbow policy
+#   (e.g. CNNBasedDQN or Rainbow on top of CNNForRainbow from the paper notebooks):
+#   the Q-values of a board give the priors of its columns and the best Q-value the value of the board.
+#   Leaves are gathered into a batch using virtual loss, such that a single forward pass evaluates all of them.
+#
+# Author name: Lennert Bontinck
+# Author email: lennert.bontinck@vub.be / info@lennertbontinck.com
+#
+# Implementation based on: https://www.nature.com/articles/nature24270 (PUCT selection)
+#                          and https://arxiv.org/abs/1810.11755 (virtual loss for batched leaf evaluation)
+
+
+####################################################
+# IMPORTS
+####################################################
+
+import math
+import time
+from typing import Optional
+
+# Numpy for easy numerical data structures
+import numpy as np
+
+# Torch for the forward passes of the network
+import torch
+
+# Tianshou for the DQN and Rainbow policies
+import tianshou as ts
+
+# Bitboard game core for loading boards, the candidate columns and the terminal checks of the tree
+from connect4_core.bitboard_connect_four import BitboardConnectFour
+
+####################################################
+# GLOBAL VARIABLES
+####################################################
+
+# Values of a board for the player that moved into it, the network values are scaled to the same range
+VALUE_WIN = 1.0
+VALUE_DRAW = 0.0
+
+# Rewards of the environments, the Q-values of the network are mapped to values such that these become VALUE_WIN, VALUE_DRAW and -VALUE_WIN
+REWARD_WIN = 10
+REWARD_DRAW = 5
+REWARD_LOSS = -10
+
+# Amount of leaf batches between checks of the time budget
+TIME_CHECK_INTERVAL = 4
+
+####################################################
+# NETWORK HELPERS
+####################################################
+
+def batched_cnn_dqn(network: torch.nn.Module):
+    """
+    Returns a module sharing the weights of a CNNBasedDQN (paper notebooks 6 and 7) that evaluates a batch of boards at once.
+    CNNBasedDQN flattens its batch dimension (Flatten(0, -1) followed by Unflatten(0, (1, size))), thus only accepts one board per call.
+    The returned module expects boards of shape (N, 1, rows, columns).
+    """
+    layers = []
+    for layer in network.model:
+        if isinstance(layer, torch.nn.Unflatten):
+            continue
+        if isinstance(layer, torch.nn.Flatten):
+            layer = torch.nn.Flatten()
+        layers.append(layer)
+    return torch.nn.Sequential(*layers)
+
+####################################################
+# SEARCH TREE
+####################################################
+
+class _NeuralNode:
+    """
+    Node of the search tree, its value is counted for the player that moved into the node.
+    A node is expanded once its board is evaluated, its children then hold the priors of the candidate columns.
+    """
+    __slots__ = ("children", "prior", "visits", "value_sum", "terminal_value", "pending")
+
+    def __init__(self, prior: float, terminal_value: Optional[float] = None):
+        self.children = {}
+        self.prior = prior
+        self.visits = 0
+        self.value_sum = 0.0
+        self.terminal_value = terminal_value
+        self.pending = False
+
+####################################################
+# NEURAL MCTS AGENT
+####################################################
+
+class NeuralMCTSConnectFourBot:
+    def __init__(self,
+                 policy: ts.policy.DQNPolicy,
+                 coin: int,
+                 oponent_coin: int,
+                 column_count: int,
+                 row_count: int,
+                 network_coin: Optional[int] = None,
+                 model: Optional[torch.nn.Module] = None,
+                 simulations: Optional[int] = 800,
+                 time_budget: Optional[float] = None,
+                 leaf_batch_size: int = 16,
+                 virtual_loss: int = 1,
+                 c_puct: float = 1.5,
+                 prior_temperature: float = 0.25,
+                 reward_win: float = REWARD_WIN,
+                 reward_draw: float = REWARD_DRAW,
+                 reward_loss: float = REWARD_LOSS,
+                 reuse_tree: bool = True):
+        """
+        Creates a neural MCTS bot for our custom connect four application, with the same predict(board) interface as the MiniMax bot.
+        The leaves are evaluated by policy, a DQNPolicy or one of its subclasses (e.g. RainbowPolicy), using policy.model
+            or the given model (e.g. batched_cnn_dqn(policy.model) for a CNNBasedDQN) and policy.compute_q_value.
+        The network only saw boards as the player with network_coin (coin per default), the coins are swapped for the boards of the oponent.
+        The softmax of the Q-values divided by prior_temperature gives the priors of the columns of a board and the best Q-value its value,
+            mapped linearly between the rewards of the environment such that reward_win, reward_draw and reward_loss give the values of a win, draw and loss.
+        Up to leaf_batch_size leaves are evaluated per forward pass, a leaf being selected counts as virtual_loss lost games
+            such that the other selections of the batch explore other paths.
+        A prediction stops after the given amount of simulations (evaluated leaves) or once the time budget in seconds passed,
+            whichever comes first. At least one of both should be given. The most visited column of the root is played.
+        With reuse_tree, the subtree of the played column and the column the oponent answered with is kept for the next prediction.
+        Put the policy in eval mode (policy.eval()) to disable the noise of a noisy Rainbow network.
+        """
+        if simulations is None and time_budget is None:
+            raise ValueError("Provide a simulations and/or time_budget budget.")
+
+        self.policy = policy
+        self.model = policy.model if model is None else model
+        self.coin = coin
+        self.oponent_coin = oponent_coin
+        self.network_coin = coin if network_coin is None else network_coin
+        self.column_count = column_count
+        self.row_count = row_count
+        self.simulations = simulations
+        self.time_budget = time_budget
+        self.leaf_batch_size = leaf_batch_size
+        self.virtual_loss = virtual_loss
+        self.c_puct = c_puct
+        self.prior_temperature = prior_temperature
+        self.reward_win = reward_win
+        self.reward_draw = reward_draw
+        self.reward_loss = reward_loss
+        self.reuse_tree = reuse_tree
+
+        # Bitboard game core for loading boards, the search itself works on plain integers
+        self.__game = BitboardConnectFour(column_count= column_count, row_count= row_count)
+        self.__cell_count = column_count * row_count
+
+        # Bit of every cell of a (rows, columns) board, row 0 being the bottom row, to turn bitboards into network inputs
+        self.__cell_bits = np.array([[column * (row_count + 1) + row for column in range(column_count)] for row in range(row_count)],
+                                    dtype= np.uint64).ravel()
+
+        # Root of the reusable tree and the state (bitboards, heights) it belongs to, e.g. after the last played column
+        self.__root = None
+        self.__root_state = None
+
+        # Search statistics
+        self.simulation_count = 0
+        self.forward_count = 0
+        self.reused_visits = 0
+
+    def predict(self, board):
+        """
+        Returns the column to play for the bot on a row x column numpy board with grid codes.
+        At least one batch of leaves is evaluated, even if the budget is already used.
+        """
+        self.__game.load_board(board)
+        bitboards = (self.__game.bitboards[self.coin - 1], self.__game.bitboards[self.oponent_coin - 1])
+        heights = tuple(self.__game.heights)
+
+        # Nothing to search on a finished game
+        if self.__game.has_four_in_a_row(bitboards[0]) or self.__game.has_four_in_a_row(bitboards[1]):
+            raise ValueError("The game is already won, there is no column to play.")
+        if all(height == self.row_count for height in heights):
+            raise ValueError("The board is full, there is no column to play.")
+
+        # Continue from the subtree of the previous prediction if the oponent played a column of it
+        root = self.__find_reusable_root(bitboards, heights) if self.reuse_tree else None
+        if root is None:
+            root = _NeuralNode(prior= 1.0)
+        self.reused_visits = root.visits
+
+        # Evaluate batches of leaves until the budget is used, the first batch expands the root
+        deadline = None if self.time_budget is None else time.time() + self.time_budget
+        self.simulation_count = 0
+        self.forward_count = 0
+        batch_count = 0
+        while batch_count == 0 or self.simulations is None or self.simulation_count < self.simulations:
+            if batch_count > 0 and deadline is not None and (batch_count - 1) % TIME_CHECK_INTERVAL == 0 and time.time() > deadline:
+                break
+            self.__search_batch(root, bitboards, heights)
+            batch_count += 1
+
+        # Most visited column
+        column = max(root.children, key= lambda col: root.children[col].visits)
+
+        # Keep the subtree of the played column
+        own_bitboard = bitboards[0] | (1 << (column * (self.row_count + 1) + heights[column]))
+        next_heights = heights[:column] + (heights[column] + 1,) + heights[column + 1:]
+        self.__root = root.children[column]
+        self.__root_state = ((own_bitboard, bitboards[1]), next_heights)
+        return column
+
+    def __find_reusable_root(self, bitboards, heights):
+        """
+        Returns the node of the kept subtree matching the given state (one oponent coin after the stored state) or None.
+        """
+        if self.__root is None:
+            return None
+
+        (own_bitboard, oponent_bitboard), root_heights = self.__root_state
+        if bitboards[0] != own_bitboard:
+            return None
+
+        # Exactly one column should have grown, by a coin of the oponent
+        changed_columns = [column for column in range(self.column_count) if heights[column] != root_heights[column]]
+        if len(changed_columns) != 1 or heights[changed_columns[0]] != root_heights[changed_columns[0]] + 1:
+            return None
+        column = changed_columns[0]
+        if bitboards[1] != oponent_bitboard | (1 << (column * (self.row_count + 1) + root_heights[column])):
+            return None
+
+        return self.__root.children.get(column)
+
+    def __search_batch(self, root: _NeuralNode, root_bitboards, root_heights):
+        """
+        Selects up to leaf_batch_size leaves under virtual loss, evaluates them in one forward pass and backpropagates their values.
+        Selections ending in a finished game are backpropagated right away, selecting a leaf of the batch a second time ends the batch.
+        """
+        leaves = []
+        selections = 0
+        selection_budget = self.leaf_batch_size if self.simulations is None else max(1, min(self.leaf_batch_size, self.simulations - self.simulation_count))
+        while selections < selection_budget:
+            path, state = self.__select(root, root_bitboards, root_heights)
+            leaf = path[-1]
+
+            if leaf.terminal_value is not None:
+                self.__backpropagate(path, leaf.terminal_value)
+                self.simulation_count += 1
+            elif leaf.pending:
+                self.__backpropagate(path, None)
+                break
+            else:
+                leaf.pending = True
+                leaves.append((path, state))
+            selections += 1
+
+        if not leaves:
+            return
+
+        values = self.__evaluate(leaves)
+        for (path, _), value in zip(leaves, values):
+            path[-1].pending = False
+            self.__backpropagate(path, value)
+        self.simulation_count += len(leaves)
+
+    def __select(self, root: _NeuralNode, root_bitboards, root_heights):
+        """
+        Descends from the root to a node that is not expanded yet using PUCT, adding virtual loss to the nodes on the path.
+        Returns the path and the state (bitboards of the player to move and the oponent, heights) of its last node.
+        Player 0 is the bot (to move at the root) and player 1 the oponent.
+        """
+        column_bit_count = self.row_count + 1
+        bitboards = list(root_bitboards)
+        heights = list(root_heights)
+        player = 0
+        node = root
+        path = [root]
+        node.visits += self.virtual_loss
+        node.value_sum -= self.virtual_loss
+
+        while node.children:
+            # Unvisited children are valued as a draw
+            exploration = self.c_puct * math.sqrt(node.visits)
+            best_score = -math.inf
+            for col, child in node.children.items():
+                value = child.value_sum / child.visits if child.visits > 0 else VALUE_DRAW
+                score = value + exploration * child.prior / (1 + child.visits)
+                if score > best_score:
+                    best_score = score
+                    column = col
+                    best_child = child
+            node = best_child
+            bitboards[player] |= 1 << (column * column_bit_count + heights[column])
+            heights[column] += 1
+            player ^= 1
+            path.append(node)
+            node.visits += self.virtual_loss
+            node.value_sum -= self.virtual_loss
+
+        return path, (bitboards[player], bitboards[player ^ 1], heights)
+
+    def __backpropagate(self, path: list, value: Optional[float]):
+        """
+        Removes the virtual loss of a path and adds the value (of the last node) to its nodes, the value flips between the players.
+        Without a value only the virtual loss is removed.
+        """
+        for node in reversed(path):
+            node.visits -= self.virtual_loss
+            node.value_sum += self.virtual_loss
+            if value is not None:
+                node.visits += 1
+                node.value_sum += value
+                value = -value
+
+    def __q_values_to_values(self, q_values: np.ndarray):
+        """
+        Private function mapping Q-values to values, linearly between the rewards of a loss, draw and win.
+        Q-values beyond the reward of a win or loss are clipped.
+        """
+        values = np.where(q_values >= self.reward_draw,
+                          (q_values - self.reward_draw) / (self.reward_win - self.reward_draw),
+                          (q_values - self.reward_draw) / (self.reward_draw - self.reward_loss))
+        return np.clip(values * VALUE_WIN + VALUE_DRAW, -VALUE_WIN, VALUE_WIN)
+
+    def __evaluate(self, leaves: list):
+        """
+        Evaluates the boards of the leaves in one forward pass and expands the leaves with the priors of their candidate columns.
+        Returns the value of every leaf for the player that moved into it.
+        """
+        game = self.__game
+        column_bit_count = self.row_count + 1
+
+        # Boards as seen by the player to move, their coins being those of the network
+        own_bitboards = np.array([state[0] for _, state in leaves], dtype= np.uint64)
+        oponent_bitboards = np.array([state[1] for _, state in leaves], dtype= np.uint64)
+        own_cells = (own_bitboards[:, None] >> self.__cell_bits) & np.uint64(1)
+        oponent_cells = (oponent_bitboards[:, None] >> self.__cell_bits) & np.uint64(1)
+        boards = own_cells * self.network_coin + oponent_cells * (3 - self.network_coin)
+        boards = boards.reshape(len(leaves), 1, self.row_count, self.column_count).astype(np.float32)
+
+        with torch.no_grad():
+            device = next(self.model.parameters()).device
+            logits = self.model(torch.as_tensor(boards, device= device))
+            if isinstance(logits, tuple):
+                logits = logits[0]
+            board_values = self.__q_values_to_values(ts.data.to_numpy(self.policy.compute_q_value(logits, None)))
+        self.forward_count += 1
+
+        values = []
+        for (path, (bitboard, oponent_bitboard, heights)), leaf_values in zip(leaves, board_values):
+            leaf = path[-1]
+            columns = game.candidate_columns(bitboard, oponent_bitboard)
+            move_count = sum(heights)
+
+            # Priors of the candidate columns, the children that win or fill the board are finished games
+            candidate_values = leaf_values[columns]
+            priors = np.exp((candidate_values - candidate_values.max()) / self.prior_temperature)
+            priors /= priors.sum()
+            for column, prior in zip(columns, priors):
+                terminal_value = None
+                if game.has_four_in_a_row(bitboard | (1 << (column * column_bit_count + heights[column]))):
+                    terminal_value = VALUE_WIN
+                elif move_count + 1 == self.__cell_count:
+                    terminal_value = VALUE_DRAW
+                leaf.children[column] = _NeuralNode(prior= float(prior), terminal_value= terminal_value)
+
+            # Value for the player to move, turned into the value for the player that moved into the leaf
+            values.append(-float(candidate_values.max()))
+        return values
@@ -0,0 +1,86 @@
+####################################################
+# ABOUT THIS FILE
+####################################################
+# Description: Tianshou compatible policy for the MCTS agent
+#   Allows the MCTS agent to be used as a fixed oponent while training, as done with the MiniMax policy.
+#
+# Author name: Lennert Bontinck
+# Author email: lennert.bontinck@vub.be / info@lennertbontinck.com
+
+
+####################################################
+# IMPORTS
+####################################################
+
+import typing
+import numpy as np
+import tianshou as ts
+
+import mcts_agent.mcts_agent as mctsbot
+
+####################################################
+# MCTS TIANSHOU POLICY
+####################################################
+
+class TianshouMCTSConnectFourPolicy(ts.policy.BasePolicy):
+    """
+    Tianshou compatible MCTS policy for connect four.
+    The boards of a batch belong to different games, thus every board is searched with a fresh tree (no tree reuse).
+    Identical boards within a batch are only searched once.
+    """
+
+    def __init__(self,
+                 coin: int,
+                 oponent_coin: int,
+                 simulations: typing.Optional[int] = 1000,
+                 time_budget: typing.Optional[float] = None,
+                 column_count: int = 7,
+                 row_count: int = 6,
+                 rollout: str = mctsbot.ROLLOUT_HEURISTIC,
+                 seed: typing.Optional[int] = None,
+                 **kwargs: typing.Any):
+        # Init base policy
+        super().__init__(**kwargs)
+
+        # Configure MCTS bot
+        self.bot = mctsbot.MCTSConnectFourBot(coin= coin,
+                                              oponent_coin= oponent_coin,
+                                              column_count= column_count,
+                                              row_count= row_count,
+                                              simulations= simulations,
+                                              time_budget= time_budget,
+                                              rollout= rollout,
+                                              reuse_tree= False,
+                                              seed= seed)
+
+    def forward(self,
+                batch: ts.data.Batch,
+                state: typing.Optional[typing.Union[dict, ts.data.Batch, np.ndarray]] = None,
+                **kwargs: typing.Any):
+        """
+        Compute MCTS action over the given batch data.
+        """
+        boards = batch["obs"]
+
+        # Can be nested in Tianshou
+        while isinstance(boards, ts.data.Batch):
+            boards = boards["obs"]
+
+        # Only search each distinct board once
+        boards = np.asarray(boards)
+        unique_boards, board_indices = np.unique(boards.reshape(len(boards), -1), axis= 0, return_inverse= True)
+        unique_boards = unique_boards.reshape((-1,) + boards.shape[1:])
+        unique_preds = [self.bot.predict(board= board) for board in unique_boards]
+
+        # Map the predictions back to the boards of the batch
+        preds = [unique_preds[index] for index in np.ravel(board_indices)]
+
+        return ts.data.Batch(act=preds, state=state)
+
+    def learn(self, batch, **kwargs):
+        # No learning needed
+        return {}
+
+    def set_eps(self, eps):
+        # Not needed
+        return
@@ -0,0 +1,84 @@
+####################################################
+# ABOUT THIS FILE
+####################################################
+# Description: Benchmark for the MiniMax agent, reports the searched nodes per second
+#   on a fixed set of positions for a given search depth.
+#
+# Author name: Lennert Bontinck
+# Author email: lennert.bontinck@vub.be / info@lennertbontinck.com
+#
+# Usage (from the project folder):
+#   python -m minimax_agent.benchmark_minimax --depth 5 --positions 20
+
+
+####################################################
+# IMPORTS
+####################################################
+
+import argparse
+import random as rnd
+import time
+
+import minimax_agent.minimax_agent as minimaxbot
+from connect4_core.bitboard_connect_four import BitboardConnectFour
+
+####################################################
+# BENCHMARK FUNCTIONS
+####################################################
+
+def random_positions(amount: int, column_count: int = 7, row_count: int = 6, max_moves: int = 16, seed: int = 1998):
+    """
+    Returns a list of (board, coin to play) tuples obtained by playing random moves from an empty board.
+    Games that are won while playing the random moves are skipped.
+    """
+    position_rnd = rnd.Random(seed)
+    game = BitboardConnectFour(column_count= column_count, row_count= row_count)
+    positions = []
+    while len(positions) < amount:
+        game.reset()
+        coin = 1
+        won = False
+        for move in range(position_rnd.randint(0, max_moves)):
+            game.place_coin(column= position_rnd.choice(game.valid_locations()), coin= coin)
+            won = won or game.winning_board(coin= coin)
+            coin = 3 - coin
+
+        # Only keep positions where the game is still ongoing
+        if not won:
+            positions.append((game.to_board(), coin))
+    return positions
+
+def benchmark(depth: int, positions: int, workers: int = 1, seed: int = 1998):
+    """
+    Runs the MiniMax agent on the benchmark positions and returns the chosen columns, searched nodes and elapsed time.
+    """
+    chosen_columns = []
+    searched_nodes = 0
+    elapsed_time = 0
+    for board, coin in random_positions(positions):
+        bot = minimaxbot.MiniMaxConnectFourBot(coin= coin, oponent_coin= 3 - coin, column_count= 7, row_count= 6, minimax_depth= depth, workers= workers)
+
+        # Fixed seed such that the chosen columns can be compared between implementations
+        rnd.seed(seed)
+        start = time.perf_counter()
+        chosen_columns.append(bot.predict(board))
+        elapsed_time += time.perf_counter() - start
+        searched_nodes += bot.searched_nodes
+        bot.close()
+
+    return chosen_columns, searched_nodes, elapsed_time
+
+####################################################
+# MAIN
+####################################################
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description= "Benchmark the MiniMax agent in nodes per second.")
+    parser.add_argument("--depth", type= int, default= 4, help= "Search depth of the MiniMax agent.")
+    parser.add_argument("--positions", type= int, default= 20, help= "Amount of random positions to search.")
+    parser.add_argument("--workers", type= int, default= 1, help= "Amount of worker processes for the parallel search.")
+    args = parser.parse_args()
+
+    chosen_columns, searched_nodes, elapsed_time = benchmark(depth= args.depth, positions= args.positions, workers= args.workers)
+    print(f"Chosen columns: {chosen_columns}")
+    print(f"Searched nodes: {searched_nodes} in {elapsed_time:.2f}s -> {searched_nodes / elapsed_time:.0f} nodes per second")
@@ -0,0 +1,411 @@
+####################################################
+# ABOUT THIS FILE
+####################################################
+# Description: Perfect play solver for connect four
+#   Computes the exact game theoretic value and best move of a position using negamax with alpha beta pruning,
+#   null window search, bitboards, a transposition table, center-first move ordering and an optional opening book.
+#
+# Author name: Lennert Bontinck
+# Author email: lennert.bontinck@vub.be / info@lennertbontinck.com
+#
+# Implementation based on: http://blog.gamesolver.org/solving-connect-four/01-introduction/
+#   and the accompanying solver from Pascal Pons: https://github.com/PascalPons/connect4
+#
+# Usage (from the project folder), building an opening book:
+#   python -m minimax_agent.connect_four_solver --plies 4 --output opening_book.bin
+
+
+####################################################
+# IMPORTS
+####################################################
+
+import argparse
+import time
+import numpy as np
+from typing import Optional
+
+# Bitboard game core for loading boards
+from connect4_core.bitboard_connect_four import BitboardConnectFour
+
+# Opening book of solved positions
+from minimax_agent.opening_book import OpeningBook, canonical_key, mirror_bitboard
+
+####################################################
+# PERFECT PLAY SOLVER
+####################################################
+
+class ConnectFourSolver:
+    def __init__(self,
+                 column_count: int = 7,
+                 row_count: int = 6,
+                 transposition_table_size: int = 2**20,
+                 opening_book: Optional[OpeningBook] = None):
+        """
+        Creates a perfect play solver for connect four, by default for the 7x6 board.
+        Scores are given from the perspective of the player to move:
+            - positive: the player to move wins, the sooner the win the higher the score
+            - zero: draw with perfect play
+            - negative: the player to move loses, the later the loss the closer to zero
+        Positions in the (optional) opening book are not searched.
+        """
+        self.column_count = column_count
+        self.row_count = row_count
+        self.transposition_table_size = transposition_table_size
+        self.opening_book = opening_book
+        if opening_book is not None:
+            opening_book.check_board_size(column_count, row_count)
+        self.searched_nodes = 0
+
+        # Bitboard layout of the game core: each column takes up row_count + 1 bits
+        self.__game = BitboardConnectFour(column_count= column_count, row_count= row_count)
+        self.__column_bit_count = row_count + 1
+        self.__column_masks = [((1 << row_count) - 1) << (col * self.__column_bit_count) for col in range(column_count)]
+        self.__bottom_mask = sum(1 << (col * self.__column_bit_count) for col in range(column_count))
+        self.__board_mask = self.__bottom_mask * ((1 << row_count) - 1)
+        self.__cell_count = column_count * row_count
+
+        # Score bounds of a game
+        self.__min_score = -(self.__cell_count // 2) + 3
+        self.__max_score = (self.__cell_count + 1) // 2 - 3
+
+        # Try the center columns first as they provide the most winning windows
+        self.__column_order = sorted(range(column_count), key= lambda col: abs(col - column_count // 2))
+
+        # Transposition table storing bounds, keys and values in separate slots (always replace)
+        self.__transposition_keys = [0] * transposition_table_size
+        self.__transposition_values = [0] * transposition_table_size
+
+    ####################################################
+    # PUBLIC FUNCTIONS
+    ####################################################
+
+    def predict(self, board: np.ndarray, weak: bool = False):
+        """
+        Returns the best column for the player to move on a row x column numpy board with grid codes.
+        Among equally good columns the most central one is chosen. Returns None if the game is over.
+        Boards in the opening book are not searched.
+        """
+        if self.opening_book is not None:
+            book_column = self.opening_book.lookup(board)
+            if book_column is not None:
+                return book_column
+
+        scores = self.analyze(board, weak= weak)
+        best_col = None
+        for col in self.__column_order:
+            if scores[col] is not None and (best_col is None or scores[col] > scores[best_col]):
+                best_col = col
+        return best_col
+
+    def solve(self, board: np.ndarray, weak: bool = False):
+        """
+        Returns the exact score of a board for the player to move.
+        With weak, only the sign of the score is exact (win, draw or loss), which is faster to compute.
+        """
+        position, mask, moves = self.position_from_board(board)
+        return self.solve_position(position, mask, moves, weak= weak)
+
+    def analyze(self, board: np.ndarray, weak: bool = False):
+        """
+        Returns the score of playing each column for the player to move, None for columns that can not be played.
+        Returns only None values if the game is already over.
+        """
+        position, mask, moves = self.position_from_board(board)
+        scores = [None] * self.column_count
+        if self.__is_won(position ^ mask) or moves == self.__cell_count:
+            return scores
+
+        for col in range(self.column_count):
+            if mask & self.__top_mask(col) == 0:
+                move = (mask + self.__bottom_mask_col(col)) & self.__column_masks[col]
+                if self.__winning_position(position, mask) & move:
+                    # Winning move
+                    scores[col] = (self.__cell_count + 1 - moves) // 2
+                else:
+                    # Score of the oponent after this move, negated
+                    scores[col] = -self.solve_position(position ^ mask, mask | move, moves + 1, weak= weak)
+        return scores
+
+    def position_from_board(self, board: np.ndarray):
+        """
+        Converts a row x column numpy board with grid codes (row 0 being the bottom row) to the solver position:
+            - bitboard of the player to move
+            - bitboard of all coins
+            - amount of moves played
+        Player 1 is to move when both players have the same amount of coins.
+        """
+        self.__game.load_board(board)
+        player_one_bitboard, player_two_bitboard = self.__game.bitboards
+        mask = player_one_bitboard | player_two_bitboard
+        position = player_one_bitboard if self.__game.move_count % 2 == 0 else player_two_bitboard
+        return position, mask, self.__game.move_count
+
+    def position_key(self, position: int, mask: int):
+        """
+        Returns the unique key of a position, the bitboard of the player to move plus the bitboard of all coins.
+        """
+        return position + mask
+
+    def canonical_key(self, position: int, mask: int):
+        """
+        Returns the key of a position and whether it was mirrored, positions that are mirror images share the smallest key.
+        """
+        return canonical_key(position, mask, self.column_count, self.row_count)
+
+    def mirror_bitboard(self, bitboard: int):
+        """
+        Returns the bitboard with the order of the columns reversed.
+        Also works for position keys, as adding the position to the mask never carries over to the next column.
+        """
+        return mirror_bitboard(bitboard, self.column_count, self.row_count)
+
+    def solve_position(self, position: int, mask: int, moves: int, weak: bool = False):
+        """
+        Returns the score of a solver position (see position_from_board) using iterative null window searches.
+        Every null window search tells whether the score is above or below a value, halving the remaining score range.
+        """
+        # Check if win in one move as the negamax function does not support this case
+        if self.__winning_position(position, mask) & self.__possible(mask):
+            return (self.__cell_count + 1 - moves) // 2
+
+        lower = -((self.__cell_count - moves) // 2)
+        upper = (self.__cell_count + 1 - moves) // 2
+        if weak:
+            lower = -1
+            upper = 1
+
+        while lower < upper:
+            # Use a median value, but search closer to zero first as most scores are near zero
+            median = lower + (upper - lower) // 2
+            if median <= 0 and int(lower / 2) < median:
+                median = int(lower / 2)
+            elif median >= 0 and int(upper / 2) > median:
+                median = int(upper / 2)
+
+            # Null window search to check if the actual score is greater than the median
+            score = self.__negamax(position, mask, moves, median, median + 1)
+            if score <= median:
+                upper = score
+            else:
+                lower = score
+
+        return lower
+
+    def build_opening_book(self, plies: int):
+        """
+        Solves all positions reachable within the given amount of plies and returns them as an OpeningBook.
+        Positions are stored once for both mirror images. The positions of the last ply are solved by searching,
+            the others are derived from the scores of their children.
+        """
+        # Collect the positions of each ply that are still ongoing (keyed on canonical key)
+        # Positions are kept in their canonical orientation, such that the best column is that of the canonical position
+        plies_positions = [{self.canonical_key(0, 0)[0]: (0, 0)}]
+        for ply in range(plies):
+            next_positions = {}
+            for position, mask in plies_positions[-1].values():
+                for col in range(self.column_count):
+                    if mask & self.__top_mask(col) == 0:
+                        move = (mask + self.__bottom_mask_col(col)) & self.__column_masks[col]
+                        # Winning moves end the game and are not stored
+                        if self.__winning_position(position, mask) & move:
+                            continue
+                        child_position, child_mask = position ^ mask, mask | move
+                        child_key, mirrored = self.canonical_key(child_position, child_mask)
+                        if mirrored:
+                            child_position, child_mask = self.mirror_bitboard(child_position), self.mirror_bitboard(child_mask)
+                        next_positions.setdefault(child_key, (child_position, child_mask))
+            plies_positions.append(next_positions)
+
+        # Solve bottom up, from the last ply to the empty board
+        book_entries = {}
+        for ply in range(plies, -1, -1):
+            for key, (position, mask) in plies_positions[ply].items():
+                best_col, best_score = None, None
+                for col in self.__column_order:
+                    if mask & self.__top_mask(col) == 0:
+                        move = (mask + self.__bottom_mask_col(col)) & self.__column_masks[col]
+                        if self.__winning_position(position, mask) & move:
+                            score = (self.__cell_count + 1 - ply) // 2
+                        elif ply < plies:
+                            score = -book_entries[self.canonical_key(position ^ mask, mask | move)[0]][1]
+                        else:
+                            score = -self.solve_position(position ^ mask, mask | move, ply + 1)
+                        if best_score is None or score > best_score:
+                            best_col, best_score = col, score
+                book_entries[key] = (best_col, best_score)
+        return OpeningBook.from_entries(book_entries, column_count= self.column_count, row_count= self.row_count, plies= plies)
+
+    ####################################################
+    # BITBOARD HELPER FUNCTIONS
+    ####################################################
+
+    def __top_mask(self, col: int):
+        """
+        Returns the bit of the top cell of a column.
+        """
+        return 1 << (self.row_count - 1 + col * self.__column_bit_count)
+
+    def __bottom_mask_col(self, col: int):
+        """
+        Returns the bit of the bottom cell of a column.
+        """
+        return 1 << (col * self.__column_bit_count)
+
+    def __possible(self, mask: int):
+        """
+        Returns a bitboard of all playable cells, e.g. the lowest free cell of each column.
+        """
+        return (mask + self.__bottom_mask) & self.__board_mask
+
+    def __is_won(self, position: int):
+        """
+        Returns whether or not the bitboard contains four connected coins.
+        """
+        for shift in (1, self.__column_bit_count, self.__column_bit_count - 1, self.__column_bit_count + 1):
+            pairs = position & (position >> shift)
+            if pairs & (pairs >> (2 * shift)):
+                return True
+        return False
+
+    def __winning_position(self, position: int, mask: int):
+        """
+        Returns a bitboard of all empty cells that would complete four connected coins of the given position.
+        """
+        # Vertical
+        winning = (position << 1) & (position << 2) & (position << 3)
+
+        # Horizontal and both diagonals
+        for shift in (self.__column_bit_count, self.__column_bit_count - 1, self.__column_bit_count + 1):
+            pairs = (position << shift) & (position << (2 * shift))
+            winning |= pairs & (position << (3 * shift))
+            winning |= pairs & (position >> shift)
+            pairs = (position >> shift) & (position >> (2 * shift))
+            winning |= pairs & (position << shift)
+            winning |= pairs & (position >> (3 * shift))
+
+        return winning & (self.__board_mask ^ mask)
+
+    def __possible_non_losing_moves(self, position: int, mask: int):
+        """
+        Returns a bitboard of the playable cells that do not let the oponent win directly.
+        Assumes the player to move can not win directly.
+        """
+        possible = self.__possible(mask)
+        oponent_winning = self.__winning_position(position ^ mask, mask)
+        forced_moves = possible & oponent_winning
+        if forced_moves:
+            # More than one forced move means the oponent wins anyway
+            if forced_moves & (forced_moves - 1):
+                return 0
+            possible = forced_moves
+
+        # Don't play below a winning cell of the oponent
+        return possible & ~(oponent_winning >> 1)
+
+    ####################################################
+    # SEARCH FUNCTIONS
+    ####################################################
+
+    def __negamax(self, position: int, mask: int, moves: int, alpha: int, beta: int):
+        """
+        Returns the score of a position if it lies within the (alpha, beta) window, otherwise a bound:
+            - score <= alpha: the actual score is lower or equal than the returned value
+            - score >= beta: the actual score is higher or equal than the returned value
+        Assumes the player to move can not win directly.
+        """
+        self.searched_nodes += 1
+        cell_count = self.__cell_count
+
+        possible_moves = self.__possible_non_losing_moves(position, mask)
+        if possible_moves == 0:
+            # All moves lose, the oponent wins with its next move
+            return -((cell_count - moves) // 2)
+
+        # Draw if the board is nearly full as no one can win anymore
+        if moves >= cell_count - 2:
+            return 0
+
+        # Lower bound since the oponent can not win with its next move
+        lower = -((cell_count - 2 - moves) // 2)
+        if alpha < lower:
+            alpha = lower
+            if alpha >= beta:
+                return alpha
+
+        # Upper bound since we can not win with our next move
+        upper = (cell_count - 1 - moves) // 2
+        if beta > upper:
+            beta = upper
+            if alpha >= beta:
+                return beta
+
+        # Bounds of earlier searches of this position
+        key = position + mask
+        index = key % self.transposition_table_size
+        if self.__transposition_keys[index] == key:
+            value = self.__transposition_values[index]
+            if value > self.__max_score - self.__min_score + 1:
+                # Lower bound
+                lower = value + 2 * self.__min_score - self.__max_score - 2
+                if alpha < lower:
+                    alpha = lower
+                    if alpha >= beta:
+                        return alpha
+            else:
+                # Upper bound
+                upper = value + self.__min_score - 1
+                if beta > upper:
+                    beta = upper
+                    if alpha >= beta:
+                        return beta
+
+        # Exact score from the opening book
+        if self.opening_book is not None and moves <= self.opening_book.plies:
+            book_key, mirrored = self.canonical_key(position, mask)
+            book_score = self.opening_book.get_score(book_key)
+            if book_score is not None:
+                return book_score
+
+        # Order the moves: most new winning cells first, center columns first among equals
+        ordered_moves = []
+        for col in self.__column_order:
+            move = possible_moves & self.__column_masks[col]
+            if move:
+                move_score = bin(self.__winning_position(position | move, mask)).count("1")
+                ordered_moves.append((move_score, move))
+        ordered_moves.sort(key= lambda scored_move: -scored_move[0])
+
+        for move_score, move in ordered_moves:
+            # The oponent plays next, its score is the negation of ours
+            score = -self.__negamax(position ^ mask, mask | move, moves + 1, -beta, -alpha)
+
+            if score >= beta:
+                # Save the lower bound of the position
+                self.__transposition_keys[index] = key
+                self.__transposition_values[index] = score + self.__max_score - 2 * self.__min_score + 2
+                return score
+            if score > alpha:
+                alpha = score
+
+        # Save the upper bound of the position
+        self.__transposition_keys[index] = key
+        self.__transposition_values[index] = alpha - self.__min_score + 1
+        return alpha
+
+####################################################
+# MAIN
+####################################################
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description= "Build an opening book with the perfect play solver.")
+    parser.add_argument("--plies", type= int, default= 4, help= "Solve all positions up to this amount of plies.")
+    parser.add_argument("--output", type= str, default= "opening_book.bin", help= "Path of the saved opening book.")
+    parser.add_argument("--columns", type= int, default= 7, help= "Amount of columns of the board.")
+    parser.add_argument("--rows", type= int, default= 6, help= "Amount of rows of the board.")
+    args = parser.parse_args()
+
+    solver = ConnectFourSolver(column_count= args.columns, row_count= args.rows)
+    start = time.perf_counter()
+    book = solver.build_opening_book(plies= args.plies)
+    book.save(args.output)
+    print(f"Solved {len(book)} positions ({solver.searched_nodes} nodes) in {time.perf_counter() - start:.2f}s -> {args.output}")
@@ -15,18 +15,59 @@
 ####################################################
 
 import math
+import time
 import random as rnd
-import copy
 import numpy as np
+from typing import Optional
+from concurrent.futures import ProcessPoolExecutor
+
+# Bitboard game core for make/unmake moves and fast win detection
+from connect4_core.bitboard_connect_four import BitboardConnectFour
+
+# Incrementally updated heuristic
+from minimax_agent.window_evaluation import WindowEvaluator
+
+# Precomputed opening moves
+from minimax_agent.opening_book import OpeningBook
+
+####################################################
+# GLOBAL VARIABLES
+####################################################
+
+# TRANSPOSITION TABLE FLAGS
+TT_EXACT = 0
+TT_LOWER_BOUND = 1
+TT_UPPER_BOUND = 2
+
+# Amount of searched nodes between checks of the time budget
+TIME_CHECK_INTERVAL = 256
+
+# Bot used by a worker process of the parallel search
+_worker_bot = None
 
 ####################################################
 # MINIMAX AGENT
 ####################################################
 
 class MiniMaxConnectFourBot:
-    def __init__(self, coin: int, oponent_coin: int, column_count: int, row_count: int, minimax_depth: int):
+    def __init__(self,
+                 coin: int,
+                 oponent_coin: int,
+                 column_count: int,
+                 row_count: int,
+                 minimax_depth: int,
+                 transposition_table_size: int = 2**18,
+                 time_budget: Optional[float] = None,
+                 workers: int = 1,
+                 opening_book: Optional[OpeningBook] = None):
         """
         Creates a MiniMax bot for our custom connect four application.
+        The search uses iterative deepening up to minimax_depth and a Zobrist hashed transposition table which is kept between predictions.
+        Optionally a time budget in seconds per move can be given, the best column of the deepest finished iteration is then used.
+        With workers > 1 the columns of the root are searched in parallel by a pool of processes, each with its own transposition table.
+        The parallel search returns the same column as the serial search at equal depth.
+        Boards found in the optional opening book are not searched, the column of the book is played instead.
+            The book should be built for the same board size.
         Based on: https://github.com/KeithGalli/Connect4-Python/blob/master/connect4_with_ai.py
         """     
         self.coin = coin
@@ -35,155 +76,315 @@ class MiniMaxConnectFourBot:
         self.column_count = column_count
         self.row_count = row_count
         self.minimax_depth = minimax_depth
+        self.transposition_table_size = transposition_table_size
+        self.time_budget = time_budget
+        self.workers = workers
+        self.opening_book = opening_book
+        if opening_book is not None:
+            opening_book.check_board_size(column_count, row_count)
+        
+        # Zobrist keys: a random 64-bit number per coin and cell, with a fixed seed for reproducible hashes
+        zobrist_rnd = rnd.Random(1998)
+        self.__zobrist_keys = {player_coin: [[zobrist_rnd.getrandbits(64) for col in range(self.column_count)] for row in range(self.row_count)]
+                               for player_coin in (self.coin, self.oponent_coin)}
+        self.__zobrist_oponent_to_move = zobrist_rnd.getrandbits(64)
+        
+        # Transposition table with one slot per index, entries are (key, depth, value, flag, column, generation)
+        self.__transposition_table = [None] * self.transposition_table_size
+        self.__search_generation = 0
+        
+        # Try the center columns first as they provide the most winning windows
+        self.__column_order = sorted(range(self.column_count), key= lambda col: abs(col - self.column_count // 2))
+        
+        # Single mutable search state: the bitboard core for the game logic and the incrementally updated heuristic
+        # Moves are made and unmade on this state, thus no board copies are made during the search
+        self.__game = BitboardConnectFour(column_count= self.column_count, row_count= self.row_count)
+        self.__evaluator = WindowEvaluator(coin= self.coin,
+                                           oponent_coin= self.oponent_coin,
+                                           column_count= self.column_count,
+                                           row_count= self.row_count)
+        
+        # Search statistics and time keeping
+        self.searched_nodes = 0
+        self.__deadline = None
+        self.__search_aborted = False
+        
+        # Process pool for the parallel search, created on first use
+        self.__worker_pool = None
         
     def predict(self, board):
-        # Get chosen col based on minimax score
-        chosen_col, minimax_score = self.__minimax(board= board,
-                                                   depth= self.minimax_depth)
+        # New search generation, entries of older searches may be replaced in the transposition table
+        self.__search_generation += 1
+        self.searched_nodes = 0
+        
+        # Play the precomputed column if the board is in the opening book
+        if self.opening_book is not None:
+            book_col = self.opening_book.lookup(board)
+            if book_col is not None:
+                return book_col
+        
+        deadline = None if self.time_budget is None else time.time() + self.time_budget
+        
+        # Load the board in the search state, the provided board itself is never altered
+        self.__game.load_board(board)
+        self.__evaluator.load_board(board)
+        
+        # Iterative deepening, each iteration fills the transposition table used for move ordering in the next
+        chosen_col = None
+        key = self.__hash_board(board)
+        for depth in range(1, self.minimax_depth + 1):
+            # The first iteration always finishes to have a column to return
+            self.__deadline = deadline if depth > 1 else None
+            self.__search_aborted = False
+            
+            # Get chosen col based on minimax score, the best col of the previous iteration is searched first
+            if self.workers > 1:
+                col, minimax_score = self.__search_root_parallel(board= board,
+                                                                 depth= depth,
+                                                                 first_column= chosen_col)
+            else:
+                col, minimax_score = self.__search_root(depth= depth,
+                                                        key= key,
+                                                        first_column= chosen_col)
+            
+            # Out of time, use the column of the previous iteration
+            if self.__search_aborted:
+                break
+            chosen_col = col
         
         # Return the chosen col
         return chosen_col
     
-    def __get_valid_locations(self, board):
+    def close(self):
         """
-        Gets valid locations.
-        Taken from: https://github.com/KeithGalli/Connect4-Python/blob/master/connect4_with_ai.py
-        """    
-        valid_locations = []
-        for col in range(self.column_count):
-            if board[self.row_count - 1][col] == self.empty_space:
-                valid_locations.append(col)
-        return valid_locations
+        Shuts down the worker processes of the parallel search, if any.
+        """
+        if self.__worker_pool is not None:
+            self.__worker_pool.shutdown()
+            self.__worker_pool = None
     
-    def __get_next_open_row(self, board, col):
-        # Loop all rows until a row is found where there is an empty space
+    def __hash_board(self, board):
+        """
+        Returns the Zobrist hash of a board where it is the bot's turn.
+        """
+        key = 0
         for row in range(self.row_count):
-            if board[row][col] == self.empty_space:
-                # Open row found, return it
-                return row
-            
-        # No open rows found, return -1
-        return -1
+            for col in range(self.column_count):
+                if board[row][col] != self.empty_space:
+                    key ^= self.__zobrist_keys[int(board[row][col])][row][col]
+        return key
+    
+    def __probe_transposition_table(self, key: int):
+        """
+        Returns the transposition table entry of the given key or None if not present.
+        """
+        entry = self.__transposition_table[key % self.transposition_table_size]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+    
+    def __store_transposition_table(self, key: int, depth: int, value: float, flag: int, column: Optional[int]):
+        """
+        Stores a search result in the transposition table.
+        Replaces the entry in the slot if it belongs to an older search or was searched less deep (depth-preferred).
+        """
+        index = key % self.transposition_table_size
+        entry = self.__transposition_table[index]
+        if entry is None or entry[0] == key or entry[5] != self.__search_generation or depth >= entry[1]:
+            self.__transposition_table[index] = (key, depth, value, flag, column, self.__search_generation)
+    
+    def __get_valid_locations(self):
+        """
+        Gets valid locations of the search state using the column heights.
+        """    
+        return self.__game.valid_locations()
+    
+    def __make_move(self, col: int, coin: int):
+        """
+        Places a coin in the search state and returns the row it landed in.
+        """
+        row = self.__game.place_coin(column= col, coin= coin)
+        self.__evaluator.place_coin(row, col, coin)
+        return row
+    
+    def __unmake_move(self, col: int, row: int, coin: int):
+        """
+        Removes a coin placed by __make_move from the search state.
+        """
+        self.__game.remove_coin(column= col, coin= coin)
+        self.__evaluator.remove_coin(row, col, coin)
             
-    def __evaluate_window(self, window, piece):
-        opponent_piece = self.oponent_coin
-
-        # initial score of a window is 0
-        score = 0
-
-        # based on how many friendly pieces there are in the window, we increase the score
-        if window.count(piece) == 4:
-            score += 100
-        elif window.count(piece) == 3 and window.count(0) == 1:
-            score += 5
-        elif window.count(piece) == 2 and window.count(0) == 2:
-            score += 2
+    def __terminal_value(self):
+        """
+        Returns the score of the search state if the game is over, None otherwise.
+        """
+        # Reached winning board
+        if self.__game.winning_board(coin= self.coin):
+            return 100000000000000
 
-        # or decrese it if the oponent has 3 in a row
-        if window.count(opponent_piece) == 3 and window.count(0) == 1:
-            score -= 4 
+        # Reached losing board
+        if self.__game.winning_board(coin= self.oponent_coin):
+            return -100000000000000
 
-        return score 
+        # Full board
+        if self.__game.full_board():
+            return 0
+        
+        return None
+    
+    def __root_order(self, valid_locations, first_column: Optional[int]):
+        """
+        Returns the order in which the columns of the root are searched.
+        The first column (best column of the previous iteration) is followed by the center columns.
+        Only depends on the given arguments such that the serial and parallel search use the same order.
+        """
+        ordered_locations = [col for col in self.__column_order if col in valid_locations and col != first_column]
+        if first_column is not None and first_column in valid_locations:
+            ordered_locations.insert(0, first_column)
+        return ordered_locations
+    
+    def __search_root(self, depth, key: int, first_column: Optional[int]):
+        """
+        Does the minimax search of the root, e.g. the maximizing player choosing the column to play.
+        The first column in the root order with the highest score is chosen.
+        """
+        # Stop condition - game already finished
+        terminal_value = self.__terminal_value()
+        if terminal_value is not None:
+            return (None, terminal_value)
+        
+        valid_locations = self.__get_valid_locations()
+        value = -math.inf
+        column = rnd.choice(valid_locations)
+        alpha = -math.inf
+        for col in self.__root_order(valid_locations, first_column):
+            # Get score recursive on the search state
+            row = self.__make_move(col, self.coin)
+            new_score = self.__minimax(depth= depth-1,
+                                       key= key ^ self.__zobrist_keys[self.coin][row][col] ^ self.__zobrist_oponent_to_move,
+                                       alpha= alpha,
+                                       beta= math.inf,
+                                       maximizing_player= False)[1]
+            self.__unmake_move(col, row, self.coin)
             
-    def __score_position(self, board):
-
-        score = 0
-        piece = self.coin
-
-        # score center column --> we are prioritizing the central column because it provides more potential winning windows
-        center_array = [int(i) for i in list(board[:,self.column_count//2])]
-        center_count = center_array.count(piece)
-        score += center_count * 6
-
-        # below we go over every single window in different directions and adding up their values to the score
-        # score horizontal
-        for r in range(self.row_count):
-            row_array = [int(i) for i in list(board[r,:])]
-            for c in range(self.column_count - 3):
-                window = row_array[c:c + 4]
-                score += self.__evaluate_window(window, piece)
-
-        # score vertical
-        for c in range(self.column_count):
-            col_array = [int(i) for i in list(board[:,c])]
-            for r in range(self.row_count-3):
-                window = col_array[r:r+4]
-                score += self.__evaluate_window(window, piece)
-
-        # score positively sloped diagonals
-        for r in range(3,self.row_count):
-            for c in range(self.column_count - 3):
-                window = [board[r-i][c+i] for i in range(4)]
-                score += self.__evaluate_window(window, piece)
-
-        # score negatively sloped diagonals
-        for r in range(3,self.row_count):
-            for c in range(3,self.column_count):
-                window = [board[r-i][c-i] for i in range(4)]
-                score += self.__evaluate_window(window, piece)
-
-        return score
+            # Update best
+            if new_score > value:
+                value = new_score
+                column = col
+            alpha = max(alpha, value)
+        
+        # Keep the result for later searches
+        if not self.__search_aborted:
+            self.__store_transposition_table(key, depth, value, TT_EXACT, column)
+        
+        return column, value
     
-    def __winning_board(self, board: np.ndarray, grid_player_coin: int):
+    def __search_root_parallel(self, board, depth, first_column: Optional[int]):
         """
-        Returns whether or not the board is won by the provided player.
-        Should be called after placing a piece.
+        Does the minimax search of the root by letting the worker processes search the columns.
+        Each column is searched with a full alpha beta window, thus its exact score is known,
+            and the first column in the root order with the highest score is chosen as done in __search_root.
         """
+        # Stop condition - game already finished
+        terminal_value = self.__terminal_value()
+        if terminal_value is not None:
+            return (None, terminal_value)
         
-        # check all horizontal locations
-        for c in range(self.column_count - 3):
-            for r in range(self.row_count):
-                if board[r][c] == grid_player_coin and board[r][c + 1] == grid_player_coin and board[r][c + 2] == grid_player_coin and \
-                    board[r][c + 3] == grid_player_coin:
-                        return True
-                    
-        # check vertical locations for win
-        for c in range(self.column_count):
-            for r in range(self.row_count - 3):
-                if board[r][c] == grid_player_coin and board[r + 1][c] == grid_player_coin and board[r + 2][c] == grid_player_coin and \
-                    board[r + 3][c] == grid_player_coin:
-                        return True
-
-        # check positively sloped diagonals
-        for c in range(self.column_count - 3):
-            for r in range(self.row_count - 3):
-                if board[r][c] == grid_player_coin and board[r + 1][c + 1] == grid_player_coin and board[r + 2][c + 2] == grid_player_coin and \
-                    board[r + 3][c + 3] == grid_player_coin:
-                        return True
-
-        # check negatively sloped diagonals
-        for c in range(self.column_count - 3):
-            for r in range(3, self.row_count):
-                if board[r][c] == grid_player_coin and board[r - 1][c + 1] == grid_player_coin and board[r - 2][c + 2] == grid_player_coin and \
-                    board[r - 3][c + 3] == grid_player_coin:
-                        return True
-                
-        # No winning board
-        return False
+        # Start the worker processes on first use
+        if self.__worker_pool is None:
+            self.__worker_pool = ProcessPoolExecutor(max_workers= self.workers,
+                                                     initializer= _init_worker,
+                                                     initargs= (self.coin, self.oponent_coin, self.column_count, self.row_count,
+                                                                self.minimax_depth, self.transposition_table_size))
+        
+        valid_locations = self.__get_valid_locations()
+        ordered_locations = self.__root_order(valid_locations, first_column)
+        futures = [self.__worker_pool.submit(_search_column_in_worker, board, col, depth, self.__deadline) for col in ordered_locations]
+        
+        value = -math.inf
+        column = rnd.choice(valid_locations)
+        for col, future in zip(ordered_locations, futures):
+            new_score, aborted, searched_nodes = future.result()
+            self.searched_nodes += searched_nodes
+            self.__search_aborted = self.__search_aborted or aborted
+            
+            # Update best
+            if new_score > value:
+                value = new_score
+                column = col
+        
+        return column, value
+    
+    def _search_column(self, board, col: int, depth, deadline: Optional[float]):
+        """
+        Returns the exact score of playing a column on a board, the searched nodes and whether the search was aborted.
+        Used by the worker processes of the parallel search.
+        """
+        self.__search_generation += 1
+        self.searched_nodes = 0
+        self.__deadline = deadline
+        self.__search_aborted = False
+        
+        # Load the board and play the column in the search state
+        self.__game.load_board(board)
+        self.__evaluator.load_board(board)
+        row = self.__make_move(col, self.coin)
+        key = self.__hash_board(board) ^ self.__zobrist_keys[self.coin][row][col] ^ self.__zobrist_oponent_to_move
+        
+        value = self.__minimax(depth= depth-1,
+                               key= key,
+                               maximizing_player= False)[1]
+        return value, self.__search_aborted, self.searched_nodes
     
-    def __minimax(self, board: np.array, depth, alpha=-math.inf, beta= math.inf, maximizing_player: bool = True):
+    def __minimax(self, depth, key: int, alpha=-math.inf, beta= math.inf, maximizing_player: bool = True):
         """
-        Does minimax prediction for best column.
+        Does minimax prediction for best column on the search state.
+        Moves are made and unmade on the search state, the key is the Zobrist hash of it and is updated incrementally for each child.
         Based on: https://github.com/KeithGalli/Connect4-Python/blob/master/connect4_with_ai.py
         """     
+        self.searched_nodes += 1
+        
+        # Stop condition - out of time, the result of this iteration is discarded
+        if self.__deadline is not None and self.searched_nodes % TIME_CHECK_INTERVAL == 0 and time.time() > self.__deadline:
+            self.__search_aborted = True
+        if self.__search_aborted:
+            return (None, 0)
+        
         # Get the valid locations
-        valid_locations = self.__get_valid_locations(board)
+        valid_locations = self.__get_valid_locations()
 
-        # Stop condition - reached winning board
-        if self.__winning_board(board= board, grid_player_coin= self.coin):
-            return (None, 100000000000000)
-
-        # Stop condition - reached losing board
-        if self.__winning_board(board= board, grid_player_coin= self.oponent_coin):
-            return (None, -100000000000000)
-
-        # Stop condition - full board
-        if np.count_nonzero(board == self.empty_space) == 0:
-            return (None, 0)
+        # Stop condition - reached winning, losing or full board
+        terminal_value = self.__terminal_value()
+        if terminal_value is not None:
+            return (None, terminal_value)
+        
+        # Use earlier search results of this board if they were searched equally deep
+        # Deeper results are not used such that the chosen column does not depend on earlier searches
+        alpha_original, beta_original = alpha, beta
+        entry = self.__probe_transposition_table(key)
+        tt_column = None
+        if entry is not None:
+            tt_column = entry[4]
+            if entry[1] == depth:
+                if entry[3] == TT_EXACT:
+                    return (tt_column, entry[2])
+                elif entry[3] == TT_LOWER_BOUND:
+                    alpha = max(alpha, entry[2])
+                elif entry[3] == TT_UPPER_BOUND:
+                    beta = min(beta, entry[2])
+                if alpha >= beta:
+                    return (tt_column, entry[2])
 
         # Stop condition - reached depth
         if depth == 0:
-            return (None, self.__score_position(board)) 
+            value = self.__evaluator.score
+            self.__store_transposition_table(key, depth, value, TT_EXACT, None)
+            return (None, value)
+        
+        # Search the best column of an earlier search first, followed by the center columns
+        ordered_locations = [col for col in self.__column_order if col in valid_locations and col != tt_column]
+        if tt_column is not None:
+            ordered_locations.insert(0, tt_column)
             
         if (maximizing_player): 
             # Find best column based on max value
@@ -191,20 +392,21 @@ class MiniMaxConnectFourBot:
             column = rnd.choice(valid_locations)  
                      
             # recursive minimax
-            for col in valid_locations:
+            for col in ordered_locations:
                 
-                # Place piece in copy of board
-                row = self.__get_next_open_row(board, col)
-                b_copy = copy.deepcopy(board)
-                b_copy[row][col] = self.coin
+                # Place piece in the search state
+                row = self.__make_move(col, self.coin)
                 
                 # Get score recursive
-                new_score = self.__minimax(board= b_copy,
-                                           depth= depth-1,
+                new_score = self.__minimax(depth= depth-1,
+                                           key= key ^ self.__zobrist_keys[self.coin][row][col] ^ self.__zobrist_oponent_to_move,
                                            alpha= alpha,
                                            beta= beta,
                                            maximizing_player= False)[1]
                 
+                # Take back the piece
+                self.__unmake_move(col, row, self.coin)
+                
                 # Update best 
                 if new_score > value:
                     value = new_score
@@ -214,26 +416,25 @@ class MiniMaxConnectFourBot:
                 # Alpha beta pruning
                 if alpha >= beta:
                     break
-                
-            return column, value
         
         else:
             # Find best column based on min value
             value = math.inf
             column = rnd.choice(valid_locations)
-            for col in valid_locations:
-                # Place piece in copy of board
-                row =  self.__get_next_open_row(board, col)
-                b_copy = copy.deepcopy(board)
-                b_copy[row][col] = self.oponent_coin
+            for col in ordered_locations:
+                # Place piece in the search state
+                row = self.__make_move(col, self.oponent_coin)
                 
                 # Get score recursive
-                new_score = self.__minimax(board= b_copy,
-                                           depth= depth-1,
+                new_score = self.__minimax(depth= depth-1,
+                                           key= key ^ self.__zobrist_keys[self.oponent_coin][row][col] ^ self.__zobrist_oponent_to_move,
                                            alpha= alpha,
                                            beta= beta,
                                            maximizing_player= True)[1]
                 
+                # Take back the piece
+                self.__unmake_move(col, row, self.oponent_coin)
+                
                 # Update best 
                 if new_score < value:
                     value = new_score
@@ -243,5 +444,37 @@ class MiniMaxConnectFourBot:
                 beta = min(value, beta) 
                 if alpha >= beta:
                     break
+        
+        # Store the result as exact value or as bound if it fell outside the alpha beta window
+        if not self.__search_aborted:
+            if value <= alpha_original:
+                flag = TT_UPPER_BOUND
+            elif value >= beta_original:
+                flag = TT_LOWER_BOUND
+            else:
+                flag = TT_EXACT
+            self.__store_transposition_table(key, depth, value, flag, column)
                 
-            return column, value
+        return column, value
+
+####################################################
+# PARALLEL SEARCH WORKERS
+####################################################
+
+def _init_worker(coin: int, oponent_coin: int, column_count: int, row_count: int, minimax_depth: int, transposition_table_size: int):
+    """
+    Creates the bot of a worker process, its transposition table is kept between the searched columns.
+    """
+    global _worker_bot
+    _worker_bot = MiniMaxConnectFourBot(coin= coin,
+                                        oponent_coin= oponent_coin,
+                                        column_count= column_count,
+                                        row_count= row_count,
+                                        minimax_depth= minimax_depth,
+                                        transposition_table_size= transposition_table_size)
+
+def _search_column_in_worker(board, col: int, depth, deadline: Optional[float]):
+    """
+    Searches a column of the root in a worker process.
+    """
+    return _worker_bot._search_column(board, col, depth, deadline)
@@ -0,0 +1,205 @@
+####################################################
+# ABOUT THIS FILE
+####################################################
+# Description: Compact on-disk opening book for connect four
+#   Solved positions are stored as a sorted array of position keys with a packed best column and score per key.
+#   Saved books are opened with np.memmap and searched with binary search, such that opening a book is instant,
+#   only the touched pages are read and all processes using the same book share these pages.
+#
+# Author name: Lennert Bontinck
+# Author email: lennert.bontinck@vub.be / info@lennertbontinck.com
+#
+# File layout (little endian):
+#   header of 16 bytes (magic, column count, row count, plies, amount of positions)
+#   sorted uint64 position keys
+#   uint16 packed entries: (score + SCORE_OFFSET) << 4 | best column
+
+
+####################################################
+# IMPORTS
+####################################################
+
+import numpy as np
+
+# Bitboard game core for loading boards
+from connect4_core.bitboard_connect_four import BitboardConnectFour
+
+####################################################
+# GLOBAL VARIABLES
+####################################################
+
+# Header of a saved book
+BOOK_MAGIC = b"C4OB"
+BOOK_HEADER_DTYPE = np.dtype([("magic", "S4"),
+                              ("column_count", "<u1"),
+                              ("row_count", "<u1"),
+                              ("plies", "<u1"),
+                              ("reserved", "<u1"),
+                              ("size", "<u8")])
+
+# Packing of the best column and score of a position
+COLUMN_BITS = 4
+COLUMN_MASK = (1 << COLUMN_BITS) - 1
+SCORE_OFFSET = 128
+
+####################################################
+# POSITION KEYS
+####################################################
+
+def mirror_bitboard(bitboard: int, column_count: int, row_count: int):
+    """
+    Returns the bitboard with the order of the columns reversed.
+    Also works for position keys, as adding the position to the mask never carries over to the next column.
+    """
+    column_bit_count = row_count + 1
+    column_mask = (1 << column_bit_count) - 1
+    mirrored = 0
+    for col in range(column_count):
+        column_bits = (bitboard >> (col * column_bit_count)) & column_mask
+        mirrored |= column_bits << ((column_count - 1 - col) * column_bit_count)
+    return mirrored
+
+def canonical_key(position: int, mask: int, column_count: int, row_count: int):
+    """
+    Returns the key of a position (bitboard of the player to move plus the bitboard of all coins) and whether it was mirrored.
+    Positions that are mirror images share the smallest of both keys.
+    """
+    key = position + mask
+    mirrored_key = mirror_bitboard(key, column_count, row_count)
+    if mirrored_key < key:
+        return mirrored_key, True
+    return key, False
+
+####################################################
+# OPENING BOOK
+####################################################
+
+class OpeningBook:
+    def __init__(self,
+                 keys: np.ndarray,
+                 packed_entries: np.ndarray,
+                 column_count: int = 7,
+                 row_count: int = 6,
+                 plies: int = 0,
+                 path: str = None):
+        """
+        Book of solved positions, stored on their canonical key (see canonical_key).
+        For every position the best column (of the canonical position) and its score for the player to move are kept.
+        All positions with at most the given amount of plies are expected to be in the book.
+        Use from_entries to create a book and load to open a saved book.
+        """
+        self.keys = keys
+        self.packed_entries = packed_entries
+        self.column_count = column_count
+        self.row_count = row_count
+        self.plies = plies
+        self.path = path
+
+        self.__game = BitboardConnectFour(column_count= column_count, row_count= row_count)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __reduce__(self):
+        # Saved books are reopened from their file when sent to another process, instead of copying the arrays
+        if self.path is not None:
+            return (OpeningBook.load, (self.path,))
+        return (OpeningBook, (np.asarray(self.keys), np.asarray(self.packed_entries),
+                              self.column_count, self.row_count, self.plies))
+
+    @classmethod
+    def from_entries(cls, entries: dict, column_count: int = 7, row_count: int = 6, plies: int = 0):
+        """
+        Creates a book from a dictionary of canonical key -> (best column, score).
+        """
+        keys = np.array(sorted(entries), dtype= np.uint64)
+        packed_entries = np.array([((entries[key][1] + SCORE_OFFSET) << COLUMN_BITS) | entries[key][0] for key in keys.tolist()],
+                                  dtype= np.uint16)
+        return cls(keys, packed_entries, column_count= column_count, row_count= row_count, plies= plies)
+
+    @classmethod
+    def load(cls, path: str):
+        """
+        Opens a book saved by save, without reading the positions into memory.
+        """
+        header = np.memmap(path, dtype= BOOK_HEADER_DTYPE, mode= "r", shape= (1,))[0]
+        if header["magic"] != BOOK_MAGIC:
+            raise ValueError(f"{path} is not an opening book.")
+
+        size = int(header["size"])
+        keys_offset = BOOK_HEADER_DTYPE.itemsize
+        keys = np.memmap(path, dtype= "<u8", mode= "r", offset= keys_offset, shape= (size,))
+        packed_entries = np.memmap(path, dtype= "<u2", mode= "r", offset= keys_offset + 8 * size, shape= (size,))
+        return cls(keys, packed_entries,
+                   column_count= int(header["column_count"]),
+                   row_count= int(header["row_count"]),
+                   plies= int(header["plies"]),
+                   path= path)
+
+    def save(self, path: str):
+        """
+        Saves the book in the binary book format (see the top of this file).
+        """
+        header = np.zeros(1, dtype= BOOK_HEADER_DTYPE)
+        header["magic"] = BOOK_MAGIC
+        header["column_count"] = self.column_count
+        header["row_count"] = self.row_count
+        header["plies"] = self.plies
+        header["size"] = len(self.keys)
+
+        with open(path, "wb") as book_file:
+            book_file.write(header.tobytes())
+            book_file.write(np.asarray(self.keys, dtype= "<u8").tobytes())
+            book_file.write(np.asarray(self.packed_entries, dtype= "<u2").tobytes())
+
+    def check_board_size(self, column_count: int, row_count: int):
+        """
+        Raises a ValueError if the book was built for another board size, as its keys and columns would be used on the wrong board.
+        """
+        if (self.column_count, self.row_count) != (column_count, row_count):
+            raise ValueError(f"The opening book is for a {self.column_count}x{self.row_count} board, "
+                             f"not for a {column_count}x{row_count} board.")
+
+    def __find(self, key: int):
+        """
+        Returns the packed entry of a key using binary search or None if not present.
+        """
+        key = np.uint64(key)
+        index = int(np.searchsorted(self.keys, key))
+        if index < len(self.keys) and self.keys[index] == key:
+            return int(self.packed_entries[index])
+        return None
+
+    def get_score(self, key: int):
+        """
+        Returns the score of a position in the book or None if not present.
+        """
+        packed_entry = self.__find(key)
+        return None if packed_entry is None else (packed_entry >> COLUMN_BITS) - SCORE_OFFSET
+
+    def get_best_column(self, key: int):
+        """
+        Returns the best column of a position in the book or None if not present.
+        """
+        packed_entry = self.__find(key)
+        return None if packed_entry is None else packed_entry & COLUMN_MASK
+
+    def lookup(self, board: np.ndarray):
+        """
+        Returns the best column for the player to move on a row x column numpy board with grid codes,
+            or None if the board is not in the book.
+        Player 1 is to move when both players have the same amount of coins.
+        """
+        self.__game.load_board(board)
+        if self.__game.move_count > self.plies:
+            return None
+
+        player_one_bitboard, player_two_bitboard = self.__game.bitboards
+        mask = player_one_bitboard | player_two_bitboard
+        position = player_one_bitboard if self.__game.move_count % 2 == 0 else player_two_bitboard
+        key, mirrored = canonical_key(position, mask, self.column_count, self.row_count)
+
+        best_column = self.get_best_column(key)
+        if best_column is not None and mirrored:
+            best_column = self.column_count - 1 - best_column
+        return best_column
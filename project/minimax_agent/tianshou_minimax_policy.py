@@ -0,0 +1,143 @@
+####################################################
+# ABOUT THIS FILE
+####################################################
+# Description: Tianshou compatible policy for the MiniMax agent
+#   Searches a batch of boards at once: identical boards are only searched once
+#   and the unique boards can be dispatched to a pool of worker processes.
+#
+# Author name: Lennert Bontinck
+# Author email: lennert.bontinck@vub.be / info@lennertbontinck.com
+
+
+####################################################
+# IMPORTS
+####################################################
+
+import math
+import typing
+import numpy as np
+import tianshou as ts
+from concurrent.futures import ProcessPoolExecutor
+
+import minimax_agent.minimax_agent as minimaxbot
+from minimax_agent.opening_book import OpeningBook
+
+####################################################
+# GLOBAL VARIABLES
+####################################################
+
+# Bot used by a worker process of the policy
+_worker_bot = None
+
+####################################################
+# MINIMAX TIANSHOU POLICY
+####################################################
+
+class TianshouMiniMaxConnectFourPolicy(ts.policy.BasePolicy):
+    """
+    Tianshou compatible MiniMax policy for connect four.
+    Identical boards within a batch are only searched once.
+    With workers = 1 all boards are searched by one bot, thus sharing one transposition table over the batch (and over batches).
+    With workers > 1 the unique boards are split over a pool of processes, each with one bot whose transposition table
+        is shared by all boards that process searches. The chosen columns do not depend on the amount of workers.
+    Boards in the optional opening book are not searched, worker processes reopen a saved book from its file.
+    """
+
+    def __init__(self,
+                 coin: int,
+                 oponent_coin: int,
+                 minimax_depth: int,
+                 column_count: int = 7,
+                 row_count: int = 6,
+                 workers: int = 1,
+                 opening_book: typing.Optional[OpeningBook] = None,
+                 **kwargs: typing.Any):
+        # Init base policy
+        super().__init__(**kwargs)
+
+        # Configure minimax bot
+        self.bot = minimaxbot.MiniMaxConnectFourBot(coin= coin,
+                                                    oponent_coin= oponent_coin,
+                                                    column_count= column_count,
+                                                    row_count= row_count,
+                                                    minimax_depth= minimax_depth,
+                                                    opening_book= opening_book)
+
+        # Process pool used for batches, created on first use
+        self.workers = workers
+        self.__worker_pool = None
+
+    def forward(self,
+                batch: ts.data.Batch,
+                state: typing.Optional[typing.Union[dict, ts.data.Batch, np.ndarray]] = None,
+                **kwargs: typing.Any):
+        """
+        Compute minimax action over the given batch data.
+        """
+        boards = batch["obs"]
+
+        # Can be nested in Tianshou
+        while isinstance(boards, ts.data.Batch):
+            boards = boards["obs"]
+
+        # Only search each distinct board once
+        boards = np.asarray(boards)
+        unique_boards, board_indices = np.unique(boards.reshape(len(boards), -1), axis= 0, return_inverse= True)
+        unique_boards = unique_boards.reshape((-1,) + boards.shape[1:])
+
+        if self.workers > 1 and len(unique_boards) > 1:
+            # Start the worker processes on first use
+            if self.__worker_pool is None:
+                self.__worker_pool = ProcessPoolExecutor(max_workers= self.workers,
+                                                         initializer= _init_worker,
+                                                         initargs= (self.bot.coin, self.bot.oponent_coin, self.bot.column_count,
+                                                                    self.bot.row_count, self.bot.minimax_depth, self.bot.opening_book))
+
+            # Each worker gets one consecutive chunk of the unique boards
+            chunk_size = math.ceil(len(unique_boards) / self.workers)
+            unique_preds = list(self.__worker_pool.map(_predict_in_worker, unique_boards, chunksize= chunk_size))
+        else:
+            unique_preds = [self.bot.predict(board= board) for board in unique_boards]
+
+        # Map the predictions back to the boards of the batch
+        preds = [unique_preds[index] for index in np.ravel(board_indices)]
+
+        return ts.data.Batch(act=preds, state=state)
+
+    def learn(self, batch, **kwargs):
+        # No learning needed
+        return {}
+
+    def set_eps(self, eps):
+        # Not needed
+        return
+
+    def close(self):
+        """
+        Shuts down the worker processes, if any.
+        """
+        if self.__worker_pool is not None:
+            self.__worker_pool.shutdown()
+            self.__worker_pool = None
+
+####################################################
+# POLICY WORKERS
+####################################################
+
+def _init_worker(coin: int, oponent_coin: int, column_count: int, row_count: int, minimax_depth: int, opening_book: OpeningBook):
+    """
+    Creates the bot of a worker process, its transposition table is kept between the searched boards.
+    """
+    global _worker_bot
+    _worker_bot = minimaxbot.MiniMaxConnectFourBot(coin= coin,
+                                                   oponent_coin= oponent_coin,
+                                                   column_count= column_count,
+                                                   row_count= row_count,
+                                                   minimax_depth= minimax_depth,
+                                                   opening_book= opening_book)
+
+def _predict_in_worker(board):
+    """
+    Searches a board in a worker process.
+    """
+    return _worker_bot.predict(board= board)
@@ -0,0 +1,163 @@
+####################################################
+# ABOUT THIS FILE
+####################################################
+# Description: Window based position evaluation for the MiniMax agent
+#   All windows of four cells are precomputed once per board size,
+#   the score is then kept up to date incrementally when coins are placed or removed.
+#
+# Author name: Lennert Bontinck
+# Author email: lennert.bontinck@vub.be / info@lennertbontinck.com
+#
+# Heuristic based on: https://github.com/KeithGalli/Connect4-Python/blob/master/connect4_with_ai.py
+
+
+####################################################
+# IMPORTS
+####################################################
+
+import numpy as np
+
+# Windows of four cells shared with the win detection
+from connect4_core.win_detection import window_indices
+
+####################################################
+# GLOBAL VARIABLES
+####################################################
+
+# Amount of cells in a window
+WINDOW_LENGTH = 4
+
+# Score for each coin of the player in the center column
+CENTER_COLUMN_SCORE = 6
+
+####################################################
+# WINDOW EVALUATOR
+####################################################
+
+def window_score(coin_count: int, oponent_coin_count: int):
+    """
+    Returns the score of a single window given the amount of coins of the player and of the oponent in it.
+    """
+    empty_count = WINDOW_LENGTH - coin_count - oponent_coin_count
+
+    # initial score of a window is 0
+    score = 0
+
+    # based on how many friendly pieces there are in the window, we increase the score
+    if coin_count == 4:
+        score += 100
+    elif coin_count == 3 and empty_count == 1:
+        score += 5
+    elif coin_count == 2 and empty_count == 2:
+        score += 2
+
+    # or decrese it if the oponent has 3 in a row
+    if oponent_coin_count == 3 and empty_count == 1:
+        score -= 4
+
+    return score
+
+class WindowEvaluator:
+    def __init__(self, coin: int, oponent_coin: int, column_count: int, row_count: int):
+        """
+        Scores connect four positions for a player by summing the score of all windows of four cells,
+            with a bonus for each coin of the player in the center column.
+        The score can either be kept up to date incrementally using place_coin and remove_coin,
+            or be computed for a batch of boards at once using score_positions.
+        """
+        self.coin = coin
+        self.oponent_coin = oponent_coin
+        self.column_count = column_count
+        self.row_count = row_count
+        self.center_column = column_count // 2
+
+        # All windows as flat cell indices (row * column_count + col): horizontal, vertical and both diagonals
+        self.windows = window_indices(self.row_count, self.column_count, WINDOW_LENGTH)
+
+        # The windows each cell is part of
+        self.__cell_windows = [[] for cell in range(self.row_count * self.column_count)]
+        for window_index, window in enumerate(self.windows.tolist()):
+            for cell in window:
+                self.__cell_windows[cell].append(window_index)
+
+        # Window score lookup table indexed by [coin count][oponent coin count]
+        self.__window_scores = [[window_score(coin_count, oponent_coin_count) if coin_count + oponent_coin_count <= WINDOW_LENGTH else 0
+                                 for oponent_coin_count in range(WINDOW_LENGTH + 1)]
+                                for coin_count in range(WINDOW_LENGTH + 1)]
+        self.__window_scores_array = np.array(self.__window_scores, dtype=np.int64)
+
+        self.reset()
+
+    def reset(self):
+        """
+        Resets the incremental score to the one of an empty board.
+        """
+        self.__coin_counts = [0] * len(self.windows)
+        self.__oponent_coin_counts = [0] * len(self.windows)
+        self.score = self.__window_scores[0][0] * len(self.windows)
+
+    def load_board(self, board: np.ndarray):
+        """
+        Sets the incremental score to the one of a row x column numpy board with grid codes.
+        """
+        self.reset()
+        for row in range(self.row_count):
+            for col in range(self.column_count):
+                if board[row][col] == self.coin or board[row][col] == self.oponent_coin:
+                    self.place_coin(row, col, int(board[row][col]))
+
+    def place_coin(self, row: int, col: int, coin: int):
+        """
+        Updates the score for a coin placed in the given cell, only the windows containing that cell change.
+        """
+        window_scores = self.__window_scores
+        coin_counts = self.__coin_counts
+        oponent_coin_counts = self.__oponent_coin_counts
+        counts = coin_counts if coin == self.coin else oponent_coin_counts
+
+        score = self.score
+        for window_index in self.__cell_windows[row * self.column_count + col]:
+            score -= window_scores[coin_counts[window_index]][oponent_coin_counts[window_index]]
+            counts[window_index] += 1
+            score += window_scores[coin_counts[window_index]][oponent_coin_counts[window_index]]
+
+        if coin == self.coin and col == self.center_column:
+            score += CENTER_COLUMN_SCORE
+        self.score = score
+
+    def remove_coin(self, row: int, col: int, coin: int):
+        """
+        Updates the score for a coin removed from the given cell, undoing place_coin.
+        """
+        window_scores = self.__window_scores
+        coin_counts = self.__coin_counts
+        oponent_coin_counts = self.__oponent_coin_counts
+        counts = coin_counts if coin == self.coin else oponent_coin_counts
+
+        score = self.score
+        for window_index in self.__cell_windows[row * self.column_count + col]:
+            score -= window_scores[coin_counts[window_index]][oponent_coin_counts[window_index]]
+            counts[window_index] -= 1
+            score += window_scores[coin_counts[window_index]][oponent_coin_counts[window_index]]
+
+        if coin == self.coin and col == self.center_column:
+            score -= CENTER_COLUMN_SCORE
+        self.score = score
+
+    def score_positions(self, boards: np.ndarray):
+        """
+        Returns the scores of a batch of row x column boards (shape (N, rows, columns)) in one vectorized pass.
+        """
+        boards = np.asarray(boards).reshape(-1, self.row_count * self.column_count)
+
+        # Gather the cells of all windows for all boards, shape (N, windows, 4)
+        window_cells = boards[:, self.windows]
+        coin_counts = np.count_nonzero(window_cells == self.coin, axis= 2)
+        oponent_coin_counts = np.count_nonzero(window_cells == self.oponent_coin, axis= 2)
+
+        # Look up the window scores and add the center column bonus
+        scores = self.__window_scores_array[coin_counts, oponent_coin_counts].sum(axis= 1)
+        center_cells = boards[:, self.center_column::self.column_count]
+        scores += np.count_nonzero(center_cells == self.coin, axis= 1) * CENTER_COLUMN_SCORE
+
+        return scores
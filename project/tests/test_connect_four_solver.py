@@ -0,0 +1,129 @@
+####################################################
+# ABOUT THIS FILE
+####################################################
+# Description: Regression tests of the perfect play solver against a brute force negamax on near-full boards
+#   and of its opening books against the scores of every column of the book positions.
+#   Loss scores with an odd amount of remaining cells used to be one point too low (floor instead of truncating division),
+#   and book positions first reached in their mirrored orientation used to store the mirrored best column.
+#
+# Author name: Lennert Bontinck
+# Author email: lennert.bontinck@vub.be / info@lennertbontinck.com
+#
+# Usage (from the project folder):
+#   python -m pytest tests
+
+
+####################################################
+# IMPORTS
+####################################################
+
+import random as rnd
+
+from connect4_core.bitboard_connect_four import BitboardConnectFour
+from minimax_agent.connect_four_solver import ConnectFourSolver
+
+####################################################
+# HELPER FUNCTIONS
+####################################################
+
+def brute_force_score(game: BitboardConnectFour, coin: int):
+    """
+    Returns the score of the game for the player with coin to move, searching every continuation.
+    A win with the n-th own coin (counted from the start of the game) scores (cells + 1) // 2 + 1 - n, as in the solver.
+    """
+    cell_count = game.column_count * game.row_count
+    oponent_coin = 3 - coin
+    best_score = None
+    for column in game.valid_locations():
+        row = game.place_coin(column, coin)
+        if game.winning_board(coin):
+            score = (cell_count + 2 - game.move_count) // 2
+        elif game.full_board():
+            score = 0
+        else:
+            score = -brute_force_score(game, oponent_coin)
+        game.remove_coin(column, coin)
+
+        if best_score is None or score > best_score:
+            best_score = score
+    return best_score
+
+def near_full_positions(amount: int, column_count: int, row_count: int, empty_cells: int, seed: int):
+    """
+    Returns games with empty_cells empty cells reached by random moves, games that are already won are skipped.
+    """
+    position_rnd = rnd.Random(seed)
+    positions = []
+    while len(positions) < amount:
+        game = BitboardConnectFour(column_count= column_count, row_count= row_count)
+        coin = 1
+        won = False
+        while game.move_count < column_count * row_count - empty_cells:
+            game.place_coin(position_rnd.choice(game.valid_locations()), coin)
+            if game.winning_board(coin):
+                won = True
+                break
+            coin = 3 - coin
+        if not won:
+            positions.append((game, coin))
+    return positions
+
+def book_positions(column_count: int, row_count: int, plies: int):
+    """
+    Yields the game after every sequence of at most plies moves that did not end the game, the same game object being updated in place.
+    """
+    game = BitboardConnectFour(column_count= column_count, row_count= row_count)
+
+    def play(coin: int):
+        yield game
+        if game.move_count == plies:
+            return
+        for column in game.valid_locations():
+            game.place_coin(column, coin)
+            if not game.winning_board(coin):
+                yield from play(3 - coin)
+            game.remove_coin(column, coin)
+
+    yield from play(1)
+
+####################################################
+# TESTS
+####################################################
+
+def test_solver_matches_brute_force_on_near_full_boards():
+    solver = ConnectFourSolver(column_count= 7, row_count= 6, transposition_table_size= 2**16)
+
+    # Both an even and an odd amount of empty cells
+    for empty_cells in (10, 11):
+        for game, coin in near_full_positions(20, 7, 6, empty_cells, seed= empty_cells):
+            board = game.to_board()
+            assert solver.solve(board) == brute_force_score(game, coin), f"Wrong score for board:\n{board[::-1]}"
+
+def test_solver_matches_brute_force_on_small_board():
+    solver = ConnectFourSolver(column_count= 5, row_count= 4, transposition_table_size= 2**16)
+
+    for empty_cells in (9, 10):
+        for game, coin in near_full_positions(10, 5, 4, empty_cells, seed= empty_cells):
+            board = game.to_board()
+            assert solver.solve(board) == brute_force_score(game, coin), f"Wrong score for board:\n{board[::-1]}"
+
+def test_opening_book_columns_match_analyze():
+    # The transposition table filled while building the book speeds up the analysis of its positions
+    solver = ConnectFourSolver(column_count= 5, row_count= 4, transposition_table_size= 2**20)
+    book = solver.build_opening_book(plies= 4)
+
+    # Every position of the book, in the orientation of its canonical key, is checked against the scores of its columns
+    checked_keys = set()
+    for game in book_positions(5, 4, plies= 4):
+        board = game.to_board()
+        position, mask, moves = solver.position_from_board(board)
+        key, mirrored = solver.canonical_key(position, mask)
+        if mirrored or key in checked_keys:
+            continue
+        checked_keys.add(key)
+
+        scores = solver.analyze(board)
+        best_score = max(score for score in scores if score is not None)
+        assert book.get_score(key) == best_score, f"Wrong score for board:\n{board[::-1]}"
+        assert scores[book.get_best_column(key)] == best_score, f"Wrong column for board:\n{board[::-1]}"
+    assert len(checked_keys) == len(book)
@@ -0,0 +1,53 @@
+####################################################
+# ABOUT THIS FILE
+####################################################
+# Description: Tests of opening book lookups against the perfect play solver
+#   Boards are looked up in both orientations, boards whose mirror image is the canonical position get the mirrored column of the book.
+#
+# Author name: Lennert Bontinck
+# Author email: lennert.bontinck@vub.be / info@lennertbontinck.com
+#
+# Usage (from the project folder):
+#   python -m pytest tests
+
+
+####################################################
+# IMPORTS
+####################################################
+
+import pytest
+
+from minimax_agent.connect_four_solver import ConnectFourSolver
+from minimax_agent.minimax_agent import MiniMaxConnectFourBot
+from test_connect_four_solver import book_positions
+
+####################################################
+# TESTS
+####################################################
+
+def test_lookup_of_mirrored_boards_matches_solver():
+    # The transposition table filled while building the book speeds up the analysis of its positions
+    solver = ConnectFourSolver(column_count= 5, row_count= 4, transposition_table_size= 2**20)
+    book = solver.build_opening_book(plies= 3)
+    bot = MiniMaxConnectFourBot(coin= 1, oponent_coin= 2, column_count= 5, row_count= 4, minimax_depth= 1, opening_book= book)
+
+    mirrored_count = 0
+    for game in book_positions(5, 4, plies= 3):
+        board = game.to_board()
+        position, mask, moves = solver.position_from_board(board)
+        mirrored_count += solver.canonical_key(position, mask)[1]
+
+        scores = solver.analyze(board)
+        best_score = max(score for score in scores if score is not None)
+        book_column = book.lookup(board)
+        assert scores[book_column] == best_score, f"Wrong column for board:\n{board[::-1]}"
+        assert bot.predict(board) == book_column
+    assert mirrored_count > 0
+
+def test_book_of_other_board_size_is_rejected():
+    book = ConnectFourSolver(column_count= 5, row_count= 4).build_opening_book(plies= 1)
+
+    with pytest.raises(ValueError):
+        MiniMaxConnectFourBot(coin= 1, oponent_coin= 2, column_count= 7, row_count= 6, minimax_depth= 1, opening_book= book)
+    with pytest.raises(ValueError):
+        ConnectFourSolver(column_count= 7, row_count= 6, opening_book= book)